@@ -1,12 +1,17 @@
 import os.path
 
 import firebase_admin
+from asgiref.sync import sync_to_async
 from ninja import NinjaAPI
 from usuarios.utils import  initialize_firebase, get_firestore_client
 from usuarios.views import usuarios
 from mascotas.views import mascotas
 from servicios.views import servicios
-from usuarios.auth import JWTAuth
+from usuarios.auth import AsyncJWTAuth, JWTAuth
+from mascotas.embeddings import model_ready
+from .busqueda import buscar
+from .ejecutor import EjecutorSaturado, get_ejecutor, get_ejecutor_ingesta
+from .schemas import BusquedaSchema
 
 
 initialize_firebase()
@@ -24,6 +29,17 @@ api.add_router("/auth", usuarios, auth=None, tags=["Autenticación"])
 api.add_router("/mascotas", mascotas, auth=JWTAuth(), tags=["Mascotas"])
 api.add_router("/servicios", servicios, auth=JWTAuth(), tags=["Servicios"])
 
+
+@api.exception_handler(EjecutorSaturado)
+def ejecutor_saturado(request, exc):
+    # Contrapresión: el cliente reintenta luego en vez de esperar en cola
+    respuesta = api.create_response(
+        request, {"detail": "Servidor ocupado, intenta de nuevo en unos segundos"}, status=503
+    )
+    respuesta["Retry-After"] = str(exc.reintentar)
+    return respuesta
+
+
 @api.get("/health", tags=["Health"])
 def health_check(request):
     """
@@ -32,10 +48,22 @@ def health_check(request):
     return {
         'status': 'ok',
         'message': 'API funcionando correctamente',
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'modelo_listo': model_ready(),
+        'ejecutor': get_ejecutor().estadisticas(),
+        'ingesta': get_ejecutor_ingesta().estadisticas(),
     }
 
 
+@api.get("/buscar", response=BusquedaSchema, auth=AsyncJWTAuth(), tags=["Búsqueda"])
+async def buscar_texto(request, q: str, tipo: str = None, cursor: str = None, limite: int = None):
+    """
+    Búsqueda de texto completo en nombre, raza y descripción de mascotas y
+    servicios, ordenada por relevancia. tipo: 'mascota' o 'servicio'
+    """
+    return await sync_to_async(buscar)(request, q, tipo=tipo, cursor=cursor, limite=limite)
+
+
 @api.get("/", tags=["Root"])
 def root(request):
     """
@@ -48,6 +76,7 @@ def root(request):
         'endpoints': {
             'auth': '/api/auth',
             'mascotas': '/api/mascotas',
+            'buscar': '/api/buscar',
             'health': '/api/health',
             'test': '/api/test'
         }
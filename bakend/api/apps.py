@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+
+        from .busqueda import crear_objetos_postgres, registrar_unaccent_sqlite
+
+        connection_created.connect(registrar_unaccent_sqlite)
+        post_migrate.connect(crear_objetos_postgres, sender=self)
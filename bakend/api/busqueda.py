@@ -0,0 +1,227 @@
+"""
+Búsqueda de texto completo en mascotas y servicios (GET /api/buscar).
+
+PostgreSQL:
+- Cada modelo Buscable (api/models.py) tiene una columna tsvector
+  `busqueda` con pesos por campo (nombre A, raza B, descripción C) que se
+  recalcula al guardar, y un índice GIN sobre ella.
+- La configuración CONFIG ('spanish_unaccent') es la 'spanish' de
+  PostgreSQL con unaccent antes del stemming: "pérdida", "Perdida" y
+  "perdidas" dan el mismo lexema.
+- La extensión, la configuración y los índices GIN se crean en
+  post_migrate (crear_objetos_postgres), porque no existen en SQLite.
+- El texto del usuario se interpreta como websearch_to_tsquery ("frases",
+  OR, -excluir) y el orden es ts_rank con los pesos anteriores.
+
+SQLite (pruebas): misma API con LIKE sobre el texto sin tildes (función
+`unaccent` registrada en cada conexión) y un puntaje por campo.
+
+Paginación por cursor firmado sobre (puntaje, tipo, id), igual que
+api/paginacion.py pero con el puntaje como primer criterio.
+"""
+import unicodedata
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.core import signing
+from django.db import connections
+from django.db.models import Case, F, FloatField, Func, Q, TextField, Value, When
+from django.db.models.functions import Cast, Coalesce, Lower
+from ninja.errors import HttpError
+
+from .paginacion import limite_pagina
+
+CONFIG = "spanish_unaccent"
+SALT = "api.busqueda"
+TIPOS = ("mascota", "servicio")
+LARGO_MINIMO = 2
+
+
+def quitar_tildes(texto):
+    if texto is None:
+        return None
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def normalizar(texto):
+    return quitar_tildes(texto or "").casefold()
+
+
+class Unaccent(Func):
+    function = "unaccent"
+    output_field = TextField()
+
+
+def _texto(campo):
+    return Coalesce(F(campo), Value(""), output_field=TextField())
+
+
+def es_postgres(alias="default"):
+    return connections[alias].vendor == "postgresql"
+
+
+def vector(modelo):
+    """Expresión tsvector de un modelo según su CAMPOS_BUSQUEDA {campo: peso}"""
+    partes = [
+        SearchVector(_texto(campo), weight=peso, config=CONFIG)
+        for campo, peso in modelo.CAMPOS_BUSQUEDA.items()
+    ]
+    resultado = partes[0]
+    for parte in partes[1:]:
+        resultado = resultado + parte
+    return resultado
+
+
+def actualizar_vectores(queryset):
+    """Recalcula `busqueda` de las filas del queryset (sin efecto fuera de PostgreSQL)"""
+    if not es_postgres(queryset.db):
+        return 0
+    return queryset.update(busqueda=vector(queryset.model))
+
+
+def modelos_buscables():
+    from mascotas.models import Mascota
+    from servicios.models import Servicio
+
+    return {"mascota": Mascota, "servicio": Servicio}
+
+
+SQL_CONFIG = f"""
+CREATE EXTENSION IF NOT EXISTS unaccent;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{CONFIG}') THEN
+        CREATE TEXT SEARCH CONFIGURATION {CONFIG} (COPY = spanish);
+        ALTER TEXT SEARCH CONFIGURATION {CONFIG}
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+    END IF;
+END
+$$;
+"""
+
+
+def crear_objetos_postgres(using="default", **kwargs):
+    """post_migrate: extensión unaccent, configuración CONFIG e índices GIN"""
+    if not es_postgres(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(SQL_CONFIG)
+        for modelo in modelos_buscables().values():
+            tabla = modelo._meta.db_table
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {tabla}_busqueda_gin ON {tabla} USING gin (busqueda)"
+            )
+
+
+def registrar_unaccent_sqlite(sender, connection, **kwargs):
+    """connection_created: `unaccent` para el respaldo de SQLite"""
+    if connection.vendor == "sqlite":
+        connection.connection.create_function("unaccent", 1, quitar_tildes, deterministic=True)
+
+
+def codificar_cursor(puntaje, tipo, pk):
+    return signing.dumps([puntaje, tipo, pk], salt=SALT, compress=True)
+
+
+def decodificar_cursor(cursor):
+    try:
+        puntaje, tipo, pk = signing.loads(cursor, salt=SALT)
+        return float(puntaje), TIPOS.index(tipo), int(pk)
+    except (signing.BadSignature, ValueError, TypeError):
+        raise HttpError(400, "Cursor de búsqueda inválido")
+
+
+def _despues_de(orden_tipo, cursor):
+    """Filas ordenadas después del cursor (puntaje desc, tipo asc, id desc)"""
+    puntaje, tipo_cursor, pk = cursor
+    if orden_tipo > tipo_cursor:
+        misma = Q(puntaje=puntaje)
+    elif orden_tipo == tipo_cursor:
+        misma = Q(puntaje=puntaje, pk__lt=pk)
+    else:
+        misma = Q(pk__in=[])
+    return Q(puntaje__lt=puntaje) | misma
+
+
+def _puntuar_postgres(queryset, texto):
+    consulta = SearchQuery(texto, search_type="websearch", config=CONFIG)
+    return (
+        queryset
+        .filter(busqueda=consulta)
+        # ts_rank devuelve real (float4): en double precision el valor que
+        # vuelve en el cursor es exactamente el que se compara en SQL
+        .annotate(puntaje=Cast(SearchRank(F("busqueda"), consulta), FloatField()))
+    )
+
+
+def _puntuar_sqlite(queryset, texto):
+    terminos = [t for t in normalizar(texto).split() if len(t) >= LARGO_MINIMO]
+    if not terminos:
+        return queryset.none()
+    campos = list(queryset.model.CAMPOS_BUSQUEDA.items())
+    queryset = queryset.annotate(**{
+        f"_n_{campo}": Lower(Unaccent(_texto(campo))) for campo, _ in campos
+    })
+    # Cada término debe aparecer en algún campo; puntúa más en nombre (A) que en descripción (C)
+    valor = {"A": 1.0, "B": 0.4, "C": 0.2, "D": 0.1}
+    puntaje = Value(0.0)
+    for termino in terminos:
+        alguno = Q()
+        for campo, _ in campos:
+            alguno |= Q(**{f"_n_{campo}__contains": termino})
+        queryset = queryset.filter(alguno)
+        puntaje = puntaje + Case(
+            *[When(**{f"_n_{campo}__contains": termino}, then=Value(valor[peso])) for campo, peso in campos],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    return queryset.annotate(puntaje=puntaje)
+
+
+def buscar(request, texto, tipo=None, cursor=None, limite=None):
+    """
+    {"resultados": [...], "siguiente": cursor o None}; cada resultado trae
+    tipo, id, nombre, descripción, miniatura y puntaje
+    """
+    from .media import UrlsMedia
+
+    texto = (texto or "").strip()
+    if len(texto) < LARGO_MINIMO:
+        raise HttpError(400, f"q debe tener al menos {LARGO_MINIMO} caracteres")
+    if tipo is not None and tipo not in TIPOS:
+        raise HttpError(400, f"tipo debe ser uno de: {', '.join(TIPOS)}")
+    # Sin API_PAGINA_DEFECTO las listas van completas; la búsqueda no: se acota al máximo
+    limite = limite_pagina(limite) or settings.API_PAGINA_MAXIMA
+    posicion = decodificar_cursor(cursor) if cursor else None
+    puntuar = _puntuar_postgres if es_postgres() else _puntuar_sqlite
+
+    filas = []
+    for orden_tipo, (nombre_tipo, modelo) in enumerate(modelos_buscables().items()):
+        if tipo is not None and nombre_tipo != tipo:
+            continue
+        queryset = puntuar(modelo.objects.all(), texto)
+        if posicion is not None:
+            queryset = queryset.filter(_despues_de(orden_tipo, posicion))
+        columnas = ["id", "nombre", "descripcion", "imagen_miniatura", "puntaje", *modelo.CAMPOS_EXTRA_BUSQUEDA]
+        for fila in queryset.order_by("-puntaje", "-pk").values(*columnas)[:limite + 1]:
+            fila["tipo"] = nombre_tipo
+            fila["_orden"] = orden_tipo
+            filas.append(fila)
+
+    # Mezcla de ambos tipos con el mismo orden que el cursor
+    filas.sort(key=lambda f: (-f["puntaje"], f["_orden"], -f["id"]))
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        siguiente = codificar_cursor(ultima["puntaje"], ultima["tipo"], ultima["id"])
+
+    url = UrlsMedia(request)
+    resultados = []
+    for fila in filas:
+        fila.pop("_orden")
+        fila["imagen_miniatura"] = url(fila["imagen_miniatura"])
+        fila["puntaje"] = round(fila["puntaje"], 4)
+        resultados.append(fila)
+    return {"resultados": resultados, "siguiente": siguiente}
@@ -0,0 +1,53 @@
+"""
+GET condicional (ETag / Last-Modified) para los endpoints de Ninja.
+
+- Colecciones: el validador sale de una sola consulta agregada sobre el
+  queryset ya filtrado, Max(<campo modificado>) + Count. Crear o editar
+  sube el máximo y eliminar cambia el conteo. Solo se envía ETag: un
+  borrado no cambia el máximo y con If-Modified-Since daría un 304 falso.
+- Detalle: el id y la fecha de modificación de la fila (ETag y
+  Last-Modified).
+
+El ETag es débil (mismo contenido, no los mismos bytes) e incluye la URL
+completa y el host, porque los listados traen URLs absolutas. Si el
+cliente ya lo tiene se responde 304 sin serializar nada.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+class Validadores:
+
+    def __init__(self, request, *partes, modificado=None):
+        huella = hashlib.sha1(
+            "|".join(str(p) for p in (request.get_host(), request.get_full_path(), *partes)).encode()
+        ).hexdigest()[:24]
+        self.etag = f'W/"{huella}"'
+        self.modificado = int(modificado.timestamp()) if modificado else None
+
+    def no_modificado(self, request):
+        """HttpResponseNotModified (o 412) si el cliente ya tiene esta versión; si no, None"""
+        respuesta = get_conditional_response(request, etag=self.etag, last_modified=self.modificado)
+        if respuesta is not None:
+            self.aplicar(respuesta)
+        return respuesta
+
+    def aplicar(self, respuesta):
+        respuesta["ETag"] = self.etag
+        if self.modificado is not None:
+            respuesta["Last-Modified"] = http_date(self.modificado)
+        # El cliente puede guardar la respuesta pero debe revalidarla
+        respuesta["Cache-Control"] = "private, no-cache"
+        return respuesta
+
+
+async def avalidadores_coleccion(request, queryset, campo):
+    agregado = await queryset.order_by().aaggregate(ultimo=Max(campo), total=Count("pk"))
+    return Validadores(request, agregado["ultimo"], agregado["total"])
+
+
+def validadores_objeto(request, pk, modificado):
+    return Validadores(request, pk, modificado, modificado=modificado)
@@ -0,0 +1,157 @@
+"""
+Ejecutores acotados para el trabajo de CPU de las peticiones.
+
+Con ASGI los handlers async atienden listas, CRUD y autenticación en el
+event loop; lo que ocupa CPU va a pools de hilos dedicados para no
+bloquear el loop ni a las demás peticiones:
+
+- get_ejecutor() (API_EJECUTOR): puntuar un match e inferir un embedding
+  en línea.
+- get_ejecutor_ingesta() (API_INGESTA): decodificar, reducir y hashear las
+  imágenes subidas. Va aparte para que una ráfaga de subidas no deje sin
+  hilos al match, y viceversa.
+
+Las escrituras en la base (ArchivoMedia, el modelo, el embedding) no van a
+ninguno de los dos: corren en los hilos de sync_to_async.
+
+Cada ejecutor:
+
+- HILOS: trabajos en paralelo (numpy, PIL y TensorFlow sueltan el GIL).
+- MAX_EN_COLA: trabajos que pueden esperar turno. Con el pool y la cola
+  llenos se rechaza de inmediato con EjecutorSaturado, que la API
+  responde como 503 con Retry-After (contrapresión) en lugar de acumular
+  peticiones que igual vencerían.
+
+Cada trabajo abre y cierra su propia conexión a la base de datos
+(close_old_connections), como una petición síncrona.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+EJECUTOR_DEFAULTS = {
+    "HILOS": 2,
+    "MAX_EN_COLA": 16,
+    "REINTENTAR_SEGUNDOS": 2,
+}
+
+INGESTA_DEFAULTS = {
+    "HILOS": 2,
+    "MAX_EN_COLA": 8,
+    "REINTENTAR_SEGUNDOS": 2,
+}
+
+
+def ejecutor_config():
+    config = dict(EJECUTOR_DEFAULTS)
+    config.update(getattr(settings, "API_EJECUTOR", {}))
+    return config
+
+
+def ingesta_config():
+    config = dict(INGESTA_DEFAULTS)
+    config.update(getattr(settings, "API_INGESTA", {}))
+    return config
+
+
+class EjecutorSaturado(Exception):
+
+    def __init__(self, reintentar):
+        super().__init__("Servidor ocupado")
+        self.reintentar = reintentar
+
+
+class EjecutorAcotado:
+
+    def __init__(self, hilos, max_en_cola, reintentar=2, nombre="ejecutor"):
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix=nombre)
+        self._cupos = threading.BoundedSemaphore(hilos + max_en_cola)
+        self._lock = threading.Lock()
+        self.hilos = hilos
+        self.max_en_cola = max_en_cola
+        self.reintentar = reintentar
+        self.pendientes = 0
+        self.completados = 0
+        self.rechazados = 0
+
+    def _terminar(self, futuro):
+        with self._lock:
+            self.pendientes -= 1
+            self.completados += 1
+        self._cupos.release()
+
+    def enviar(self, funcion, *args, **kwargs):
+        """Future del trabajo; EjecutorSaturado si no queda cupo"""
+        if not self._cupos.acquire(blocking=False):
+            with self._lock:
+                self.rechazados += 1
+            raise EjecutorSaturado(self.reintentar)
+        with self._lock:
+            self.pendientes += 1
+
+        def trabajo():
+            close_old_connections()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                close_old_connections()
+
+        try:
+            futuro = self._pool.submit(trabajo)
+        except RuntimeError:
+            self._terminar(None)
+            raise
+        futuro.add_done_callback(self._terminar)
+        return futuro
+
+    async def ejecutar(self, funcion, *args, **kwargs):
+        return await asyncio.wrap_future(self.enviar(funcion, *args, **kwargs))
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "hilos": self.hilos,
+                "max_en_cola": self.max_en_cola,
+                "en_curso_o_en_cola": self.pendientes,
+                "completados": self.completados,
+                "rechazados": self.rechazados,
+            }
+
+
+_ejecutores = {}
+_ejecutores_lock = threading.Lock()
+
+
+def _obtener(nombre, config):
+    ejecutor = _ejecutores.get(nombre)
+    if ejecutor is None:
+        with _ejecutores_lock:
+            ejecutor = _ejecutores.get(nombre)
+            if ejecutor is None:
+                config = config()
+                ejecutor = EjecutorAcotado(
+                    config["HILOS"], config["MAX_EN_COLA"], config["REINTENTAR_SEGUNDOS"], nombre=nombre
+                )
+                _ejecutores[nombre] = ejecutor
+    return ejecutor
+
+
+def get_ejecutor():
+    return _obtener("cpu", ejecutor_config)
+
+
+def get_ejecutor_ingesta():
+    return _obtener("ingesta", ingesta_config)
+
+
+async def ejecutar(funcion, *args, **kwargs):
+    """Corre `funcion` en el ejecutor de CPU del proceso y espera su resultado"""
+    return await get_ejecutor().ejecutar(funcion, *args, **kwargs)
+
+
+async def ejecutar_ingesta(funcion, *args, **kwargs):
+    """Corre `funcion` en el ejecutor de imágenes subidas y espera su resultado"""
+    return await get_ejecutor_ingesta().ejecutar(funcion, *args, **kwargs)
@@ -0,0 +1,171 @@
+"""
+Ingesta de imágenes subidas (mascotas y servicios).
+
+- El original se limita a MAX_LADO px (y se endereza según EXIF); si ya
+  cumple, se guarda tal cual para no alterar sus bytes.
+- Se generan variantes 'miniatura' y 'media' en FORMATO (WEBP por defecto)
+  para que las listas no descarguen el original.
+- Cada archivo se identifica por el SHA-256 de su contenido. El de la
+  subida lo calculan los manejadores de FILE_UPLOAD_HANDLERS mientras
+  Django la escribe, y un original que se guarda tal cual va del archivo
+  subido al almacenamiento sin cargarse entero en memoria.
+
+Los campos y el guardado (direccionado por contenido, con conteo de
+referencias) viven en api.models; aquí solo se procesan los bytes.
+"""
+import hashlib
+import io
+import os
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from ninja.errors import HttpError
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+IMAGENES_DEFAULTS = {
+    "MAX_LADO": 2048,
+    "VARIANTES": {"miniatura": 320, "media": 1024},
+    "FORMATO": "WEBP",  # WEBP | JPEG
+    "CALIDAD": 80,
+    "CALIDAD_ORIGINAL": 90,
+}
+
+TAMANO_BLOQUE = 1024 * 1024
+ORIENTACION_EXIF = 0x0112
+EXTENSIONES = {"WEBP": "webp", "JPEG": "jpg", "PNG": "png"}
+
+
+class Procesada(namedtuple("Procesada", "datos extension sha256 ancho alto")):
+    """`datos` son bytes, o el archivo subido si el original se guarda tal cual"""
+    __slots__ = ()
+
+    @property
+    def tamano(self):
+        return len(self.datos) if isinstance(self.datos, bytes) else self.datos.size
+
+
+class ImagenInvalida(ValueError):
+    pass
+
+
+def imagenes_config():
+    config = dict(IMAGENES_DEFAULTS)
+    config.update(getattr(settings, "API_IMAGENES", {}))
+    return config
+
+
+def _codificar(imagen, formato, calidad):
+    if formato == "JPEG" and imagen.mode not in ("RGB", "L"):
+        imagen = imagen.convert("RGB")
+    elif imagen.mode not in ("RGB", "RGBA", "L", "LA"):
+        imagen = imagen.convert("RGBA" if "A" in imagen.getbands() else "RGB")
+    salida = io.BytesIO()
+    imagen.save(salida, formato, quality=calidad, optimize=formato == "JPEG")
+    return salida.getvalue()
+
+
+def _reducida(imagen, lado):
+    reducida = imagen.copy()
+    reducida.thumbnail((lado, lado), Image.LANCZOS, reducing_gap=3.0)
+    return reducida
+
+
+def _sha256(archivo):
+    """SHA-256 leyendo por bloques (archivos que no pasaron por los manejadores de subida)"""
+    sha = hashlib.sha256()
+    archivo.seek(0)
+    bloques = archivo.chunks() if hasattr(archivo, "chunks") else iter(lambda: archivo.read(TAMANO_BLOQUE), b"")
+    for bloque in bloques:
+        sha.update(bloque)
+    return sha.hexdigest()
+
+
+class _ConHash:
+    """Agrega `sha256` al archivo subido, calculado por bloques mientras se recibe"""
+
+    def new_file(self, *args, **kwargs):
+        self._sha = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        # El de memoria deja pasar los bloques si la subida no le corresponde
+        if getattr(self, "activated", True):
+            self._sha.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        archivo = super().file_complete(file_size)
+        if archivo is not None:
+            archivo.sha256 = self._sha.hexdigest()
+        return archivo
+
+
+class SubidaEnMemoriaConHash(_ConHash, MemoryFileUploadHandler):
+    pass
+
+
+class SubidaTemporalConHash(_ConHash, TemporaryFileUploadHandler):
+    pass
+
+
+def _procesada(datos, extension, ancho, alto, sha256=None):
+    return Procesada(datos, extension, sha256 or hashlib.sha256(datos).hexdigest(), ancho, alto)
+
+
+def procesar(archivo):
+    """
+    Procesa una imagen subida. Retorna {"original": Procesada, "<variante>": Procesada}
+    con los bytes, la extensión, el SHA-256 del contenido y las dimensiones.
+    """
+    config = imagenes_config()
+    _, extension = os.path.splitext(getattr(archivo, "name", None) or "")
+    sha256 = getattr(archivo, "sha256", None) or _sha256(archivo)
+    archivo.seek(0)
+    datos = archivo
+    try:
+        imagen = Image.open(archivo)
+        formato_original = imagen.format
+        # Se decide con el tamaño real: tras draft() el JPEG ya viene reducido
+        excede = max(imagen.size) > config["MAX_LADO"]
+        # Los JPEG grandes se decodifican directamente a menor escala
+        imagen.draft("RGB", (config["MAX_LADO"], config["MAX_LADO"]))
+        imagen.load()
+    except (UnidentifiedImageError, OSError) as e:
+        raise ImagenInvalida(f"Imagen inválida: {e}")
+
+    rotada = imagen.getexif().get(ORIENTACION_EXIF, 1) != 1
+    orientada = ImageOps.exif_transpose(imagen)
+    extension = EXTENSIONES.get(formato_original) or extension.lstrip(".").lower() or "jpg"
+    if excede or rotada:
+        formato = formato_original if formato_original in EXTENSIONES else "JPEG"
+        orientada = _reducida(orientada, config["MAX_LADO"])
+        datos = _codificar(orientada, formato, config["CALIDAD_ORIGINAL"])
+        extension = EXTENSIONES[formato]
+        sha256 = None
+
+    resultado = {"original": _procesada(datos, extension, *orientada.size, sha256=sha256)}
+    formato = config["FORMATO"]
+    for variante, lado in config["VARIANTES"].items():
+        reducida = _reducida(orientada, lado)
+        resultado[variante] = _procesada(
+            _codificar(reducida, formato, config["CALIDAD"]), EXTENSIONES[formato], *reducida.size
+        )
+    return resultado
+
+
+def dimensiones(archivo):
+    """(ancho, alto) según el encabezado, sin decodificar la imagen"""
+    archivo.seek(0)
+    try:
+        return Image.open(archivo).size
+    except (UnidentifiedImageError, OSError) as e:
+        raise ImagenInvalida(f"Imagen inválida: {e}")
+
+
+def procesar_subida(archivo):
+    """procesar() con error 400 para las vistas"""
+    try:
+        return procesar(archivo)
+    except ImagenInvalida as e:
+        raise HttpError(400, str(e))
@@ -0,0 +1,103 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+
+from api.busqueda import buscar, es_postgres
+from mascotas.models import Mascota
+
+PREFIJO = "bench-busqueda"
+NOMBRES = ["Luna", "Max", "Rocky", "Toby", "Nala", "Simón", "Canela", "Pelusa", "Lupita", "Bruno", "Kira", "Thor"]
+RAZAS = ["Criollo", "Labrador", "Pastor Alemán", "Poodle", "Siamés", "Persa", "Beagle", "Bulldog"]
+FRASES = [
+    "collar rojo con placa", "mancha blanca en el pecho", "muy asustadizo", "cola cortada",
+    "ojos de distinto color", "se perdió cerca del parque", "encontrado junto a la estación",
+    "tiene chip", "cojea de la pata trasera", "pelaje atigrado", "orejas caídas", "muy cariñosa",
+]
+CONSULTAS = ["labrador", "collar rojo", "siames", "perdio parque", "pastor aleman chip", "Luna"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Siembra mascotas de prueba y mide la latencia de /api/buscar "
+        "(PostgreSQL: tsvector + GIN; SQLite: respaldo con LIKE)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sembrar", type=int, default=1000000,
+                            help="Mascotas de prueba a crear (0 = usar los datos existentes)")
+        parser.add_argument("--conservar", action="store_true",
+                            help="No borra los datos sembrados al terminar")
+        parser.add_argument("--repeticiones", type=int, default=20)
+
+    def _sembrar(self, cantidad):
+        propietario, _ = get_user_model().objects.get_or_create(
+            username=PREFIJO, defaults={"email": f"{PREFIJO}@example.com"}
+        )
+        rng = random.Random(0)
+        inicio = date.today() - timedelta(days=730)
+        lote = []
+        for i in range(cantidad):
+            lote.append(Mascota(
+                nombre=rng.choice(NOMBRES),
+                raza=rng.choice(RAZAS),
+                descripcion=", ".join(rng.sample(FRASES, 3)),
+                dia=inicio + timedelta(days=rng.randrange(730)),
+                propietario=propietario,
+                tipo_reporte=rng.choice(("Pérdida", "Encontrada")),
+                embedding_status=Mascota.EMBEDDING_SIN_IMAGEN,
+            ))
+            if len(lote) == 10000:
+                Mascota.objects.bulk_create(lote)
+                lote = []
+                if (i + 1) % 100000 == 0:
+                    self.stdout.write(f"  {i + 1}/{cantidad}")
+        Mascota.objects.bulk_create(lote)
+        # bulk_create no pasa por save(): el tsvector se calcula aparte
+        call_command("reindexar_busqueda", stdout=self.stdout)
+        if es_postgres():
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE mascotas_mascota")
+
+    def _limpiar(self):
+        get_user_model().objects.filter(username=PREFIJO).delete()
+
+    def handle(self, *args, **options):
+        if options["sembrar"]:
+            self.stdout.write(f"Sembrando {options['sembrar']} mascotas...")
+            self._sembrar(options["sembrar"])
+        try:
+            self._medir(options["repeticiones"])
+        finally:
+            if options["sembrar"] and not options["conservar"]:
+                self._limpiar()
+
+    def _medir(self, repeticiones):
+        host = next((h for h in settings.ALLOWED_HOSTS if h and h != "*"), "localhost")
+        request = RequestFactory().get("/api/buscar", HTTP_HOST=host)
+        total = Mascota.objects.count()
+        motor = "PostgreSQL (tsvector + GIN)" if es_postgres() else f"{connection.vendor} (respaldo LIKE)"
+        self.stdout.write(f"{total} mascotas, {motor}")
+        for consulta in CONSULTAS:
+            muestras = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                pagina = buscar(request, consulta)
+                muestras.append(time.perf_counter() - inicio)
+            muestras.sort()
+            inicio = time.perf_counter()
+            if pagina["siguiente"]:
+                buscar(request, consulta, cursor=pagina["siguiente"])
+            segunda = time.perf_counter() - inicio
+            self.stdout.write(
+                f"  {consulta!r}: p50 {1000 * statistics.median(muestras):.1f} ms, "
+                f"p95 {1000 * muestras[int(len(muestras) * 0.95) - 1]:.1f} ms, "
+                f"página 2 {1000 * segunda:.1f} ms ({len(pagina['resultados'])} resultados)"
+            )
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.imagenes import ImagenInvalida
+from mascotas.jobs import encolar_embedding
+from mascotas.models import Mascota
+from servicios.models import Servicio
+
+MODELOS = {"mascotas": Mascota, "servicios": Servicio}
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera miniatura y media (y dimensiones) para las imágenes ya "
+        "subidas; con --recortar también limita los originales a MAX_LADO"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modelo", choices=[*MODELOS, "todos"], default="todos")
+        parser.add_argument("--force", action="store_true",
+                            help="Regenera aunque ya tengan variantes")
+        parser.add_argument("--recortar", action="store_true",
+                            help="Reemplaza los originales que superan MAX_LADO o tienen rotación EXIF")
+        parser.add_argument("--lote", type=int, default=200)
+
+    def handle(self, *args, **options):
+        modelos = MODELOS.values() if options["modelo"] == "todos" else [MODELOS[options["modelo"]]]
+        for modelo in modelos:
+            self._procesar(modelo, options)
+
+    def _procesar(self, modelo, options):
+        pendientes = modelo.objects.exclude(imagen="").exclude(imagen__isnull=True)
+        if not options["force"]:
+            pendientes = pendientes.filter(imagen_miniatura__in=["", None])
+        total = pendientes.count()
+        nombre = modelo._meta.verbose_name_plural
+        self.stdout.write(f"{nombre}: {total} imágenes por procesar")
+
+        hechas = recortadas = errores = 0
+        for instancia in pendientes.order_by("pk").iterator(chunk_size=options["lote"]):
+            try:
+                # Conteos de referencias y guardado juntos, como en las vistas
+                with transaction.atomic():
+                    recortada = instancia.generar_variantes(recortar=options["recortar"])
+                    campos = [
+                        "imagen_miniatura", "miniatura_ancho", "miniatura_alto",
+                        "imagen_media", "media_ancho", "media_alto",
+                        "imagen_ancho", "imagen_alto",
+                    ]
+                    if recortada:
+                        campos.append("imagen")
+                        recortadas += 1
+                    instancia.save(update_fields=campos)
+                if "imagen" in campos and isinstance(instancia, Mascota):
+                    # El original cambió: el embedding se recalcula
+                    encolar_embedding(instancia)
+                hechas += 1
+            except (ImagenInvalida, OSError) as e:
+                errores += 1
+                self.stderr.write(f"  {nombre} {instancia.pk}: {e}")
+            if hechas and hechas % options["lote"] == 0:
+                self.stdout.write(f"  {hechas}/{total}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{nombre}: {hechas} procesadas, {recortadas} originales recortados, {errores} errores"
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from api.busqueda import actualizar_vectores, es_postgres, modelos_buscables
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula la columna tsvector de búsqueda de mascotas y servicios "
+        "(tras cargar datos con bulk_create o cambiar CAMPOS_BUSQUEDA)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=20000, help="Filas por UPDATE")
+
+    def handle(self, *args, **options):
+        if not es_postgres():
+            self.stdout.write("La columna de búsqueda solo se usa en PostgreSQL; nada que hacer")
+            return
+        for nombre, modelo in modelos_buscables().items():
+            ultimo = modelo.objects.aggregate(m=Max("pk"))["m"] or 0
+            total = 0
+            # Por rangos de pk para no bloquear la tabla en una sola transacción
+            for desde in range(0, ultimo, options["lote"]):
+                total += actualizar_vectores(
+                    modelo.objects.filter(pk__gt=desde, pk__lte=desde + options["lote"])
+                )
+            self.stdout.write(self.style.SUCCESS(f"{nombre}: {total} filas reindexadas"))
@@ -0,0 +1,32 @@
+"""
+URLs absolutas de archivos de MEDIA_ROOT para serializar listados.
+
+FieldFile.url pasa por el storage y request.build_absolute_uri() valida el
+host en cada llamada; en un listado eso se repite por fila y por campo.
+UrlsMedia resuelve la base (esquema + host + MEDIA_URL) una vez por
+petición y luego solo concatena el nombre guardado en la columna. Con un
+storage distinto de FileSystemStorage (S3, etc.) se usa storage.url().
+"""
+from urllib.parse import urljoin
+
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.encoding import filepath_to_uri
+
+
+class UrlsMedia:
+
+    def __init__(self, request, storage=None):
+        self.storage = storage or default_storage
+        self._local = isinstance(self.storage, FileSystemStorage)
+        if self._local:
+            self.base = request.build_absolute_uri(self.storage.base_url)
+        else:
+            self.base = request.build_absolute_uri("/")
+
+    def __call__(self, nombre):
+        if not nombre:
+            return None
+        if self._local:
+            return self.base + filepath_to_uri(nombre).lstrip("/")
+        # URLs ya absolutas (p. ej. S3) quedan igual
+        return urljoin(self.base, self.storage.url(nombre))
@@ -1,3 +1,204 @@
-from django.db import models
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import F
 
-# Create your models here.
+from django.contrib.postgres.search import SearchVectorField
+
+from .busqueda import actualizar_vectores
+from .imagenes import dimensiones, procesar
+
+
+# p. ej. mascotas/miniaturas/perro.webp
+def ruta_miniatura(instance, filename):
+    return f"{instance._meta.app_label}/miniaturas/{filename}"
+
+
+def ruta_media(instance, filename):
+    return f"{instance._meta.app_label}/medias/{filename}"
+
+
+class ArchivoMedia(models.Model):
+    """
+    Archivo de MEDIA_ROOT guardado con su SHA-256 como nombre. Subidas con
+    el mismo contenido comparten el archivo; `referencias` cuenta cuántos
+    campos lo usan y el archivo se borra cuando llega a cero.
+    """
+    ruta = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    tamano = models.PositiveBigIntegerField()
+    referencias = models.PositiveIntegerField(default=0)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.ruta} ({self.referencias})"
+
+    @classmethod
+    def guardar(cls, carpeta, procesada):
+        """Escribe el contenido si no existe y suma una referencia. Retorna la ruta"""
+        ruta = f"{carpeta}/{procesada.sha256}.{procesada.extension}"
+        # El archivo subido se copia (o se mueve, si es temporal) por bloques
+        contenido = procesada.datos if isinstance(procesada.datos, File) else ContentFile(procesada.datos)
+        with transaction.atomic():
+            archivo, _ = cls.objects.select_for_update().get_or_create(
+                ruta=ruta,
+                defaults={"sha256": procesada.sha256, "tamano": procesada.tamano},
+            )
+            if not default_storage.exists(ruta):
+                nombre = default_storage.save(ruta, contenido)
+                if nombre != ruta:
+                    # Otro proceso lo escribió al mismo tiempo: mismo contenido
+                    default_storage.delete(nombre)
+            cls.objects.filter(pk=archivo.pk).update(referencias=F("referencias") + 1)
+        return ruta
+
+    @classmethod
+    def liberar(cls, ruta):
+        """
+        Resta una referencia y borra el archivo si era la última. Los
+        archivos anteriores al conteo (sin registro) se borran directamente.
+        El archivo se borra al confirmar la transacción de quien llama: si
+        esta se revierte, el registro y el archivo siguen juntos.
+        """
+        if not ruta:
+            return
+        with transaction.atomic():
+            archivo = cls.objects.select_for_update().filter(ruta=ruta).first()
+            if archivo is None:
+                transaction.on_commit(lambda: cls._borrar_huerfano(ruta))
+            elif archivo.referencias > 1:
+                cls.objects.filter(pk=archivo.pk).update(referencias=F("referencias") - 1)
+            else:
+                archivo.delete()
+                transaction.on_commit(lambda: cls._borrar_huerfano(ruta))
+
+    @classmethod
+    def _borrar_huerfano(cls, ruta):
+        # Otra subida del mismo contenido pudo registrarlo de nuevo entretanto
+        if not cls.objects.filter(ruta=ruta).exists():
+            default_storage.delete(ruta)
+
+
+class ImagenVariantes(models.Model):
+    """
+    Variantes reducidas de `imagen` (declarada en el modelo concreto) y sus
+    dimensiones. Las imágenes se asignan con asignar_imagen() o, junto con
+    el save(), guardar_con_imagen() (ver api/imagenes.py) y se guardan
+    direccionadas por contenido en ArchivoMedia. Las dimensiones se copian
+    del procesado; no se usan width_field/height_field, que abren el
+    archivo al cargar cada fila.
+    """
+    imagen_ancho = models.PositiveIntegerField(null=True, blank=True)
+    imagen_alto = models.PositiveIntegerField(null=True, blank=True)
+    imagen_miniatura = models.ImageField(upload_to=ruta_miniatura, null=True, blank=True)
+    miniatura_ancho = models.PositiveIntegerField(null=True, blank=True)
+    miniatura_alto = models.PositiveIntegerField(null=True, blank=True)
+    imagen_media = models.ImageField(upload_to=ruta_media, null=True, blank=True)
+    media_ancho = models.PositiveIntegerField(null=True, blank=True)
+    media_alto = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+    def imagen_procesada(self, procesadas):
+        """Gancho para derivar datos de la imagen ya decodificada (p. ej. Mascota.phash)"""
+
+    def _guardar_variantes(self, procesadas):
+        self.imagen_procesada(procesadas)
+        carpeta = self._meta.app_label
+        miniatura, media = procesadas["miniatura"], procesadas["media"]
+        self.imagen_miniatura = ArchivoMedia.guardar(f"{carpeta}/miniaturas", miniatura)
+        self.miniatura_ancho, self.miniatura_alto = miniatura.ancho, miniatura.alto
+        self.imagen_media = ArchivoMedia.guardar(f"{carpeta}/medias", media)
+        self.media_ancho, self.media_alto = media.ancho, media.alto
+
+    def _rutas_imagenes(self):
+        return [f.name for f in (self.imagen, self.imagen_miniatura, self.imagen_media) if f]
+
+    def asignar_imagen(self, archivo):
+        """
+        Procesa la subida y asigna original y variantes (sin guardar el
+        modelo). Lanza api.imagenes.ImagenInvalida si no es una imagen.
+        """
+        self.asignar_procesadas(procesar(archivo))
+
+    def asignar_procesadas(self, procesadas):
+        """
+        Asigna original y variantes ya procesados (sin guardar el modelo);
+        los archivos anteriores se liberan. Los conteos de referencias se
+        escriben al llamar: usar guardar_con_imagen() para que vayan en la
+        misma transacción que el save().
+        """
+        anteriores = self._rutas_imagenes()
+        original = procesadas["original"]
+        self.imagen = ArchivoMedia.guardar(self._meta.app_label, original)
+        self.imagen_ancho, self.imagen_alto = original.ancho, original.alto
+        self._guardar_variantes(procesadas)
+        for ruta in anteriores:
+            ArchivoMedia.liberar(ruta)
+
+    def generar_variantes(self, recortar=False):
+        """
+        Variantes a partir del original ya guardado (backfill). Con
+        `recortar` el original se reemplaza si el procesado lo cambió.
+        Retorna True si el original cambió.
+        """
+        with self.imagen.open("rb") as archivo:
+            entrada = dimensiones(archivo)
+            procesadas = procesar(archivo)
+        anteriores = [f.name for f in (self.imagen_miniatura, self.imagen_media) if f]
+        self._guardar_variantes(procesadas)
+        original = procesadas["original"]
+        # procesar() solo entrega bytes si tuvo que reescribir el original
+        cambiado = recortar and isinstance(original.datos, bytes)
+        if cambiado:
+            anteriores.append(self.imagen.name)
+            self.imagen = ArchivoMedia.guardar(self._meta.app_label, original)
+            self.imagen_ancho, self.imagen_alto = original.ancho, original.alto
+        else:
+            self.imagen_ancho, self.imagen_alto = entrada
+        for ruta in anteriores:
+            ArchivoMedia.liberar(ruta)
+        return cambiado
+
+    def eliminar_imagenes(self):
+        for ruta in self._rutas_imagenes():
+            ArchivoMedia.liberar(ruta)
+        self.imagen = self.imagen_miniatura = self.imagen_media = None
+
+    def guardar_con_imagen(self, procesadas=None):
+        """
+        save() y la asignación de la imagen (api.imagenes.procesar) en una
+        transacción: si el guardado falla no quedan referencias sumadas ni
+        archivos anteriores liberados
+        """
+        with transaction.atomic():
+            if procesadas is not None:
+                self.asignar_procesadas(procesadas)
+            self.save()
+
+    def eliminar_con_imagenes(self):
+        with transaction.atomic():
+            self.eliminar_imagenes()
+            self.delete()
+
+
+class Buscable(models.Model):
+    """
+    Columna tsvector para /api/buscar (ver api/busqueda.py). El modelo
+    concreto declara CAMPOS_BUSQUEDA = {campo: peso 'A'-'D'} y los campos
+    adicionales que devuelve la búsqueda en CAMPOS_EXTRA_BUSQUEDA.
+    """
+    CAMPOS_BUSQUEDA = {}
+    CAMPOS_EXTRA_BUSQUEDA = ()
+
+    busqueda = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or set(update_fields) & set(self.CAMPOS_BUSQUEDA):
+            actualizar_vectores(type(self).objects.filter(pk=self.pk))
@@ -0,0 +1,83 @@
+"""
+Paginación por keyset (cursor) para los listados.
+
+Se ordena por (campo de fecha, id) descendente y la siguiente página se
+pide con un cursor firmado que guarda la última pareja entregada; la base
+de datos salta directamente a esa posición con el índice compuesto, así
+el costo de una página no depende del tamaño de la tabla (a diferencia
+de OFFSET).
+
+Sin `limite` se usa API_PAGINA_DEFECTO; con API_PAGINA_DEFECTO = 0 esas
+peticiones reciben la lista completa, como antes de paginar.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from ninja.errors import HttpError
+
+SALT = "api.paginacion"
+
+
+def codificar_cursor(fecha, pk):
+    return signing.dumps([fecha.isoformat(), pk], salt=SALT, compress=True)
+
+
+def decodificar_cursor(cursor):
+    try:
+        fecha, pk = signing.loads(cursor, salt=SALT)
+        return datetime.fromisoformat(fecha), int(pk)
+    except (signing.BadSignature, ValueError, TypeError):
+        raise HttpError(400, "Cursor de paginación inválido")
+
+
+def limite_pagina(limite):
+    """Tamaño de la página, o None para la lista completa"""
+    maximo = settings.API_PAGINA_MAXIMA
+    if limite is None:
+        return settings.API_PAGINA_DEFECTO or None
+    if not 1 <= limite <= maximo:
+        raise HttpError(400, f"limite debe estar entre 1 y {maximo}")
+    return limite
+
+
+def _ordenar(queryset, campo, cursor):
+    queryset = queryset.order_by(f"-{campo}", "-pk")
+    if cursor:
+        fecha, pk = decodificar_cursor(cursor)
+        queryset = queryset.filter(Q(**{f"{campo}__lt": fecha}) | Q(**{campo: fecha, "pk__lt": pk}))
+    return queryset
+
+
+def _cortar(filas, campo, limite):
+    siguiente = None
+    if limite is not None and len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        if isinstance(ultima, dict):
+            siguiente = codificar_cursor(ultima[campo], ultima["id"])
+        else:
+            siguiente = codificar_cursor(getattr(ultima, campo), ultima.pk)
+    return filas, siguiente
+
+
+def paginar(queryset, campo, cursor=None, limite=None):
+    """
+    Retorna (filas de la página, cursor siguiente o None). Acepta también
+    querysets de .values() que incluyan `campo` y 'id'.
+    """
+    limite = limite_pagina(limite)
+    queryset = _ordenar(queryset, campo, cursor)
+    if limite is not None:
+        queryset = queryset[:limite + 1]
+    return _cortar(list(queryset), campo, limite)
+
+
+async def apaginar(queryset, campo, cursor=None, limite=None):
+    """paginar() con el ORM async, para handlers async"""
+    limite = limite_pagina(limite)
+    queryset = _ordenar(queryset, campo, cursor)
+    if limite is not None:
+        queryset = queryset[:limite + 1]
+    return _cortar([fila async for fila in queryset], campo, limite)
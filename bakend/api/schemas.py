@@ -0,0 +1,22 @@
+from typing import Optional
+
+from ninja import Schema
+
+
+class ResultadoBusquedaSchema(Schema):
+    tipo: str  # mascota | servicio
+    id: int
+    nombre: str
+    descripcion: Optional[str] = None
+    imagen_miniatura: Optional[str] = None
+    puntaje: float
+    # Solo mascotas
+    raza: Optional[str] = None
+    tipo_reporte: Optional[str] = None
+    # Solo servicios
+    telefono: Optional[str] = None
+
+
+class BusquedaSchema(Schema):
+    resultados: list[ResultadoBusquedaSchema]
+    siguiente: Optional[str] = None
@@ -1,3 +1,279 @@
-from django.test import TestCase
+import io
+import tempfile
+from datetime import timedelta
+from pathlib import Path
 
-# Create your tests here.
+import jwt
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+from django.http import FileResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from ninja.errors import HttpError
+from PIL import Image
+
+from mascotas.models import Mascota
+from servicios.models import Servicio
+from usuarios.models import User
+
+from .busqueda import buscar, codificar_cursor, decodificar_cursor
+from .imagenes import procesar
+from .models import ArchivoMedia
+from .paginacion import apaginar, limite_pagina, paginar
+from .views import servir_media
+
+
+class BusquedaSqliteTests(TestCase):
+    """Respaldo de SQLite de /api/buscar: mismo orden y cursor que PostgreSQL"""
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = User.objects.create(username="u1", email="u1@x.com", password="x")
+        # Varios empates de puntaje, en ambos tipos, para que el cursor los cruce
+        for i in range(5):
+            Mascota.objects.create(
+                nombre=f"Lúa {i}", raza="Criollo", tipo_reporte="Pérdida",
+                descripcion="perdida en el parque", propietario=usuario,
+            )
+        for i in range(3):
+            Mascota.objects.create(
+                nombre=f"Toby {i}", raza="Beagle", tipo_reporte="Encontrada",
+                descripcion="se parece a lua", propietario=usuario,
+            )
+        for i in range(3):
+            Servicio.objects.create(nombre=f"Paseos Lua {i}", descripcion="paseador", propietario=usuario)
+        Servicio.objects.create(nombre="Veterinaria", descripcion="atiende a lua", propietario=usuario)
+
+    def setUp(self):
+        self.request = RequestFactory().get("/api/buscar")
+
+    def _claves(self, respuesta):
+        return [(r["tipo"], r["id"]) for r in respuesta["resultados"]]
+
+    def test_sin_tildes_ni_mayusculas(self):
+        respuesta = buscar(self.request, "LUA", limite=100)
+        self.assertEqual(len(respuesta["resultados"]), 12)
+        self.assertIsNone(respuesta["siguiente"])
+        # El nombre (A) puntúa más que la descripción (C)
+        self.assertTrue(respuesta["resultados"][0]["nombre"].startswith(("Lúa", "Paseos")))
+        self.assertEqual(respuesta["resultados"][-1]["puntaje"], 0.2)
+
+    def test_paginas_por_cursor_sin_repetir_ni_omitir(self):
+        completa = self._claves(buscar(self.request, "lua", limite=100))
+        paginas, cursor = [], None
+        while True:
+            respuesta = buscar(self.request, "lua", cursor=cursor, limite=2)
+            paginas.extend(self._claves(respuesta))
+            cursor = respuesta["siguiente"]
+            if cursor is None:
+                break
+        self.assertEqual(paginas, completa)
+
+    def test_filtro_por_tipo(self):
+        respuesta = buscar(self.request, "lua", tipo="servicio", limite=100)
+        self.assertEqual({r["tipo"] for r in respuesta["resultados"]}, {"servicio"})
+        self.assertEqual(len(respuesta["resultados"]), 4)
+
+    def test_cursor_alterado(self):
+        cursor = codificar_cursor(0.2, "mascota", 1)
+        self.assertEqual(decodificar_cursor(cursor), (0.2, 0, 1))
+        with self.assertRaises(HttpError) as error:
+            buscar(self.request, "lua", cursor=cursor[:-2] + "xx")
+        self.assertEqual(error.exception.status_code, 400)
+
+    @override_settings(API_PAGINA_DEFECTO=0)
+    def test_sin_limite_por_defecto_usa_el_maximo(self):
+        respuesta = buscar(self.request, "lua")
+        self.assertEqual(len(respuesta["resultados"]), 12)
+        self.assertIsNone(respuesta["siguiente"])
+        with override_settings(API_PAGINA_MAXIMA=5):
+            respuesta = buscar(self.request, "lua")
+        self.assertEqual(len(respuesta["resultados"]), 5)
+        self.assertIsNotNone(respuesta["siguiente"])
+
+    def test_texto_corto(self):
+        with self.assertRaises(HttpError):
+            buscar(self.request, "a")
+
+
+class PaginacionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create(username="u1", email="u1@x.com", password="x")
+        for i in range(7):
+            Servicio.objects.create(nombre=f"s{i}", descripcion="d", propietario=cls.usuario)
+        # Empates en la fecha de orden: solo el id los desempata
+        ahora = timezone.now()
+        ids = list(Servicio.objects.order_by("pk").values_list("pk", flat=True))
+        for grupo, fecha in ((ids[:3], ahora), (ids[3:6], ahora - timedelta(hours=1)), (ids[6:], ahora + timedelta(hours=1))):
+            Servicio.objects.filter(pk__in=grupo).update(created_at=fecha)
+
+    def _recorrer(self, queryset, limite):
+        filas, cursor = [], None
+        while True:
+            pagina, cursor = paginar(queryset, "created_at", cursor, limite)
+            self.assertLessEqual(len(pagina), limite)
+            filas.extend(f["id"] if isinstance(f, dict) else f.pk for f in pagina)
+            if cursor is None:
+                return filas
+
+    def test_empates_sin_repetir_ni_omitir(self):
+        esperado = list(Servicio.objects.order_by("-created_at", "-pk").values_list("pk", flat=True))
+        for limite in (1, 2, 3, 7):
+            self.assertEqual(self._recorrer(Servicio.objects.all(), limite), esperado)
+            self.assertEqual(self._recorrer(Servicio.objects.values("id", "created_at"), limite), esperado)
+
+    def test_apaginar(self):
+        filas, cursor = async_to_sync(apaginar)(Servicio.objects.all(), "created_at", None, 4)
+        self.assertEqual(len(filas), 4)
+        resto, cursor = async_to_sync(apaginar)(Servicio.objects.all(), "created_at", cursor, 4)
+        self.assertEqual(len(resto), 3)
+        self.assertIsNone(cursor)
+
+    def test_cursor_alterado_o_de_otra_firma(self):
+        _, cursor = paginar(Servicio.objects.all(), "created_at", None, 2)
+        ajeno = codificar_cursor(1.0, "servicio", 1)  # firmado para /api/buscar
+        for malo in (cursor[:-3] + "abc", ajeno, "no-es-un-cursor"):
+            with self.assertRaises(HttpError) as error:
+                paginar(Servicio.objects.all(), "created_at", malo, 2)
+            self.assertEqual(error.exception.status_code, 400)
+
+    def test_cursor_alterado_responde_400(self):
+        token = jwt.encode({"user_id": self.usuario.id}, settings.SECRET_KEY, algorithm="HS256")
+        respuesta = self.client.get(
+            "/api/servicios/lista", {"cursor": "no-es-un-cursor"}, HTTP_AUTHORIZATION=f"Bearer {token}"
+        )
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_limites(self):
+        with override_settings(API_PAGINA_DEFECTO=0):
+            self.assertIsNone(limite_pagina(None))
+            filas, cursor = paginar(Servicio.objects.all(), "created_at")
+            self.assertEqual((len(filas), cursor), (7, None))
+        with override_settings(API_PAGINA_DEFECTO=3):
+            filas, cursor = paginar(Servicio.objects.all(), "created_at")
+            self.assertEqual(len(filas), 3)
+            self.assertIsNotNone(cursor)
+        self.assertEqual(limite_pagina(settings.API_PAGINA_MAXIMA), settings.API_PAGINA_MAXIMA)
+        for limite in (0, -1, settings.API_PAGINA_MAXIMA + 1):
+            with self.assertRaises(HttpError) as error:
+                limite_pagina(limite)
+            self.assertEqual(error.exception.status_code, 400)
+
+
+class ServirMediaTests(SimpleTestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.contenido = bytes(range(256)) * 1024
+        (Path(directorio.name) / "fotos").mkdir()
+        (Path(directorio.name) / "fotos" / "lúa 1.jpg").write_bytes(self.contenido)
+        ajustes = override_settings(MEDIA_ROOT=directorio.name, MEDIA_ENVIO=None)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def _cuerpo_async(self, respuesta):
+        async def leer():
+            self.assertTrue(respuesta.is_async)
+            return b"".join([parte async for parte in respuesta])
+        return async_to_sync(leer)()
+
+    def test_x_accel_redirect_codificado(self):
+        with override_settings(MEDIA_ENVIO="x-accel", MEDIA_ACCEL_PREFIJO="/media-interno/"):
+            respuesta = servir_media(RequestFactory().get("/media/fotos/x"), "fotos/lúa 1.jpg")
+        self.assertEqual(respuesta["X-Accel-Redirect"], "/media-interno/fotos/l%C3%BAa%201.jpg")
+
+    def test_wsgi_usa_file_response(self):
+        respuesta = servir_media(RequestFactory().get("/media/fotos/x"), "fotos/lúa 1.jpg")
+        self.assertIsInstance(respuesta, FileResponse)
+        self.assertEqual(b"".join(respuesta), self.contenido)
+
+    def test_asgi_completo_y_rango_sin_iterador_sincrono(self):
+        respuesta = servir_media(AsyncRequestFactory().get("/media/fotos/x"), "fotos/lúa 1.jpg")
+        self.assertEqual(respuesta["Content-Length"], str(len(self.contenido)))
+        self.assertEqual(self._cuerpo_async(respuesta), self.contenido)
+
+        peticion = AsyncRequestFactory().get("/media/fotos/x", headers={"Range": "bytes=100000-200000"})
+        respuesta = servir_media(peticion, "fotos/lúa 1.jpg")
+        self.assertEqual(respuesta.status_code, 206)
+        self.assertEqual(self._cuerpo_async(respuesta), self.contenido[100000:200001])
+
+
+def _subida(color):
+    salida = io.BytesIO()
+    Image.new("RGB", (64, 48), color).save(salida, "PNG")
+    return SimpleUploadedFile("foto.png", salida.getvalue(), content_type="image/png")
+
+
+class ArchivoMediaTests(TestCase):
+    """Conteo de referencias de los archivos direccionados por contenido"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create(username="u1", email="u1@x.com", password="x")
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def _servicio(self, color):
+        servicio = Servicio(nombre="Paseos", descripcion="d", propietario=self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            servicio.guardar_con_imagen(procesar(_subida(color)))
+        return servicio
+
+    def _referencias(self, servicio):
+        return {
+            ruta: ArchivoMedia.objects.filter(ruta=ruta).values_list("referencias", flat=True).first()
+            for ruta in servicio._rutas_imagenes()
+        }
+
+    def _existen(self, rutas):
+        return [default_storage.exists(ruta) for ruta in rutas]
+
+    def test_subida(self):
+        servicio = self._servicio("red")
+        rutas = servicio._rutas_imagenes()
+        self.assertEqual(len(rutas), 3)
+        self.assertEqual(list(self._referencias(servicio).values()), [1, 1, 1])
+        self.assertEqual(self._existen(rutas), [True] * 3)
+
+    def test_reemplazo_libera_los_anteriores(self):
+        servicio = self._servicio("red")
+        anteriores = servicio._rutas_imagenes()
+        with self.captureOnCommitCallbacks(execute=True):
+            servicio.guardar_con_imagen(procesar(_subida("blue")))
+        self.assertFalse(ArchivoMedia.objects.filter(ruta__in=anteriores).exists())
+        self.assertEqual(self._existen(anteriores), [False] * 3)
+        self.assertEqual(list(self._referencias(servicio).values()), [1, 1, 1])
+        self.assertEqual(self._existen(servicio._rutas_imagenes()), [True] * 3)
+
+    def test_archivo_compartido(self):
+        primero, segundo = self._servicio("green"), self._servicio("green")
+        rutas = primero._rutas_imagenes()
+        self.assertEqual(rutas, segundo._rutas_imagenes())
+        self.assertEqual(list(self._referencias(primero).values()), [2, 2, 2])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            primero.eliminar_con_imagenes()
+        self.assertEqual(list(self._referencias(segundo).values()), [1, 1, 1])
+        self.assertEqual(self._existen(rutas), [True] * 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            segundo.eliminar_con_imagenes()
+        self.assertFalse(ArchivoMedia.objects.filter(ruta__in=rutas).exists())
+        self.assertEqual(self._existen(rutas), [False] * 3)
+
+    def test_guardado_fallido_no_suma_referencias(self):
+        servicio = Servicio(nombre="Paseos", descripcion="d")  # sin propietario: falla el save()
+        with self.assertRaises(IntegrityError):
+            servicio.guardar_con_imagen(procesar(_subida("red")))
+        self.assertFalse(ArchivoMedia.objects.exists())
@@ -1,3 +1,177 @@
-from django.shortcuts import render
+"""
+Servidor de archivos de MEDIA_ROOT con validadores HTTP.
 
-# Create your views here.
+- ETag fuerte (hash del contenido si el nombre ya lo es, si no tamaño +
+  mtime en ns) y Last-Modified; 304/412 según If-None-Match,
+  If-Modified-Since, If-Match e If-Unmodified-Since.
+- Range de un solo intervalo (206/416) con If-Range.
+- Nombres direccionados por contenido (SHA-256 hex) se sirven con
+  Cache-Control inmutable de un año.
+- Con MEDIA_ENVIO = 'x-accel' o 'x-sendfile' el cuerpo lo entrega el
+  proxy (nginx / Apache) y Django solo responde las cabeceras.
+- Bajo ASGI el cuerpo es un iterador async que lee cada bloque en un hilo:
+  Django bufferiza en memoria los iteradores síncronos (también el de
+  FileResponse) antes de enviarlos.
+"""
+import hashlib
+import mimetypes
+import re
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.encoding import filepath_to_uri
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+UN_ANO = 365 * 24 * 3600
+TAMANO_BLOQUE = 64 * 1024
+PATRON_CONTENIDO = re.compile(r"^(?P<hash>[0-9a-f]{64})(\.[A-Za-z0-9]+)?$")
+PATRON_RANGO = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _archivo(ruta):
+    raiz = Path(settings.MEDIA_ROOT).resolve()
+    destino = (raiz / ruta).resolve()
+    if not destino.is_relative_to(raiz) or not destino.is_file():
+        raise Http404("Archivo no encontrado")
+    return destino
+
+
+def _etag(destino, estado):
+    coincidencia = PATRON_CONTENIDO.match(destino.name)
+    if coincidencia:
+        return f'"{coincidencia.group("hash")}"', True
+    huella = hashlib.sha1(f"{estado.st_size}-{estado.st_mtime_ns}".encode()).hexdigest()[:20]
+    return f'"{huella}"', False
+
+
+def _rango(cabecera, tamano):
+    """(inicio, fin) inclusivo, None si se ignora el Range, o False si es insatisfacible"""
+    coincidencia = PATRON_RANGO.match(cabecera.replace(" ", ""))
+    if not coincidencia:
+        return None  # varios intervalos o unidad distinta: respuesta completa
+    inicio, fin = coincidencia.groups()
+    if not inicio and not fin:
+        return None
+    if not inicio:
+        # Sufijo: los últimos N bytes
+        largo = int(fin)
+        if largo == 0:
+            return False
+        return max(0, tamano - largo), tamano - 1
+    inicio = int(inicio)
+    fin = min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or fin < inicio:
+        return False
+    return inicio, fin
+
+
+def _if_range_vigente(request, etag, mtime):
+    valor = request.headers.get("If-Range")
+    if not valor:
+        return True
+    if valor.startswith('"') or valor.startswith("W/"):
+        return valor == etag  # comparación fuerte
+    fecha = parse_http_date_safe(valor)
+    return fecha is not None and int(mtime) <= fecha
+
+
+def _leer(destino, inicio, largo):
+    with open(destino, "rb") as archivo:
+        archivo.seek(inicio)
+        while largo > 0:
+            bloque = archivo.read(min(TAMANO_BLOQUE, largo))
+            if not bloque:
+                break
+            largo -= len(bloque)
+            yield bloque
+
+
+async def _aleer(destino, inicio, largo):
+    """_leer para ASGI: las lecturas no bloquean el event loop"""
+    with open(destino, "rb") as archivo:
+        leer = sync_to_async(archivo.read, thread_sensitive=False)
+        archivo.seek(inicio)
+        while largo > 0:
+            bloque = await leer(min(TAMANO_BLOQUE, largo))
+            if not bloque:
+                break
+            largo -= len(bloque)
+            yield bloque
+
+
+def _cuerpo(request, destino, inicio, largo):
+    if isinstance(request, ASGIRequest):
+        return _aleer(destino, inicio, largo)
+    return _leer(destino, inicio, largo)
+
+
+@require_safe
+def servir_media(request, ruta):
+    destino = _archivo(ruta)
+    estado = destino.stat()
+    tamano = estado.st_size
+    etag, inmutable = _etag(destino, estado)
+    tipo, codificacion = mimetypes.guess_type(destino.name)
+
+    base = HttpResponse()
+    base["ETag"] = etag
+    base["Last-Modified"] = http_date(estado.st_mtime)
+    base["Accept-Ranges"] = "bytes"
+    if inmutable:
+        base["Cache-Control"] = f"public, max-age={UN_ANO}, immutable"
+    else:
+        base["Cache-Control"] = f"public, max-age={getattr(settings, 'MEDIA_MAX_AGE', 0)}, must-revalidate"
+
+    condicional = get_conditional_response(request, etag=etag, last_modified=int(estado.st_mtime), response=base)
+    if condicional is not base:
+        return condicional
+
+    envio = getattr(settings, "MEDIA_ENVIO", None)
+    if envio:
+        # El proxy lee el archivo y atiende Range por su cuenta
+        if envio == "x-accel":
+            base["X-Accel-Redirect"] = getattr(settings, "MEDIA_ACCEL_PREFIJO", "/media-interno/") + filepath_to_uri(ruta)
+        else:
+            base["X-Sendfile"] = str(destino)
+        base["Content-Type"] = tipo or "application/octet-stream"
+        return base
+
+    rango = None
+    if "Range" in request.headers and _if_range_vigente(request, etag, estado.st_mtime):
+        rango = _rango(request.headers["Range"], tamano)
+    if rango is False:
+        respuesta = HttpResponse(status=416)
+        respuesta["Content-Range"] = f"bytes */{tamano}"
+        respuesta["Accept-Ranges"] = "bytes"
+        return respuesta
+
+    if rango:
+        inicio, fin = rango
+        largo = fin - inicio + 1
+        respuesta = (
+            HttpResponse(status=206) if request.method == "HEAD"
+            else StreamingHttpResponse(_cuerpo(request, destino, inicio, largo), status=206)
+        )
+        respuesta["Content-Range"] = f"bytes {inicio}-{fin}/{tamano}"
+        respuesta["Content-Length"] = str(largo)
+    elif request.method == "HEAD":
+        respuesta = HttpResponse()
+        respuesta["Content-Length"] = str(tamano)
+    elif isinstance(request, ASGIRequest):
+        respuesta = StreamingHttpResponse(_aleer(destino, 0, tamano))
+        respuesta["Content-Length"] = str(tamano)
+    else:
+        # FileResponse usa wsgi.file_wrapper (sendfile del servidor WSGI)
+        respuesta = FileResponse(open(destino, "rb"))
+
+    for cabecera in ("ETag", "Last-Modified", "Accept-Ranges", "Cache-Control"):
+        respuesta[cabecera] = base[cabecera]
+    respuesta["Content-Type"] = tipo or "application/octet-stream"
+    if codificacion:
+        respuesta["Content-Encoding"] = codificacion
+    return respuesta
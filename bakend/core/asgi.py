@@ -14,3 +14,14 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+# Misma precarga que core/wsgi.py para `gunicorn --preload -k
+# uvicorn.workers.UvicornWorker core.asgi`: los handlers async atienden
+# listas y CRUD en el event loop y la inferencia corre en el ejecutor
+# acotado (api/ejecutor.py).
+from django.conf import settings
+
+if settings.MASCOTAS_PRELOAD_MODEL:
+    from mascotas.embeddings import precargar_pesos
+
+    precargar_pesos()
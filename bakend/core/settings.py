@@ -19,7 +19,49 @@ ALLOWED_HOSTS = ['localhost', '127.0.0.1', os.getenv('NGROK_URL')]
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Media servida por api.views.servir_media. MEDIA_ENVIO: None (Django envía
+# el archivo), 'x-accel' (nginx, location interna MEDIA_ACCEL_PREFIJO) o
+# 'x-sendfile' (Apache mod_xsendfile). Los nombres SHA-256 son inmutables.
+MEDIA_ENVIO = os.getenv('MEDIA_ENVIO') or None
+MEDIA_ACCEL_PREFIJO = os.getenv('MEDIA_ACCEL_PREFIJO', '/media-interno/')
+MEDIA_MAX_AGE = int(os.getenv('MEDIA_MAX_AGE', '300'))
 CORS_ALLOW_ALL_ORIGINS = True 
+CORS_EXPOSE_HEADERS = ['X-Siguiente-Cursor', 'ETag', 'Last-Modified']
+
+# Paginación por cursor de los listados (api/paginacion.py). El frontend
+# pide `limite` y sigue los cursores; API_PAGINA_DEFECTO=0 mantiene la lista
+# completa para clientes que no envían `limite` (versiones anteriores de la app)
+API_PAGINA_DEFECTO = int(os.getenv('API_PAGINA_DEFECTO', '50'))
+API_PAGINA_MAXIMA = 200
+
+# Ingesta de imágenes (api/imagenes.py): original limitado a MAX_LADO px y
+# variantes miniatura/media. Imágenes ya subidas: python manage.py generar_variantes
+API_IMAGENES = {
+    'MAX_LADO': int(os.getenv('API_IMAGENES_MAX_LADO', '2048')),
+    'VARIANTES': {'miniatura': 320, 'media': 1024},
+    'FORMATO': os.getenv('API_IMAGENES_FORMATO', 'WEBP'),
+    'CALIDAD': 80,
+}
+# Los mismos de Django, más el SHA-256 de cada archivo calculado al recibirlo
+FILE_UPLOAD_HANDLERS = [
+    'api.imagenes.SubidaEnMemoriaConHash',
+    'api.imagenes.SubidaTemporalConHash',
+]
+
+# Ejecutores acotados para el trabajo de CPU bajo ASGI (api/ejecutor.py):
+# API_EJECUTOR para el match y los embeddings en línea, API_INGESTA para
+# procesar las imágenes subidas. Con HILOS ocupados y MAX_EN_COLA esperando,
+# la API responde 503 con Retry-After.
+API_EJECUTOR = {
+    'HILOS': int(os.getenv('API_EJECUTOR_HILOS', '2')),
+    'MAX_EN_COLA': int(os.getenv('API_EJECUTOR_MAX_EN_COLA', '16')),
+    'REINTENTAR_SEGUNDOS': int(os.getenv('API_EJECUTOR_REINTENTAR_SEGUNDOS', '2')),
+}
+API_INGESTA = {
+    'HILOS': int(os.getenv('API_INGESTA_HILOS', '2')),
+    'MAX_EN_COLA': int(os.getenv('API_INGESTA_MAX_EN_COLA', '8')),
+    'REINTENTAR_SEGUNDOS': int(os.getenv('API_INGESTA_REINTENTAR_SEGUNDOS', '2')),
+}
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -34,6 +76,7 @@ INSTALLED_APPS = [
     'usuarios',
     'mascotas',
     'servicios',
+    'mash',
     'ninja',
 ]
 
@@ -93,6 +136,138 @@ FIREBASE_CONFIG = {
     'project_id': os.getenv('FIREBASE_PROJECT_ID', 'mimascotasapp'),
 }
 
+# Caché: 'matches' guarda los resultados de /mascotas/match (ver mascotas/cache.py).
+# LocMemCache es LRU y por proceso; con varios workers usar Redis/Memcached.
+MATCH_CACHE_BACKEND = os.getenv('MATCH_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+    },
+    'matches': {
+        'BACKEND': MATCH_CACHE_BACKEND,
+        'LOCATION': os.getenv('MATCH_CACHE_LOCATION', 'matches'),
+        'TIMEOUT': int(os.getenv('MATCH_CACHE_TIMEOUT', '600')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('MATCH_CACHE_MAX_ENTRIES', '10000')),
+        } if 'locmem' in MATCH_CACHE_BACKEND else {},
+    },
+    # Versiones de invalidación y contadores de /mascotas/match: sin TIMEOUT y
+    # fuera del LRU de los resultados
+    'match_versiones': {
+        'BACKEND': MATCH_CACHE_BACKEND,
+        'LOCATION': os.getenv('MATCH_CACHE_VERSIONES_LOCATION') or (
+            'match_versiones' if 'locmem' in MATCH_CACHE_BACKEND else os.getenv('MATCH_CACHE_LOCATION', 'matches')
+        ),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('MATCH_CACHE_VERSIONES_MAX_ENTRIES', '1000000')),
+        } if 'locmem' in MATCH_CACHE_BACKEND else {},
+    },
+}
+# Usuarios de JWTAuth e invalidaciones entre workers: solo con un servicio
+# compartido (Redis o Memcached), p. ej.
+# AUTH_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# AUTH_CACHE_LOCATION=redis://127.0.0.1:6379/2
+if os.getenv('AUTH_CACHE_BACKEND'):
+    CACHES['usuarios'] = {
+        'BACKEND': os.getenv('AUTH_CACHE_BACKEND'),
+        'LOCATION': os.getenv('AUTH_CACHE_LOCATION'),
+    }
+MASCOTAS_MATCH_CACHE_ALIAS = 'matches'
+MASCOTAS_MATCH_CACHE_VERSIONES_ALIAS = 'match_versiones'
+
+# Caché de usuarios de JWTAuth (usuarios/cache.py). COMPARTIDA: alias de
+# CACHES (Redis o Memcached) para compartir usuarios e invalidaciones entre
+# procesos; por defecto 'usuarios' si AUTH_CACHE_BACKEND está definido.
+# Vacío = solo caché local por proceso: un usuario editado o eliminado sigue
+# válido en los demás workers hasta que vence el TTL.
+AUTH_USUARIOS_CACHE = {
+    'TTL_SEGUNDOS': int(os.getenv('AUTH_CACHE_TTL', '60')),
+    'MAX_ENTRADAS': int(os.getenv('AUTH_CACHE_MAX_ENTRADAS', '2048')),
+    'COMPARTIDA': os.getenv('AUTH_CACHE_COMPARTIDA', 'usuarios' if 'usuarios' in CACHES else '') or None,
+    'TIMEOUT_COMPARTIDA': 300,
+}
+
+# Matching de mascotas
+# Lee los bytes del modelo exportado (tflite/onnx) al importar core.wsgi / core.asgi
+# (usar con gunicorn --preload); no aplica al backend keras
+MASCOTAS_PRELOAD_MODEL = os.getenv('MASCOTAS_PRELOAD_MODEL', 'False') == 'True'
+
+# Los embeddings se generan en segundo plano con: python manage.py run_embedding_worker
+# (False = se generan en la misma petición, útil en desarrollo sin worker)
+MASCOTAS_EMBEDDING_ASINCRONO = os.getenv('MASCOTAS_EMBEDDING_ASINCRONO', 'True') == 'True'
+MASCOTAS_EMBEDDING_COLA = {
+    'MAX_INTENTOS': 5,
+    'BACKOFF_BASE_SEGUNDOS': 10,
+    'BACKOFF_MAX_SEGUNDOS': 3600,
+    'TIMEOUT_SEGUNDOS': 600,
+}
+
+# Backend de inferencia del extractor: 'keras', 'tflite' u 'onnx'.
+# Los modelos tflite/onnx se generan con: python manage.py exportar_modelo
+# y se validan con: python manage.py comparar_extractores
+MASCOTAS_EMBEDDING = {
+    'BACKEND': os.getenv('MASCOTAS_EMBEDDING_BACKEND', 'keras'),
+    'MODEL_PATH': os.getenv('MASCOTAS_EMBEDDING_MODEL_PATH'),
+    'QUANTIZATION': os.getenv('MASCOTAS_EMBEDDING_QUANTIZATION', 'none'),  # none | float16 | int8
+    'THREADS': int(os.getenv('MASCOTAS_EMBEDDING_THREADS', '0')) or None,
+}
+
+# Servidor de embeddings de mash (mash/servicio.py): con
+# MASCOTAS_EMBEDDING_BACKEND=remoto los workers web y run_embedding_worker no
+# cargan TensorFlow y envían los lotes a un proceso que agrupa las peticiones
+# concurrentes (VENTANA_MS, MAX_LOTE). BACKEND es el que carga el servidor.
+# URL: unix:///ruta.sock, http://127.0.0.1:puerto o 'local' (en el proceso, pruebas).
+# EXTRACTOR: ruta con puntos a una clase que reemplaza al extractor de BACKEND.
+# Iniciar con: python manage.py servidor_embeddings
+MASH_EMBEDDINGS = {
+    'URL': os.getenv('MASH_EMBEDDINGS_URL', 'unix:///tmp/mash-embeddings.sock'),
+    'BACKEND': os.getenv('MASH_EMBEDDINGS_BACKEND', 'keras'),
+    'VENTANA_MS': float(os.getenv('MASH_EMBEDDINGS_VENTANA_MS', '5')),
+    'MAX_LOTE': int(os.getenv('MASH_EMBEDDINGS_MAX_LOTE', '32')),
+    'TIMEOUT_SEGUNDOS': 30,
+    'EXTRACTOR': os.getenv('MASH_EMBEDDINGS_EXTRACTOR') or None,
+}
+
+# Cada cuántos segundos el índice en memoria busca embeddings nuevos de otros procesos
+MASCOTAS_INDEX_SYNC_SEGUNDOS = int(os.getenv('MASCOTAS_INDEX_SYNC_SEGUNDOS', '5'))
+
+# Pares pérdida/encontrada sobre el umbral, precalculados por el worker de
+# embeddings (app mash). MAX acota cada búsqueda, no la tabla.
+# Tras cambiarlos: python manage.py reconstruir_candidatos
+MASCOTAS_CANDIDATOS_UMBRAL = float(os.getenv('MASCOTAS_CANDIDATOS_UMBRAL', '0.5'))
+MASCOTAS_CANDIDATOS_MAX = int(os.getenv('MASCOTAS_CANDIDATOS_MAX', '200'))
+
+# Prefiltros por metadatos del match (mash/prefiltros.py), en orden.
+# Etapas disponibles: 'ventana_dias', 'especie', 'raza'.
+# Estadísticas por etapa: GET /api/mascotas/match/{id}?debug=true
+MASCOTAS_PREFILTROS = {
+    'ETAPAS': [e for e in os.getenv('MASCOTAS_PREFILTROS_ETAPAS', 'ventana_dias,especie').split(',') if e],
+    'DIAS_ANTES': int(os.getenv('MASCOTAS_PREFILTROS_DIAS_ANTES', '7')),
+    'DIAS_DESPUES': int(os.getenv('MASCOTAS_PREFILTROS_DIAS_DESPUES', '180')),
+}
+
+# Casi duplicados por hash perceptual en /mascotas/match (mascotas/phash.py):
+# distancia de Hamming máxima entre dHash de 64 bits (máx. 15).
+# Mascotas ya subidas: python manage.py calcular_phash
+MASCOTAS_PHASH = {
+    'DISTANCIA_MAX': int(os.getenv('MASCOTAS_PHASH_DISTANCIA_MAX', '6')),
+}
+
+# Backend de vecinos cercanos: 'exact' (fuerza bruta), 'ivf' (IVF-flat en numpy)
+# o 'hnsw' (requiere faiss-cpu). nprobe / efSearch controlan recall vs latencia;
+# medir con: python manage.py evaluar_ann
+MASCOTAS_ANN = {
+    'BACKEND': os.getenv('MASCOTAS_ANN_BACKEND', 'exact'),
+    'IVF_NLIST': int(os.getenv('MASCOTAS_ANN_IVF_NLIST', '0')),
+    'IVF_NPROBE': int(os.getenv('MASCOTAS_ANN_IVF_NPROBE', '8')),
+    'IVF_MIN_ENTRENAMIENTO': 1000,
+    'HNSW_M': 32,
+    'HNSW_EF_CONSTRUCTION': 200,
+    'HNSW_EF_SEARCH': int(os.getenv('MASCOTAS_ANN_HNSW_EF_SEARCH', '64')),
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -1,10 +1,12 @@
 from django.contrib import admin
-from django.urls import path
+from django.urls import path, re_path
 from ninja import NinjaAPI
 from api.api import api
+from api.views import servir_media
 from django.conf import settings
-from django.conf.urls.static import static
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("api/", api.urls),
-]+ static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # ETag, 304, Range y X-Accel-Redirect/X-Sendfile (ver api/views.py)
+    re_path(rf"^{settings.MEDIA_URL.strip('/')}/(?P<ruta>.+)$", servir_media, name="media"),
+]
@@ -14,3 +14,16 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+# Con `gunicorn --preload core.wsgi` este módulo se importa en el proceso
+# maestro antes del fork: los bytes del modelo exportado (tflite/onnx) quedan
+# en páginas compartidas (copy-on-write) por todos los workers. El modelo no
+# se construye aquí: TensorFlow y onnxruntime crean hilos que no sobreviven al
+# fork, así que cada worker crea su intérprete en get_model(). Con el backend
+# keras la precarga no aplica.
+from django.conf import settings
+
+if settings.MASCOTAS_PRELOAD_MODEL:
+    from mascotas.embeddings import precargar_pesos
+
+    precargar_pesos()
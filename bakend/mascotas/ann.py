@@ -0,0 +1,360 @@
+"""
+Backends de búsqueda de vecinos para el índice de embeddings.
+
+Todos trabajan con vectores normalizados (similitud = producto punto) y
+exponen la misma interfaz: upsert, remove, vector, search, len e in.
+
+- exact: fuerza bruta sobre una matriz contigua (resultado exacto).
+- ivf:   IVF-flat en numpy; centroides k-means y búsqueda en las nprobe
+         listas más cercanas.
+- hnsw:  grafo HNSW de faiss-cpu (requiere tener faiss instalado).
+"""
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+ANN_DEFAULTS = {
+    "BACKEND": "exact",
+    "IVF_NLIST": 0,  # 0 = automático (4 * sqrt(n))
+    "IVF_NPROBE": 8,
+    "IVF_MIN_ENTRENAMIENTO": 1000,
+    "IVF_ITERACIONES": 10,
+    "HNSW_M": 32,
+    "HNSW_EF_CONSTRUCTION": 200,
+    "HNSW_EF_SEARCH": 64,
+}
+
+
+def ann_config(**overrides):
+    config = dict(ANN_DEFAULTS)
+    config.update(getattr(settings, "MASCOTAS_ANN", {}))
+    config.update({k: v for k, v in overrides.items() if v is not None})
+    return config
+
+
+def _top_k(scores, k):
+    """Índices de los k mayores scores, ordenados de mayor a menor"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(scores.shape[0])
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class ParticionExacta:
+    """
+    Matriz contigua de embeddings normalizados de un tipo de reporte.
+    Las filas [0, n) son válidas; al eliminar se mueve la última fila al hueco.
+    """
+
+    def __init__(self, capacidad_inicial=256, **config):
+        self._capacidad_inicial = capacidad_inicial
+        self.matriz = None
+        self.ids = np.empty(0, dtype=np.int64)
+        self.posiciones = {}
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def __contains__(self, mascota_id):
+        return mascota_id in self.posiciones
+
+    def _reservar(self, dim):
+        if self.matriz is None:
+            self.matriz = np.empty((self._capacidad_inicial, dim), dtype=np.float32)
+            self.ids = np.empty(self._capacidad_inicial, dtype=np.int64)
+        elif self.n == self.matriz.shape[0]:
+            capacidad = self.matriz.shape[0] * 2
+            matriz = np.empty((capacidad, dim), dtype=np.float32)
+            matriz[:self.n] = self.matriz[:self.n]
+            ids = np.empty(capacidad, dtype=np.int64)
+            ids[:self.n] = self.ids[:self.n]
+            self.matriz, self.ids = matriz, ids
+
+    def upsert(self, mascota_id, vector):
+        """Retorna la fila donde quedó el vector"""
+        fila = self.posiciones.get(mascota_id)
+        if fila is None:
+            self._reservar(vector.shape[0])
+            fila = self.n
+            self.n += 1
+            self.ids[fila] = mascota_id
+            self.posiciones[mascota_id] = fila
+        self.matriz[fila] = vector
+        return fila
+
+    def remove(self, mascota_id):
+        """Retorna (fila liberada, fila movida a ella) o None si no existía"""
+        fila = self.posiciones.pop(mascota_id, None)
+        if fila is None:
+            return None
+        ultima = self.n - 1
+        if fila != ultima:
+            self.matriz[fila] = self.matriz[ultima]
+            self.ids[fila] = self.ids[ultima]
+            self.posiciones[int(self.ids[fila])] = fila
+        self.n -= 1
+        return fila, ultima
+
+    def vector(self, mascota_id):
+        return self.matriz[self.posiciones[mascota_id]].copy()
+
+    def _resultado(self, filas, scores, threshold):
+        return [
+            (int(self.ids[fila]), float(score))
+            for fila, score in zip(filas, scores)
+            if score >= threshold
+        ]
+
+    def search(self, query, top_k, threshold, exclude_id=None):
+        """
+        Producto matriz-vector sobre las filas válidas y top-k con argpartition.
+        Retorna lista de (mascota_id, score) ordenada de mayor a menor.
+        """
+        if self.n == 0:
+            return []
+        scores = self.matriz[:self.n] @ query
+        if exclude_id is not None and exclude_id in self.posiciones:
+            scores[self.posiciones[exclude_id]] = -np.inf
+        top = _top_k(scores, top_k)
+        return self._resultado(top, scores[top], threshold)
+
+
+class ParticionIVF(ParticionExacta):
+    """
+    IVF-flat: cada fila se asigna al centroide más cercano y la búsqueda solo
+    puntúa las filas de las nprobe listas más cercanas a la consulta.
+    Hasta tener IVF_MIN_ENTRENAMIENTO vectores se comporta como la exacta; los
+    centroides se reentrenan cuando la partición duplica su tamaño.
+
+    Con `lock` (el del EmbeddingIndex) el reentrenamiento corre en un hilo
+    aparte: k-means y la asignación se calculan sin el lock, sobre la matriz
+    viva, y solo la instalación de los centroides lo toma. Mientras tanto se
+    sigue buscando con los centroides anteriores (o en modo exacto). Sin
+    lock (evaluar_ann) se entrena en línea.
+    """
+
+    def __init__(self, capacidad_inicial=256, lock=None, **config):
+        super().__init__(capacidad_inicial)
+        self.nlist = config["IVF_NLIST"]
+        self.nprobe = config["IVF_NPROBE"]
+        self.min_entrenamiento = config["IVF_MIN_ENTRENAMIENTO"]
+        self.iteraciones = config["IVF_ITERACIONES"]
+        self.centroides = None
+        self.asignacion = np.empty(0, dtype=np.int32)
+        self._entrenado_con = 0
+        self._lock = lock
+        self._entrenando = False
+        self._tocados = set()
+
+    def _reservar(self, dim):
+        super()._reservar(dim)
+        if self.asignacion.shape[0] < self.matriz.shape[0]:
+            asignacion = np.full(self.matriz.shape[0], -1, dtype=np.int32)
+            asignacion[:self.n] = self.asignacion[:self.n]
+            self.asignacion = asignacion
+
+    def _kmeans(self, matriz, semilla=0):
+        """k-means esférico (Lloyd) sobre una muestra de las filas dadas"""
+        n = matriz.shape[0]
+        n_listas = self.nlist or max(1, int(4 * np.sqrt(n)))
+        n_listas = min(n_listas, n)
+        rng = np.random.default_rng(semilla)
+        muestra_n = min(n, max(n_listas * 64, 10000))
+        muestra = matriz[rng.choice(n, muestra_n, replace=False)]
+        centroides = muestra[rng.choice(muestra_n, n_listas, replace=False)].copy()
+        for _ in range(self.iteraciones):
+            etiquetas = np.argmax(muestra @ centroides.T, axis=1)
+            for c in range(n_listas):
+                miembros = muestra[etiquetas == c]
+                if len(miembros):
+                    centroides[c] = miembros.mean(axis=0)
+            normas = np.linalg.norm(centroides, axis=1, keepdims=True)
+            normas[normas == 0] = 1.0
+            centroides /= normas
+        return centroides
+
+    def entrenar(self, semilla=0):
+        """Reentrena en línea (quien llama ya tiene el lock, si lo hay)"""
+        self.centroides = self._kmeans(self.matriz[:self.n], semilla)
+        self.asignacion[:self.n] = self._asignar(self.matriz[:self.n])
+        self._entrenado_con = self.n
+
+    def _entrenar_en_fondo(self, matriz, ids):
+        """
+        Hilo de reentrenamiento. `matriz` es la matriz viva (sin copiar): las
+        filas que se muevan o cambien mientras tanto se detectan comparando
+        `ids` y con _tocados, y se reasignan al instalar los centroides.
+        """
+        try:
+            centroides = self._kmeans(matriz)
+            asignacion = self._asignar(matriz, centroides)
+            with self._lock:
+                self.centroides = centroides
+                n = min(self.n, len(ids))
+                self.asignacion[:n] = asignacion[:n]
+                filas = set(np.flatnonzero(self.ids[:n] != ids[:n]).tolist())
+                filas.update(range(n, self.n))
+                filas.update(self.posiciones[m] for m in self._tocados if m in self.posiciones)
+                if filas:
+                    filas = np.fromiter(filas, dtype=np.int64)
+                    self.asignacion[filas] = self._asignar(self.matriz[filas])
+                self._entrenado_con = len(ids)
+        except Exception as e:
+            print(f"Error reentrenando la partición IVF: {str(e)}")
+        finally:
+            self._entrenando = False
+
+    def _asignar(self, vectores, centroides=None, bloque=8192):
+        centroides = self.centroides if centroides is None else centroides
+        asignacion = np.empty(vectores.shape[0], dtype=np.int32)
+        for inicio in range(0, vectores.shape[0], bloque):
+            trozo = vectores[inicio:inicio + bloque]
+            asignacion[inicio:inicio + bloque] = np.argmax(trozo @ centroides.T, axis=1)
+        return asignacion
+
+    def upsert(self, mascota_id, vector):
+        fila = super().upsert(mascota_id, vector)
+        if self.centroides is not None:
+            self.asignacion[fila] = int(np.argmax(self.centroides @ vector))
+        if self._entrenando:
+            self._tocados.add(mascota_id)
+        elif self.n >= self.min_entrenamiento and self.n >= 2 * self._entrenado_con:
+            if self._lock is None:
+                self.entrenar()
+            else:
+                self._entrenando = True
+                self._tocados = set()
+                threading.Thread(
+                    target=self._entrenar_en_fondo,
+                    args=(self.matriz[:self.n], self.ids[:self.n].copy()),
+                    name="ivf-entrenamiento",
+                    daemon=True,
+                ).start()
+        return fila
+
+    def remove(self, mascota_id):
+        movimiento = super().remove(mascota_id)
+        if movimiento is not None:
+            fila, ultima = movimiento
+            self.asignacion[fila] = self.asignacion[ultima]
+        return movimiento
+
+    def search(self, query, top_k, threshold, exclude_id=None, nprobe=None):
+        if self.centroides is None or self.n == 0:
+            return super().search(query, top_k, threshold, exclude_id)
+        nprobe = min(nprobe or self.nprobe, self.centroides.shape[0])
+        listas = _top_k(self.centroides @ query, nprobe)
+        filas = np.flatnonzero(np.isin(self.asignacion[:self.n], listas))
+        if exclude_id is not None and exclude_id in self.posiciones:
+            filas = filas[filas != self.posiciones[exclude_id]]
+        if filas.shape[0] == 0:
+            return []
+        scores = self.matriz[filas] @ query
+        top = _top_k(scores, top_k)
+        return self._resultado(filas[top], scores[top], threshold)
+
+
+class ParticionHNSW(ParticionExacta):
+    """
+    Grafo HNSW de faiss sobre producto punto. faiss no permite borrar en
+    HNSW, así que las eliminaciones se marcan y el grafo se reconstruye desde
+    la matriz exacta cuando superan el 20 % de los vectores.
+    """
+
+    def __init__(self, capacidad_inicial=256, **config):
+        try:
+            import faiss
+        except ImportError:
+            raise ImproperlyConfigured(
+                "MASCOTAS_ANN['BACKEND'] = 'hnsw' requiere el paquete faiss-cpu"
+            )
+        super().__init__(capacidad_inicial)
+        self._faiss = faiss
+        self.m = config["HNSW_M"]
+        self.ef_construction = config["HNSW_EF_CONSTRUCTION"]
+        self.ef_search = config["HNSW_EF_SEARCH"]
+        self.grafo = None
+        self.etiquetas = []  # posición en el grafo -> mascota_id
+        self.en_grafo = {}   # mascota_id -> posición vigente en el grafo
+        self.borrados = 0
+
+    def _nuevo_grafo(self, dim):
+        grafo = self._faiss.IndexHNSWFlat(dim, self.m, self._faiss.METRIC_INNER_PRODUCT)
+        grafo.hnsw.efConstruction = self.ef_construction
+        return grafo
+
+    def reconstruir(self):
+        self.grafo = self._nuevo_grafo(self.matriz.shape[1])
+        self.etiquetas = [int(i) for i in self.ids[:self.n]]
+        self.en_grafo = {mascota_id: pos for pos, mascota_id in enumerate(self.etiquetas)}
+        if self.n:
+            self.grafo.add(np.ascontiguousarray(self.matriz[:self.n]))
+        self.borrados = 0
+
+    def upsert(self, mascota_id, vector):
+        fila = super().upsert(mascota_id, vector)
+        if self.grafo is None:
+            self.grafo = self._nuevo_grafo(vector.shape[0])
+        if mascota_id in self.en_grafo:
+            self.borrados += 1
+        self.en_grafo[mascota_id] = len(self.etiquetas)
+        self.etiquetas.append(mascota_id)
+        self.grafo.add(vector.reshape(1, -1))
+        self._quizas_reconstruir()
+        return fila
+
+    def remove(self, mascota_id):
+        movimiento = super().remove(mascota_id)
+        if movimiento is not None:
+            self.en_grafo.pop(mascota_id, None)
+            self.borrados += 1
+            self._quizas_reconstruir()
+        return movimiento
+
+    def _quizas_reconstruir(self):
+        if self.borrados > 0.2 * max(self.n, 1):
+            self.reconstruir()
+
+    def search(self, query, top_k, threshold, exclude_id=None, ef_search=None):
+        if self.grafo is None or self.n == 0:
+            return []
+        self.grafo.hnsw.efSearch = max(ef_search or self.ef_search, top_k)
+        # Se piden vecinos extra para compensar los marcados como borrados
+        k = min(top_k + self.borrados + 1, len(self.etiquetas))
+        scores, posiciones = self.grafo.search(query.reshape(1, -1).astype(np.float32), k)
+        resultado = []
+        for score, pos in zip(scores[0], posiciones[0]):
+            if pos < 0:
+                continue
+            mascota_id = self.etiquetas[pos]
+            if self.en_grafo.get(mascota_id) != pos or mascota_id == exclude_id:
+                continue
+            if score >= threshold:
+                resultado.append((mascota_id, float(score)))
+            if len(resultado) == top_k:
+                break
+        return resultado
+
+
+BACKENDS = {
+    "exact": ParticionExacta,
+    "ivf": ParticionIVF,
+    "hnsw": ParticionHNSW,
+}
+
+
+def crear_particion(backend=None, lock=None, **overrides):
+    config = ann_config(**overrides)
+    nombre = backend or config["BACKEND"]
+    if nombre not in BACKENDS:
+        raise ImproperlyConfigured(
+            f"Backend ANN desconocido: {nombre!r}. Opciones: {', '.join(BACKENDS)}"
+        )
+    return BACKENDS[nombre](lock=lock, **config)
@@ -0,0 +1,184 @@
+"""
+Caché de resultados de /mascotas/match con invalidación por versiones.
+
+La clave combina el id de la mascota, su propia versión y la versión de la
+partición opuesta (tipo_reporte que se compara). Crear, actualizar o
+eliminar una mascota solo sube la versión de su partición, así los
+resultados que la incluyen dejan de encontrarse y el resto sigue en caché.
+
+Con el backend por defecto (LocMemCache, LRU) la caché es por proceso; en
+despliegues con varios workers conviene un backend compartido (Redis o
+Memcached) configurado con MATCH_CACHE_BACKEND / MATCH_CACHE_LOCATION.
+Los cambios que hace otro proceso (embeddings del worker, ediciones y
+borrados en otro worker web) se detectan con sincronizar().
+
+Las versiones y los contadores de aciertos van en su propio alias
+(MASCOTAS_MATCH_CACHE_VERSIONES_ALIAS): el LRU de los resultados no los
+expulsa.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+CLAVE_HITS = "match:stats:hits"
+CLAVE_MISSES = "match:stats:misses"
+
+
+def _cache():
+    return caches[getattr(settings, "MASCOTAS_MATCH_CACHE_ALIAS", "matches")]
+
+
+def _versiones():
+    return caches[getattr(settings, "MASCOTAS_MATCH_CACHE_VERSIONES_ALIAS", "match_versiones")]
+
+
+def _slug(tipo):
+    return "perdida" if tipo == "Pérdida" else "encontrada"
+
+
+def _version(clave):
+    # Se inicia con una marca de tiempo: si la clave se expulsa de la caché,
+    # la nueva versión nunca coincide con una anterior
+    return _versiones().get_or_set(clave, lambda: int(time.time() * 1000), timeout=None)
+
+
+def _subir(clave):
+    cache = _versiones()
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, int(time.time() * 1000), timeout=None)
+
+
+def invalidar_particion(tipo):
+    _subir(f"match:version:{_slug(tipo)}")
+
+
+def invalidar_mascota(mascota_id):
+    _subir(f"match:version:mascota:{mascota_id}")
+
+
+_sync_lock = threading.Lock()
+_sincronizado = False
+_particiones = {}
+_ultima_mascota = None
+_ultimo_embedding = None
+_ultima_sync = 0.0
+
+
+def _estado_particiones():
+    """{tipo_reporte: (total, último modificado)} en una consulta agrupada"""
+    from django.db.models import Count, Max
+
+    from .models import Mascota
+
+    filas = (
+        Mascota.objects.order_by().values("tipo_reporte")
+        .annotate(total=Count("pk"), ultimo=Max("modificado"))
+        .values_list("tipo_reporte", "total", "ultimo")
+    )
+    return {tipo: (total, ultimo) for tipo, total, ultimo in filas}
+
+
+def _maximo(fechas, actual):
+    return max([f for f in fechas if f is not None] + ([actual] if actual else []), default=None)
+
+
+def sincronizar():
+    """
+    Invalida lo que cambió en otros procesos desde la última llamada:
+    - particiones cuyo (conteo, último Mascota.modificado) cambió: altas,
+      ediciones y borrados (un borrado baja el conteo);
+    - mascotas editadas (Mascota.modificado) o con embedding nuevo
+      (MascotaEmbedding.modificado), para sus propios resultados.
+    Se ejecuta como máximo cada MASCOTAS_INDEX_SYNC_SEGUNDOS.
+    """
+    global _sincronizado, _particiones, _ultima_mascota, _ultimo_embedding, _ultima_sync
+    from django.db.models import Max
+
+    from .models import Mascota, MascotaEmbedding
+
+    intervalo = getattr(settings, "MASCOTAS_INDEX_SYNC_SEGUNDOS", 5)
+    if time.monotonic() - _ultima_sync < intervalo:
+        return
+    with _sync_lock:
+        _ultima_sync = time.monotonic()
+        particiones = _estado_particiones()
+        if not _sincronizado:
+            # Primer uso en el proceso: la caché local empieza vacía
+            _particiones = particiones
+            _ultima_mascota = _maximo([u for _, u in particiones.values()], None)
+            _ultimo_embedding = MascotaEmbedding.objects.aggregate(m=Max("modificado"))["m"]
+            _sincronizado = True
+            return
+
+        for tipo in set(particiones) | set(_particiones):
+            if particiones.get(tipo) != _particiones.get(tipo):
+                invalidar_particion(tipo)
+        _particiones = particiones
+
+        mascotas = Mascota.objects.all()
+        if _ultima_mascota is not None:
+            mascotas = mascotas.filter(modificado__gt=_ultima_mascota)
+        fechas = []
+        for mascota_id, modificado in mascotas.values_list("id", "modificado"):
+            invalidar_mascota(mascota_id)
+            fechas.append(modificado)
+        _ultima_mascota = _maximo(fechas, _ultima_mascota)
+
+        embeddings = MascotaEmbedding.objects.all()
+        if _ultimo_embedding is not None:
+            embeddings = embeddings.filter(modificado__gt=_ultimo_embedding)
+        fechas = []
+        for mascota_id, tipo, modificado in embeddings.values_list(
+            "mascota_id", "mascota__tipo_reporte", "modificado"
+        ):
+            invalidar_particion(tipo)
+            invalidar_mascota(mascota_id)
+            fechas.append(modificado)
+        _ultimo_embedding = _maximo(fechas, _ultimo_embedding)
+
+
+def clave_match(mascota_id, tipo_buscar, *params):
+    return ":".join(str(p) for p in (
+        "match",
+        mascota_id,
+        _version(f"match:version:mascota:{mascota_id}"),
+        _slug(tipo_buscar),
+        _version(f"match:version:{_slug(tipo_buscar)}"),
+        *params,
+    ))
+
+
+def _contar(clave):
+    cache = _versiones()
+    if not cache.add(clave, 1, timeout=None):
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.set(clave, 1, timeout=None)
+
+
+def obtener(clave):
+    resultado = _cache().get(clave)
+    _contar(CLAVE_HITS if resultado is not None else CLAVE_MISSES)
+    return resultado
+
+
+def guardar(clave, resultado):
+    _cache().set(clave, resultado)
+
+
+def estadisticas():
+    cache = _versiones()
+    hits = cache.get(CLAVE_HITS, 0)
+    misses = cache.get(CLAVE_MISSES, 0)
+    total = hits + misses
+    return {
+        "backend": settings.CACHES[getattr(settings, "MASCOTAS_MATCH_CACHE_ALIAS", "matches")]["BACKEND"],
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 4) if total else 0.0,
+    }
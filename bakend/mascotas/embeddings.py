@@ -1,45 +1,122 @@
 import numpy as np
 from PIL import Image
-import tensorflow as tf
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import os
+import re
+import threading
+
+from .extractores import create_extractor, embedding_config, model_version, resolver_model_path
+
+# TensorFlow y el modelo se cargan al primer uso (get_model), no al importar:
+# migrate, tests, admin y los endpoints que no infieren no pagan su costo.
+_model = None
+_model_lock = threading.Lock()
+# Bytes del modelo exportado leídos antes del fork (precargar_pesos)
+_pesos = None
+
+
+def get_model():
+    """
+    Retorna el extractor compartido del proceso (backend según
+    MASCOTAS_EMBEDDING), cargándolo una sola vez
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                print("Cargando modelo MobileNetV2...")
+                _model = create_extractor(contenido=_pesos)
+                print(f" Modelo cargado exitosamente ({_model.nombre})")
+    return _model
+
+
+def model_ready():
+    return _model is not None
+
+
+def precargar_pesos():
+    """
+    Para `gunicorn --preload`: lee en el proceso maestro solo los bytes del
+    modelo exportado (tflite/onnx), que los workers comparten copy-on-write
+    y con los que cada uno crea su intérprete en get_model(). No crea
+    intérpretes ni sesiones: sus hilos no sobreviven al fork.
+    Con el backend keras no hace nada, porque construir el modelo ya
+    arranca el runtime de TensorFlow.
+    """
+    global _pesos
+    backend = embedding_config()["BACKEND"]
+    if backend not in ("tflite", "onnx"):
+        print(f"MASCOTAS_PRELOAD_MODEL no aplica al backend {backend!r}; el modelo se carga en cada worker")
+        return False
+    with open(resolver_model_path(backend), "rb") as f:
+        _pesos = f.read()
+    print(f"Pesos del modelo precargados ({backend}, {len(_pesos) / 1e6:.1f} MB)")
+    return True
+
+
+def warmup():
+    """
+    Carga el modelo y ejecuta una inferencia en vacío para que la primera
+    petición real no pague la inicialización del grafo
+    """
+    get_model().predict(np.zeros((1, 224, 224, 3), dtype=np.float32))
+
+
+# Identifica los vectores persistidos; cambiarla invalida los embeddings guardados
+MODEL_VERSION = model_version()
+
+INPUT_SIZE = (224, 224)
+
+# Transposición según la etiqueta EXIF Orientation (0x0112)
+_EXIF_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+def decode_image(image_path, out=None):
+    """
+    Abre una imagen y la deja lista para MobileNetV2: (224, 224, 3) float32.
+    Los JPEG se escalan al decodificar (draft, reducción DCT 1/2..1/8) y el
+    resto usa reduce() antes del resize, así una foto de 12MP nunca se
+    decodifica a resolución completa. Aplica la orientación EXIF.
+    Si se pasa `out` (p. ej. una fila del buffer del lote) se escribe ahí.
+    """
+    if not os.path.exists(image_path):
+        raise FileNotFoundError(f"Archivo no encontrado: {image_path}")
+
+    with Image.open(image_path) as img:
+        orientacion = img.getexif().get(0x0112, 1)
+        if img.format == "JPEG":
+            img.draft("RGB", INPUT_SIZE)
+        img = img.convert("RGB").resize(INPUT_SIZE, Image.Resampling.BICUBIC, reducing_gap=2.0)
+
+    # Rotar después de redimensionar es equivalente y más barato
+    if orientacion in _EXIF_TRANSPOSE:
+        img = img.transpose(_EXIF_TRANSPOSE[orientacion])
+
+    if out is None:
+        out = np.empty(INPUT_SIZE[::-1] + (3,), dtype=np.float32)
+    # Mismo escalado que mobilenet_v2.preprocess_input: [0, 255] -> [-1, 1]
+    np.multiply(np.asarray(img), np.float32(1 / 127.5), out=out, dtype=np.float32)
+    out -= 1.0
+    return out
 
-# Cargar modelo MobileNet una única vez
-print("Cargando modelo MobileNetV2...")
-model = tf.keras.applications.MobileNetV2(
-    weights="imagenet",
-    include_top=False,
-    pooling="avg",
-    input_shape=(224, 224, 3)
-)
-print(" Modelo cargado exitosamente")
 
 def load_and_preprocess(image_path):
     """
-    Carga y preprocesa una imagen para el modelo
+    Carga y preprocesa una imagen para el modelo (lote de 1)
     """
     try:
         print(f"Abriendo imagen: {image_path}")
-        
-        # Verificar que el archivo existe
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"Archivo no encontrado: {image_path}")
-        
-        # Abrir y convertir imagen
-        img = Image.open(image_path).convert("RGB")
-        print(f"Tamaño original: {img.size}")
-        
-        # Redimensionar
-        img = img.resize((224, 224))
-        
-        # Convertir a array
-        img_array = np.array(img)
-        print(f"Shape del array: {img_array.shape}")
-        
-        # Preprocesar para MobileNetV2
-        img_array = tf.keras.applications.mobilenet_v2.preprocess_input(img_array)
-        img_array = np.expand_dims(img_array, axis=0)
-        
-        return img_array
+        img_array = decode_image(image_path)
+        return np.expand_dims(img_array, axis=0)
     
     except Exception as e:
         print(f"Error en load_and_preprocess: {str(e)}")
@@ -54,7 +131,7 @@ def generate_embedding(image_path):
         img_tensor = load_and_preprocess(image_path)
         
         print("Generando embedding...")
-        embedding = model.predict(img_tensor, verbose=0)[0]
+        embedding = get_model().predict(img_tensor)[0]
         
         print(f"Embedding generado. Shape: {embedding.shape}, Tipo: {type(embedding)}")
         
@@ -65,6 +142,64 @@ def generate_embedding(image_path):
         raise
 
 
+def _decode_into(image_path, out):
+    try:
+        decode_image(image_path, out=out)
+        return True
+    except Exception as e:
+        print(f"Error decodificando {image_path}: {str(e)}")
+        return False
+
+
+def generate_embeddings_batch(paths, batch_size=32, workers=None):
+    """
+    Genera embeddings de varias imágenes: decodifica en un pool de hilos
+    (PIL libera el GIL) mientras el modelo procesa el lote anterior, e
+    infiere sobre lotes de batch_size imágenes. Cada hilo escribe directo
+    en su fila de uno de dos buffers preasignados que se alternan.
+    Retorna una lista alineada con paths; None donde la imagen falló.
+    """
+    paths = list(paths)
+    resultados = [None] * len(paths)
+    if not paths:
+        return resultados
+
+    workers = workers or min(8, os.cpu_count() or 1)
+    batch_size = min(batch_size, len(paths))
+    buffers = [
+        np.empty((batch_size,) + INPUT_SIZE[::-1] + (3,), dtype=np.float32)
+        for _ in range(2 if len(paths) > batch_size else 1)
+    ]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        def decodificar(inicio):
+            buffer = buffers[(inicio // batch_size) % len(buffers)]
+            return buffer, [
+                pool.submit(_decode_into, p, buffer[i])
+                for i, p in enumerate(paths[inicio:inicio + batch_size])
+            ]
+
+        siguientes = decodificar(0)
+        for inicio in range(0, len(paths), batch_size):
+            buffer, futuros = siguientes
+            correctos = [futuro.result() for futuro in futuros]
+            if inicio + batch_size < len(paths):
+                siguientes = decodificar(inicio + batch_size)
+
+            validos = [i for i, ok in enumerate(correctos) if ok]
+            if not validos:
+                continue
+
+            if len(validos) == len(correctos):
+                lote = buffer[:len(correctos)]
+            else:
+                lote = buffer[validos]
+            embeddings = get_model().predict(lote)
+            for i, embedding in zip(validos, embeddings):
+                resultados[inicio + i] = embedding
+
+    return resultados
+
+
 def cosine_similarity(a, b):
     """
     Calcula la similitud del coseno entre dos vectores
@@ -85,4 +220,179 @@ def cosine_similarity(a, b):
     
     except Exception as e:
         print(f"Error en cosine_similarity: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+
+def file_checksum(image_path, chunk_size=1024 * 1024):
+    """
+    Calcula el SHA-256 del archivo de imagen leyendo por bloques
+    """
+    sha = hashlib.sha256()
+    with open(image_path, "rb") as f:
+        for bloque in iter(lambda: f.read(chunk_size), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def checksum_imagen(mascota):
+    """
+    SHA-256 de la imagen de la mascota. Los archivos direccionados por
+    contenido (api.models.ArchivoMedia) ya lo llevan en el nombre.
+    """
+    nombre = os.path.splitext(os.path.basename(mascota.imagen.name))[0]
+    if re.fullmatch(r"[0-9a-f]{64}", nombre):
+        return nombre
+    return file_checksum(mascota.imagen.path)
+
+
+def embeddings_por_checksum(checksums, excluir=()):
+    """{checksum: vector} de embeddings ya calculados con el modelo actual"""
+    from .models import MascotaEmbedding
+
+    registros = (
+        MascotaEmbedding.objects
+        .filter(checksum__in=set(checksums), modelo_version=MODEL_VERSION)
+        .exclude(mascota_id__in=excluir)
+        .values_list("checksum", "vector")
+    )
+    return {checksum: np.frombuffer(bytes(vector), dtype=np.float32) for checksum, vector in registros}
+
+
+def reutilizar_embedding(mascota):
+    """
+    Copia el embedding de otra mascota con la misma imagen, sin inferencia.
+    Retorna el MascotaEmbedding o None si no hay uno para reutilizar.
+    """
+    from .models import Mascota, MascotaEmbedding
+
+    if not mascota.imagen:
+        return None
+    checksum = checksum_imagen(mascota)
+    existente = embeddings_por_checksum([checksum], excluir=[mascota.id]).get(checksum)
+    if existente is None:
+        return None
+    registro = MascotaEmbedding.objects.filter(mascota=mascota).first() or MascotaEmbedding(mascota=mascota)
+    registro.set_array(existente)
+    registro.checksum = checksum
+    registro.modelo_version = MODEL_VERSION
+    registro.save()
+    Mascota.objects.filter(id=mascota.id).marcar_embedding(Mascota.EMBEDDING_LISTO)
+    mascota.embedding_status = Mascota.EMBEDDING_LISTO
+    return registro
+
+
+def store_embedding(mascota, force=False, inferir=generate_embedding):
+    """
+    Genera y guarda el embedding de la imagen de una mascota.
+    Solo ejecuta el modelo si no existe un embedding para la misma imagen
+    (checksum) y la misma versión del modelo. `inferir(ruta)` corre el
+    modelo; las vistas lo mandan al ejecutor de CPU.
+    Retorna el MascotaEmbedding o None si la mascota no tiene imagen.
+    """
+    from .models import Mascota, MascotaEmbedding
+
+    if not mascota.imagen:
+        MascotaEmbedding.objects.filter(mascota=mascota).delete()
+        Mascota.objects.filter(id=mascota.id).marcar_embedding(Mascota.EMBEDDING_SIN_IMAGEN)
+        return None
+
+    image_path = mascota.imagen.path
+    checksum = checksum_imagen(mascota)
+
+    registro = MascotaEmbedding.objects.filter(mascota=mascota).first()
+    if (
+        registro is not None
+        and not force
+        and registro.checksum == checksum
+        and registro.modelo_version == MODEL_VERSION
+    ):
+        return registro
+
+    # Misma imagen ya procesada para otra mascota: se copia el vector
+    embedding = None if force else embeddings_por_checksum([checksum], excluir=[mascota.id]).get(checksum)
+    if embedding is None:
+        embedding = inferir(image_path)
+
+    if registro is None:
+        registro = MascotaEmbedding(mascota=mascota)
+    registro.set_array(embedding)
+    registro.checksum = checksum
+    registro.modelo_version = MODEL_VERSION
+    registro.save()
+    Mascota.objects.filter(id=mascota.id).marcar_embedding(Mascota.EMBEDDING_LISTO)
+    return registro
+
+
+def store_embeddings_batch(mascotas, batch_size=32, force=False, workers=None):
+    """
+    Versión por lotes de store_embedding para una lista de mascotas con imagen.
+    Retorna una lista de (mascota, resultado) con resultado "guardado",
+    "reutilizado" (copiado de otra mascota con la misma imagen), "omitido"
+    (ya estaba al día: mismo checksum y versión del modelo) o el mensaje de
+    error. La inferencia corre fuera de cualquier transacción; solo las
+    escrituras del lote van juntas en una transacción corta.
+    """
+    from django.db import transaction
+
+    from .models import Mascota, MascotaEmbedding
+
+    mascotas = [m for m in mascotas if m.imagen]
+    existentes = {
+        r.mascota_id: r
+        for r in MascotaEmbedding.objects.filter(mascota__in=mascotas)
+    }
+
+    resultados = []
+    pendientes = []
+    for mascota in mascotas:
+        try:
+            checksum = checksum_imagen(mascota)
+        except OSError as e:
+            print(f"Error leyendo imagen de {mascota.id}: {str(e)}")
+            resultados.append((mascota, str(e)))
+            continue
+        registro = existentes.get(mascota.id)
+        if (
+            registro is not None
+            and not force
+            and registro.checksum == checksum
+            and registro.modelo_version == MODEL_VERSION
+        ):
+            resultados.append((mascota, "omitido"))
+            continue
+        pendientes.append((mascota, checksum, registro))
+
+    # Imágenes repetidas: se reutiliza el embedding en lugar de inferir
+    reutilizables = {} if force else embeddings_por_checksum([checksum for _, checksum, _ in pendientes])
+
+    # Una sola inferencia por imagen distinta dentro del lote
+    unicos = {}
+    for mascota, checksum, _ in pendientes:
+        if checksum not in reutilizables:
+            unicos.setdefault(checksum, mascota.imagen.path)
+    embeddings = dict(reutilizables)
+    embeddings.update(zip(
+        unicos,
+        generate_embeddings_batch(list(unicos.values()), batch_size=batch_size, workers=workers),
+    ))
+
+    with transaction.atomic():
+        inferidos = set()
+        for mascota, checksum, registro in pendientes:
+            embedding = embeddings[checksum]
+            if embedding is None:
+                resultados.append((mascota, "No se pudo decodificar la imagen"))
+                continue
+            if registro is None:
+                registro = MascotaEmbedding(mascota=mascota)
+            registro.set_array(embedding)
+            registro.checksum = checksum
+            registro.modelo_version = MODEL_VERSION
+            registro.save()
+            reutilizado = checksum in reutilizables or checksum in inferidos
+            resultados.append((mascota, "reutilizado" if reutilizado else "guardado"))
+            inferidos.add(checksum)
+
+        listos = [m.id for m, resultado in resultados if resultado in ("guardado", "reutilizado", "omitido")]
+        Mascota.objects.filter(id__in=listos).marcar_embedding(Mascota.EMBEDDING_LISTO)
+    return resultados
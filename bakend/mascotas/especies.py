@@ -0,0 +1,48 @@
+"""
+Especie inferida a partir de la raza escrita por el usuario.
+
+La raza es texto libre ("Pastor Alemán", "gato criollo", "mestiza"), así
+que solo se reconoce la especie cuando la raza la delata; si no, queda
+vacía y el prefiltro de especie la trata como compatible con todo.
+"""
+import re
+import unicodedata
+
+PERRO = "perro"
+GATO = "gato"
+ESPECIES = ((PERRO, "Perro"), (GATO, "Gato"))
+
+PALABRAS = {
+    PERRO: (
+        "perro", "perra", "cachorro", "canino", "labrador", "golden", "retriever", "pastor",
+        "poodle", "caniche", "beagle", "bulldog", "chihuahua", "pug", "schnauzer", "husky",
+        "rottweiler", "dalmata", "boxer", "pitbull", "pit bull", "terrier", "yorkshire", "yorki",
+        "shih tzu", "pinscher", "doberman", "cocker", "collie", "salchicha", "dachshund",
+        "maltes", "pomerania", "san bernardo", "gran danes", "akita", "shar pei", "galgo",
+        "bichon", "samoyedo", "chow chow", "basset", "weimaraner", "corgi", "mastin",
+    ),
+    GATO: (
+        "gato", "gata", "gatito", "felino", "siames", "persa", "angora", "bengala", "bengali",
+        "maine coon", "sphynx", "esfinge", "ragdoll", "shorthair", "azul ruso", "bombay",
+        "himalayo", "abisinio", "birmano",
+    ),
+}
+
+_PATRONES = {
+    especie: re.compile(r"\b(" + "|".join(re.escape(p) for p in palabras) + r")\b")
+    for especie, palabras in PALABRAS.items()
+}
+
+
+def normalizar_raza(raza):
+    """Minúsculas, sin tildes ni signos y con espacios simples"""
+    texto = unicodedata.normalize("NFKD", raza or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", texto).split())
+
+
+def especie_de(raza):
+    """'perro', 'gato' o '' si la raza no es concluyente"""
+    texto = normalizar_raza(raza)
+    encontradas = [especie for especie, patron in _PATRONES.items() if patron.search(texto)]
+    return encontradas[0] if len(encontradas) == 1 else ""
@@ -0,0 +1,228 @@
+"""
+Backends de inferencia para el extractor de características MobileNetV2.
+
+Todos reciben un lote (n, 224, 224, 3) float32 ya preprocesado a [-1, 1]
+y retornan (n, 1280) float32.
+
+- keras:  modelo completo de tf.keras (referencia).
+- tflite: modelo exportado con `manage.py exportar_modelo --formato tflite`,
+          opcionalmente cuantizado a float16 o int8.
+- onnx:   modelo exportado con `manage.py exportar_modelo --formato onnx`,
+          ejecutado con onnxruntime.
+- remoto: el servidor de embeddings de mash (`manage.py servidor_embeddings`)
+          infiere con su propio backend (MASH_EMBEDDINGS['BACKEND']); este
+          proceso no carga TensorFlow. Ver mash/servicio.py.
+"""
+import os
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Versión del preprocesado de mascotas.embeddings.decode_image
+PREPROCESADO = 2
+
+EMBEDDING_DEFAULTS = {
+    "BACKEND": "keras",
+    "MODEL_PATH": None,
+    "QUANTIZATION": "none",
+    "THREADS": None,
+}
+
+
+def embedding_config():
+    config = dict(EMBEDDING_DEFAULTS)
+    config.update(getattr(settings, "MASCOTAS_EMBEDDING", {}))
+    return config
+
+
+def build_keras_model():
+    import tensorflow as tf
+
+    return tf.keras.applications.MobileNetV2(
+        weights="imagenet",
+        include_top=False,
+        pooling="avg",
+        input_shape=(224, 224, 3)
+    )
+
+
+class KerasExtractor:
+    nombre = "keras"
+    cuantizacion = "none"
+
+    def __init__(self, **config):
+        self.model = build_keras_model()
+
+    def predict(self, batch):
+        return np.asarray(self.model.predict(batch, verbose=0, batch_size=len(batch)), dtype=np.float32)
+
+
+class TFLiteExtractor:
+    nombre = "tflite"
+
+    def __init__(self, model_path, threads=None, contenido=None, **config):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+
+            Interpreter = tf.lite.Interpreter
+        if contenido is not None:
+            # Bytes leídos antes del fork (ver precargar_pesos)
+            self.interpreter = Interpreter(model_content=contenido, num_threads=threads)
+        else:
+            self.interpreter = Interpreter(model_path=str(model_path), num_threads=threads)
+        self.interpreter.allocate_tensors()
+        self._entrada = self.interpreter.get_input_details()[0]
+        self._salida = self.interpreter.get_output_details()[0]
+        self._lote = 1
+        self.cuantizacion = self._detectar_cuantizacion()
+
+    def _detectar_cuantizacion(self):
+        """Cuantización según los tipos de los tensores del modelo cargado"""
+        tipos = {np.dtype(d["dtype"]) for d in self.interpreter.get_tensor_details()}
+        if tipos & {np.dtype(np.int8), np.dtype(np.uint8)}:
+            return "int8"
+        if np.dtype(np.float16) in tipos:
+            return "float16"
+        return "none"
+
+    def predict(self, batch):
+        if len(batch) != self._lote:
+            self.interpreter.resize_tensor_input(self._entrada["index"], list(batch.shape))
+            self.interpreter.allocate_tensors()
+            self._lote = len(batch)
+
+        entrada = batch
+        escala, cero = self._entrada["quantization"]
+        if self._entrada["dtype"] != np.float32 and escala:
+            entrada = np.round(batch / escala + cero).astype(self._entrada["dtype"])
+        self.interpreter.set_tensor(self._entrada["index"], entrada)
+        self.interpreter.invoke()
+        salida = self.interpreter.get_tensor(self._salida["index"])
+
+        escala, cero = self._salida["quantization"]
+        if self._salida["dtype"] != np.float32 and escala:
+            salida = (salida.astype(np.float32) - cero) * escala
+        return np.asarray(salida, dtype=np.float32)
+
+
+class OnnxExtractor:
+    nombre = "onnx"
+
+    def __init__(self, model_path, threads=None, contenido=None, **config):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImproperlyConfigured(
+                "MASCOTAS_EMBEDDING['BACKEND'] = 'onnx' requiere el paquete onnxruntime"
+            )
+        opciones = ort.SessionOptions()
+        if threads:
+            opciones.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            contenido if contenido is not None else str(model_path),
+            sess_options=opciones,
+            providers=["CPUExecutionProvider"],
+        )
+        self._entrada = self.session.get_inputs()[0].name
+        self.cuantizacion = self._detectar_cuantizacion(contenido if contenido is not None else str(model_path))
+
+    @staticmethod
+    def _detectar_cuantizacion(modelo):
+        """Según el tipo de los pesos; None si no está el paquete onnx para leerlos"""
+        try:
+            import onnx
+        except ImportError:
+            return None
+        grafo = (onnx.load_from_string(modelo) if isinstance(modelo, bytes) else onnx.load(modelo)).graph
+        tipos = {inicial.data_type for inicial in grafo.initializer}
+        if tipos & {onnx.TensorProto.INT8, onnx.TensorProto.UINT8}:
+            return "int8"
+        if onnx.TensorProto.FLOAT16 in tipos:
+            return "float16"
+        return "none"
+
+    def predict(self, batch):
+        salida = self.session.run(None, {self._entrada: batch.astype(np.float32, copy=False)})[0]
+        return np.asarray(salida, dtype=np.float32)
+
+
+EXTRACTORES = {
+    "keras": KerasExtractor,
+    "tflite": TFLiteExtractor,
+    "onnx": OnnxExtractor,
+}
+
+
+def default_model_path(backend, quantization):
+    extension = {"tflite": "tflite", "onnx": "onnx"}[backend]
+    sufijo = "" if quantization in (None, "none") else f"-{quantization}"
+    return os.path.join(settings.BASE_DIR, "modelos", f"mobilenet_v2{sufijo}.{extension}")
+
+
+def resolver_model_path(backend=None, model_path=None, quantization=None):
+    """Archivo del modelo exportado (tflite/onnx); ImproperlyConfigured si no existe"""
+    config = embedding_config()
+    backend = backend or config["BACKEND"]
+    quantization = quantization or config["QUANTIZATION"]
+    model_path = model_path or config["MODEL_PATH"] or default_model_path(backend, quantization)
+    if not os.path.exists(model_path):
+        raise ImproperlyConfigured(
+            f"No existe el modelo {model_path}; genéralo con "
+            f"`python manage.py exportar_modelo --formato {backend} --cuantizacion {quantization}`"
+        )
+    return model_path
+
+
+def create_extractor(backend=None, model_path=None, quantization=None, threads=None, contenido=None):
+    config = embedding_config()
+    backend = backend or config["BACKEND"]
+    if backend == "remoto":
+        from mash.cliente import ExtractorRemoto
+
+        return ExtractorRemoto()
+    if backend not in EXTRACTORES:
+        raise ImproperlyConfigured(
+            f"Backend de embeddings desconocido: {backend!r}. Opciones: {', '.join(EXTRACTORES)}, remoto"
+        )
+    if backend == "keras":
+        return KerasExtractor()
+
+    quantization = quantization or config["QUANTIZATION"]
+    if contenido is None:
+        model_path = resolver_model_path(backend, model_path, quantization)
+    extractor = EXTRACTORES[backend](model_path=model_path, threads=threads or config["THREADS"], contenido=contenido)
+    # model_version() etiqueta los vectores con la cuantización configurada:
+    # un MODEL_PATH con otra cuantización mezclaría vectores bajo la misma versión
+    detectada = getattr(extractor, "cuantizacion", None)
+    if detectada is not None and detectada != quantization:
+        raise ImproperlyConfigured(
+            f"El modelo {model_path or 'precargado'} está cuantizado como {detectada!r} "
+            f"pero MASCOTAS_EMBEDDING['QUANTIZATION'] es {quantization!r}"
+        )
+    return extractor
+
+
+def model_version(backend=None, quantization=None):
+    """
+    Versión que se guarda con cada embedding. Los modelos exportados o
+    cuantizados producen vectores ligeramente distintos, así que no se
+    mezclan con los de Keras en el índice.
+    """
+    config = embedding_config()
+    backend = backend or config["BACKEND"]
+    if backend == "remoto":
+        # Los vectores son los del backend que carga el servidor
+        from mash.servicio import servicio_config
+
+        backend = servicio_config()["BACKEND"]
+    # El sufijo "prep" identifica el preprocesado de decode_image (escalado
+    # draft/reduce + orientación EXIF); cambiarlo recalcula los vectores
+    # guardados (python manage.py embed_mascotas)
+    version = f"mobilenet_v2-imagenet-avg-224-prep{PREPROCESADO}"
+    if backend == "keras":
+        return version
+    quantization = quantization or config["QUANTIZATION"]
+    return f"{version}+{backend}-{quantization}"
@@ -0,0 +1,122 @@
+"""
+Poda geográfica de candidatos.
+
+Cada mascota con coordenadas guarda su geohash (precisión 12). Una búsqueda
+por radio se traduce en la celda del centro y sus 8 vecinas, a la precisión
+más fina cuya celda no sea menor que el radio; cada celda es un rango
+[prefijo, prefijo + "{") sobre la columna indexada. La distancia exacta
+(gran círculo) se filtra después en SQL sobre ese subconjunto.
+"""
+import math
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ACos, Cos, Least, Radians, Sin
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISION = 12
+RADIO_TIERRA_KM = 6371.0088
+KM_POR_GRADO = math.pi * RADIO_TIERRA_KM / 180
+RADIO_MAXIMO_KM = 500
+
+
+def validar_coordenadas(latitud, longitud):
+    """Error legible o None; ambas coordenadas van juntas"""
+    if (latitud is None) != (longitud is None):
+        return "latitud y longitud deben enviarse juntas"
+    if latitud is None:
+        return None
+    if not -90 <= latitud <= 90:
+        return "latitud debe estar entre -90 y 90"
+    if not -180 <= longitud <= 180:
+        return "longitud debe estar entre -180 y 180"
+    return None
+
+
+def encode(latitud, longitud, precision=PRECISION):
+    lat = [-90.0, 90.0]
+    lon = [-180.0, 180.0]
+    caracteres = []
+    bit = valor = 0
+    par = True
+    while len(caracteres) < precision:
+        rango, coordenada = (lon, longitud) if par else (lat, latitud)
+        medio = (rango[0] + rango[1]) / 2
+        valor <<= 1
+        if coordenada >= medio:
+            valor |= 1
+            rango[0] = medio
+        else:
+            rango[1] = medio
+        par = not par
+        bit += 1
+        if bit == 5:
+            caracteres.append(BASE32[valor])
+            bit = valor = 0
+    return "".join(caracteres)
+
+
+def tamano_celda(precision):
+    """(alto, ancho) en grados de una celda de geohash"""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def precision_para(radio_km, latitud):
+    """Precisión más fina cuya celda cubre el radio en ambos ejes"""
+    cos_lat = max(math.cos(math.radians(latitud)), 1e-6)
+    for precision in range(PRECISION, 0, -1):
+        alto, ancho = tamano_celda(precision)
+        if alto * KM_POR_GRADO >= radio_km and ancho * KM_POR_GRADO * cos_lat >= radio_km:
+            return precision
+    return 1
+
+
+def celdas_radio(latitud, longitud, radio_km):
+    """Prefijos de geohash (celda central + vecinas) que cubren el círculo"""
+    precision = precision_para(radio_km, latitud)
+    alto, ancho = tamano_celda(precision)
+    celdas = set()
+    for dlat in (-alto, 0, alto):
+        lat = min(max(latitud + dlat, -90.0), 90.0)
+        for dlon in (-ancho, 0, ancho):
+            lon = (longitud + dlon + 180.0) % 360.0 - 180.0
+            celdas.add(encode(lat, lon, precision))
+    return sorted(celdas)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def q_celdas(celdas, campo="geohash"):
+    """Rangos sobre la columna indexada, uno por celda"""
+    q = Q()
+    for celda in celdas:
+        q |= Q(**{f"{campo}__gte": celda, f"{campo}__lt": celda + "{"})
+    return q
+
+
+def distancia_km(latitud, longitud, prefijo=""):
+    """Expresión SQL de la distancia de gran círculo al punto dado"""
+    lat = Radians(F(f"{prefijo}latitud"))
+    lon = Radians(F(f"{prefijo}longitud"))
+    lat0 = Value(math.radians(latitud), output_field=FloatField())
+    lon0 = Value(math.radians(longitud), output_field=FloatField())
+    coseno = Sin(lat) * Sin(lat0) + Cos(lat) * Cos(lat0) * Cos(lon - lon0)
+    return ACos(Least(coseno, Value(1.0, output_field=FloatField()))) * RADIO_TIERRA_KM
+
+
+def filtrar_radio(queryset, latitud, longitud, radio_km, prefijo=""):
+    """
+    Limita el queryset a las filas dentro del radio y anota `distancia_km`.
+    `prefijo` permite filtrar por una relación, p. ej. "encontrada__".
+    """
+    celdas = celdas_radio(latitud, longitud, radio_km)
+    return (
+        queryset
+        .filter(q_celdas(celdas, f"{prefijo}geohash"))
+        .annotate(distancia_km=distancia_km(latitud, longitud, prefijo))
+        .filter(distancia_km__lte=radio_km)
+    )
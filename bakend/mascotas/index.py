@@ -0,0 +1,170 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .ann import crear_particion
+
+TIPOS_REPORTE = ("Pérdida", "Encontrada")
+
+
+def normalize(vector):
+    """
+    Normaliza un vector (o matriz por filas) a norma L2 = 1 en float32
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    norma = np.linalg.norm(vector, axis=-1, keepdims=True)
+    norma[norma == 0] = 1.0
+    return vector / norma
+
+
+class EmbeddingIndex:
+    """
+    Índice en memoria por proceso, particionado por tipo_reporte. Cada
+    partición usa el backend configurado en MASCOTAS_ANN (ver ann.py).
+    Se carga desde la base de datos una sola vez y luego se mantiene con
+    actualizaciones incrementales (señales) y una sincronización por delta
+    de MascotaEmbedding.modificado para ver cambios hechos en otros procesos.
+    Los borrados y cambios de tipo_reporte de otros procesos no mueven ese
+    delta: se detectan comparando el conteo por tipo con el de la base.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.particiones = {tipo: crear_particion(lock=self._lock) for tipo in TIPOS_REPORTE}
+        self._cargado = False
+        self._ultima_modificacion = None
+        self._ultima_sync = 0.0
+
+    @property
+    def cargado(self):
+        return self._cargado
+
+    def _filas(self, queryset):
+        from .embeddings import MODEL_VERSION
+
+        return (
+            queryset
+            .filter(modelo_version=MODEL_VERSION)
+            .values_list("mascota_id", "mascota__tipo_reporte", "vector", "modificado")
+            .iterator(chunk_size=2000)
+        )
+
+    def _aplicar(self, filas):
+        for mascota_id, tipo, vector, modificado in filas:
+            self._upsert(mascota_id, tipo, np.frombuffer(bytes(vector), dtype=np.float32))
+            if self._ultima_modificacion is None or modificado > self._ultima_modificacion:
+                self._ultima_modificacion = modificado
+
+    def ensure_loaded(self):
+        if self._cargado:
+            return
+        from .models import MascotaEmbedding
+
+        with self._lock:
+            if self._cargado:
+                return
+            inicio = time.perf_counter()
+            self._aplicar(self._filas(MascotaEmbedding.objects.all()))
+            self._cargado = True
+            self._ultima_sync = time.monotonic()
+            print(
+                f"Índice de embeddings cargado: "
+                f"{ {tipo: len(p) for tipo, p in self.particiones.items()} } "
+                f"en {time.perf_counter() - inicio:.2f}s"
+            )
+
+    def sync(self):
+        """
+        Aplica los embeddings modificados desde la última sincronización y
+        repara las particiones cuyo conteo ya no coincide con la base.
+        Se ejecuta como máximo cada MASCOTAS_INDEX_SYNC_SEGUNDOS.
+        """
+        from .models import MascotaEmbedding
+
+        intervalo = getattr(settings, "MASCOTAS_INDEX_SYNC_SEGUNDOS", 5)
+        if time.monotonic() - self._ultima_sync < intervalo:
+            return
+        with self._lock:
+            queryset = MascotaEmbedding.objects.all()
+            if self._ultima_modificacion is not None:
+                queryset = queryset.filter(modificado__gte=self._ultima_modificacion)
+            self._aplicar(self._filas(queryset))
+            self._reparar_particiones()
+            self._ultima_sync = time.monotonic()
+
+    def _reparar_particiones(self):
+        """
+        Quita los ids borrados (o movidos de tipo) en otros procesos y carga
+        los que llegaron a la partición sin cambiar su embedding
+        """
+        from django.db.models import Count
+
+        from .embeddings import MODEL_VERSION
+        from .models import MascotaEmbedding
+
+        vigentes = MascotaEmbedding.objects.filter(modelo_version=MODEL_VERSION)
+        conteos = dict(
+            vigentes.values_list("mascota__tipo_reporte").annotate(total=Count("id")).order_by()
+        )
+        for tipo, particion in self.particiones.items():
+            if len(particion) == conteos.get(tipo, 0):
+                continue
+            ids = set(vigentes.filter(mascota__tipo_reporte=tipo).values_list("mascota_id", flat=True))
+            for mascota_id in [i for i in particion.posiciones if i not in ids]:
+                particion.remove(mascota_id)
+            faltantes = ids.difference(particion.posiciones)
+            if faltantes:
+                self._aplicar(self._filas(MascotaEmbedding.objects.filter(mascota_id__in=faltantes)))
+
+    def refresh(self):
+        self.ensure_loaded()
+        self.sync()
+
+    def _upsert(self, mascota_id, tipo, vector):
+        for otro_tipo, particion in self.particiones.items():
+            if otro_tipo != tipo:
+                particion.remove(mascota_id)
+        if tipo in self.particiones:
+            self.particiones[tipo].upsert(mascota_id, normalize(vector))
+
+    def upsert(self, mascota_id, tipo, vector):
+        if not self._cargado:
+            return
+        with self._lock:
+            self._upsert(mascota_id, tipo, vector)
+
+    def move(self, mascota_id, tipo):
+        """
+        Cambia de partición un embedding cuando cambia el tipo_reporte
+        """
+        if not self._cargado:
+            return
+        with self._lock:
+            for otro_tipo, particion in self.particiones.items():
+                if otro_tipo != tipo and mascota_id in particion:
+                    vector = particion.vector(mascota_id)
+                    particion.remove(mascota_id)
+                    if tipo in self.particiones:
+                        self.particiones[tipo].upsert(mascota_id, vector)
+
+    def remove(self, mascota_id):
+        if not self._cargado:
+            return
+        with self._lock:
+            for particion in self.particiones.values():
+                particion.remove(mascota_id)
+
+    def search(self, tipo, vector, top_k=10, threshold=0.5, exclude_id=None):
+        self.refresh()
+        query = normalize(vector)
+        with self._lock:
+            return self.particiones[tipo].search(query, top_k, threshold, exclude_id)
+
+
+_index = EmbeddingIndex()
+
+
+def get_index():
+    return _index
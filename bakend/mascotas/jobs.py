@@ -0,0 +1,169 @@
+"""
+Cola de embeddings en la base de datos, sin broker externo.
+
+Las vistas encolan (encolar_embedding) y `manage.py run_embedding_worker`
+toma lotes con SELECT ... FOR UPDATE SKIP LOCKED (en PostgreSQL), genera los
+embeddings por lotes y reintenta los fallos con backoff exponencial.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import EmbeddingJob, Mascota
+
+COLA_DEFAULTS = {
+    "MAX_INTENTOS": 5,
+    "BACKOFF_BASE_SEGUNDOS": 10,
+    "BACKOFF_MAX_SEGUNDOS": 3600,
+    # Un trabajo "en_proceso" más viejo que esto se considera de un worker caído
+    "TIMEOUT_SEGUNDOS": 600,
+}
+
+
+def cola_config():
+    config = dict(COLA_DEFAULTS)
+    config.update(getattr(settings, "MASCOTAS_EMBEDDING_COLA", {}))
+    return config
+
+
+def encolar_embedding(mascota, marcar_pendiente=True):
+    """
+    Marca la mascota como pendiente y crea (o reinicia) su trabajo de embedding.
+    Con marcar_pendiente=False el embedding ya está al día y el trabajo solo
+    lleva al worker lo que depende de él (pares de mash tras reutilizar el
+    embedding o cambiar el tipo_reporte); el estado visible no cambia.
+    """
+    if not mascota.imagen:
+        Mascota.objects.filter(id=mascota.id).marcar_embedding(Mascota.EMBEDDING_SIN_IMAGEN)
+        mascota.embedding_status = Mascota.EMBEDDING_SIN_IMAGEN
+        EmbeddingJob.objects.filter(mascota=mascota).delete()
+        return None
+
+    if marcar_pendiente:
+        Mascota.objects.filter(id=mascota.id).marcar_embedding(Mascota.EMBEDDING_PENDIENTE)
+        mascota.embedding_status = Mascota.EMBEDDING_PENDIENTE
+    if _reiniciar_trabajo(mascota):
+        return
+    try:
+        # Savepoint: si otra petición creó el trabajo entre el update y el
+        # create, la transacción de quien llama sigue usable
+        with transaction.atomic():
+            EmbeddingJob.objects.create(mascota=mascota)
+    except IntegrityError:
+        _reiniciar_trabajo(mascota)
+
+
+def _reiniciar_trabajo(mascota):
+    ahora = timezone.now()
+    return EmbeddingJob.objects.filter(mascota=mascota).update(
+        estado=EmbeddingJob.PENDIENTE,
+        version=F("version") + 1,
+        intentos=0,
+        disponible_en=ahora,
+        tomado_en=None,
+        error="",
+        modificado=ahora,
+    )
+
+
+def tomar_trabajos(limite):
+    """
+    Toma hasta `limite` trabajos disponibles y los marca en proceso.
+    También recupera los que quedaron en proceso de un worker caído.
+    """
+    ahora = timezone.now()
+    vencido = ahora - timedelta(seconds=cola_config()["TIMEOUT_SEGUNDOS"])
+    with transaction.atomic():
+        trabajos = list(
+            EmbeddingJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(estado=EmbeddingJob.PENDIENTE, disponible_en__lte=ahora)
+                | Q(estado=EmbeddingJob.EN_PROCESO, tomado_en__lt=vencido)
+            )
+            .order_by("disponible_en")[:limite]
+        )
+        if trabajos:
+            EmbeddingJob.objects.filter(id__in=[t.id for t in trabajos]).update(
+                estado=EmbeddingJob.EN_PROCESO, tomado_en=ahora, modificado=ahora
+            )
+    return trabajos
+
+
+def backoff(intentos):
+    config = cola_config()
+    return min(config["BACKOFF_BASE_SEGUNDOS"] * 2 ** (intentos - 1), config["BACKOFF_MAX_SEGUNDOS"])
+
+
+def procesar_trabajos(trabajos, batch_size=32):
+    """
+    Genera los embeddings de los trabajos tomados y cierra o reprograma cada uno.
+    Retorna (completados, reintentos, fallidos).
+    """
+    from .embeddings import store_embeddings_batch
+    from .signals import embedding_procesado
+
+    if not trabajos:
+        return 0, 0, 0
+
+    por_mascota = {t.mascota_id: t for t in trabajos}
+    mascotas = list(Mascota.objects.filter(id__in=por_mascota))
+    try:
+        procesados = store_embeddings_batch(mascotas, batch_size=batch_size)
+    except Exception as e:
+        # Falla del lote entero (cargar el modelo, predict, servidor remoto):
+        # cada trabajo se reprograma con backoff como un fallo propio
+        print(f"Error procesando el lote de embeddings: {str(e)}")
+        procesados = [(mascota, f"Error del lote: {str(e)}") for mascota in mascotas if mascota.imagen]
+    resultados = {mascota.id: resultado for mascota, resultado in procesados}
+
+    embedding_procesado.send(
+        sender=Mascota,
+        mascotas=[m for m, resultado in procesados if resultado in ("guardado", "reutilizado", "omitido")],
+    )
+
+    config = cola_config()
+    completados = reintentos = fallidos = 0
+    for mascota_id, trabajo in por_mascota.items():
+        # Solo se toca el trabajo si nadie lo reencoló mientras se procesaba
+        mismo = EmbeddingJob.objects.filter(id=trabajo.id, version=trabajo.version)
+        resultado = resultados.get(mascota_id)
+
+        if resultado is None:
+            # La mascota ya no tiene imagen
+            if mismo.delete()[0]:
+                Mascota.objects.filter(id=mascota_id).marcar_embedding(Mascota.EMBEDDING_SIN_IMAGEN)
+            completados += 1
+        elif resultado in ("guardado", "reutilizado", "omitido"):
+            mismo.delete()
+            completados += 1
+        elif trabajo.intentos + 1 >= config["MAX_INTENTOS"]:
+            if mismo.update(estado=EmbeddingJob.FALLIDO, intentos=trabajo.intentos + 1, error=resultado):
+                Mascota.objects.filter(id=mascota_id).marcar_embedding(Mascota.EMBEDDING_ERROR)
+            fallidos += 1
+        else:
+            _reprogramar(mismo, trabajo, resultado)
+            reintentos += 1
+    return completados, reintentos, fallidos
+
+
+def _reprogramar(mismo, trabajo, error):
+    intentos = trabajo.intentos + 1
+    mismo.update(
+        estado=EmbeddingJob.PENDIENTE,
+        intentos=intentos,
+        error=error,
+        disponible_en=timezone.now() + timedelta(seconds=backoff(intentos)),
+    )
+
+
+def reprogramar_trabajos(trabajos, error):
+    """
+    Devuelve a la cola, con backoff, trabajos tomados cuyo lote no se pudo
+    procesar (sin esperar a TIMEOUT_SEGUNDOS)
+    """
+    for trabajo in trabajos:
+        _reprogramar(EmbeddingJob.objects.filter(id=trabajo.id, version=trabajo.version), trabajo, error)
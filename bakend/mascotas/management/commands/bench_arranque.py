@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Se ejecuta en un proceso nuevo para medir el arranque en frío
+SCRIPT = """
+import json, os, resource, sys, time
+inicio = time.perf_counter()
+import django
+django.setup()
+import importlib
+importlib.import_module({modulo!r})
+importado = time.perf_counter() - inicio
+if {modo!r} == "anterior":
+    # Como antes de la carga perezosa: el modelo se construía al importar
+    from mascotas.extractores import create_extractor
+    create_extractor()
+elif {modo!r} == "calentado":
+    from mascotas.embeddings import warmup
+    warmup()
+total = time.perf_counter() - inicio
+print(json.dumps({{
+    "importado_s": importado,
+    "total_s": total,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide tiempo de arranque y RSS máximo de un proceso Django importando "
+        "las vistas: modelo perezoso, construido al importar (comportamiento "
+        "anterior) y ya calentado con una inferencia"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modulo", default="mascotas.views",
+                            help="Módulo a importar (p. ej. api.api)")
+        parser.add_argument("--repeticiones", type=int, default=3)
+
+    def _medir(self, modulo, modo):
+        env = dict(os.environ)
+        env.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+        salida = subprocess.run(
+            [sys.executable, "-c", SCRIPT.format(modulo=modulo, modo=modo)],
+            cwd=str(settings.BASE_DIR),
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return json.loads(salida.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        escenarios = (
+            ("perezoso (sin modelo)", "perezoso"),
+            ("al importar (anterior)", "anterior"),
+            ("modelo calentado", "calentado"),
+        )
+        for etiqueta, modo in escenarios:
+            medidas = [self._medir(options["modulo"], modo) for _ in range(options["repeticiones"])]
+            importado = min(m["importado_s"] for m in medidas)
+            total = min(m["total_s"] for m in medidas)
+            rss = min(m["rss_mb"] for m in medidas)
+            self.stdout.write(
+                f"{etiqueta:<22} import {options['modulo']}: {importado:.2f}s  "
+                f"listo: {total:.2f}s  RSS máx: {rss:.0f} MB"
+            )
@@ -0,0 +1,112 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from mascotas.geo import encode, filtrar_radio
+from mascotas.models import Mascota
+from mascotas.views import filtrar_mascotas
+
+PREFIJO = "bench-filtros"
+CIUDADES = [(4.711, -74.0721), (6.2442, -75.5812), (3.4516, -76.532), (10.391, -75.4794), (7.1193, -73.1227)]
+RAZAS = ["Criollo", "Labrador", "Pastor Alemán", "Poodle", "Siamés", "Persa", "Beagle", "Bulldog"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Siembra mascotas de prueba y muestra el plan de las consultas de "
+        "/mascotas/lista con cada filtro, para comprobar que usan los índices"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sembrar", type=int, default=100000,
+                            help="Mascotas de prueba a crear (0 = usar los datos existentes)")
+        parser.add_argument("--conservar", action="store_true",
+                            help="No borra los datos sembrados al terminar")
+        parser.add_argument("--limite", type=int, default=50)
+
+    def _sembrar(self, cantidad):
+        User = get_user_model()
+        propietarios = [
+            User.objects.get_or_create(
+                username=f"{PREFIJO}-{i}", defaults={"email": f"{PREFIJO}-{i}@example.com"}
+            )[0]
+            for i in range(50)
+        ]
+        rng = random.Random(0)
+        inicio = date.today() - timedelta(days=730)
+        lote = []
+        for i in range(cantidad):
+            latitud, longitud = rng.choice(CIUDADES)
+            lote.append(Mascota(
+                nombre=f"{PREFIJO}-{i}",
+                raza=rng.choice(RAZAS),
+                dia=inicio + timedelta(days=rng.randrange(730)),
+                propietario=rng.choice(propietarios),
+                tipo_reporte=rng.choice(("Pérdida", "Encontrada")),
+                embedding_status=Mascota.EMBEDDING_SIN_IMAGEN,
+                latitud=latitud + rng.uniform(-0.3, 0.3),
+                longitud=longitud + rng.uniform(-0.3, 0.3),
+            ))
+            # bulk_create no pasa por save(): el geohash se calcula aquí
+            lote[-1].geohash = encode(lote[-1].latitud, lote[-1].longitud)
+            if len(lote) == 5000:
+                Mascota.objects.bulk_create(lote)
+                lote = []
+        Mascota.objects.bulk_create(lote)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE mascotas_mascota")
+        return propietarios
+
+    def _limpiar(self):
+        get_user_model().objects.filter(username__startswith=PREFIJO).delete()
+
+    def handle(self, *args, **options):
+        propietario = None
+        if options["sembrar"]:
+            self.stdout.write(f"Sembrando {options['sembrar']} mascotas...")
+            propietario = self._sembrar(options["sembrar"])[0].id
+        try:
+            self._explicar(options["limite"], propietario)
+        finally:
+            if options["sembrar"] and not options["conservar"]:
+                self._limpiar()
+
+    def _explicar(self, limite, propietario):
+        hoy = date.today()
+        casos = {
+            "tipo_reporte": {"tipo_reporte": "Pérdida"},
+            "tipo_reporte + dia": {
+                "tipo_reporte": "Encontrada",
+                "dia_desde": hoy - timedelta(days=30),
+                "dia_hasta": hoy,
+            },
+            "raza": {"raza": "labrador"},
+            "propietario + tipo_reporte": {
+                "propietario": propietario or Mascota.objects.values_list("propietario_id", flat=True).first(),
+                "tipo_reporte": "Pérdida",
+            },
+        }
+        latitud, longitud = CIUDADES[0]
+        casos["radio 10 km"] = {"radio": (latitud, longitud, 10)}
+        casos["tipo_reporte + radio 10 km"] = {"tipo_reporte": "Pérdida", "radio": (latitud, longitud, 10)}
+        for nombre, filtros in casos.items():
+            radio = filtros.pop("radio", None)
+            queryset = filtrar_mascotas(Mascota.objects.all(), **filtros)
+            if radio:
+                queryset = filtrar_radio(queryset, *radio)
+            queryset = queryset.order_by("-creado", "-id")[:limite]
+            inicio = time.perf_counter()
+            filas = len(list(queryset))
+            duracion = 1000 * (time.perf_counter() - inicio)
+            plan = queryset.explain()
+            usa_indice = "index" in plan.lower()
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"\n{nombre}: {filas} filas en {duracion:.1f} ms — "
+                f"{'usa índice' if usa_indice else 'SIN índice'}"
+            ))
+            self.stdout.write(plan)
@@ -0,0 +1,96 @@
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from mascotas.embeddings import INPUT_SIZE, decode_image, get_model
+from mascotas.index import normalize
+from mascotas.management.commands.exportar_modelo import imagenes_calibracion
+
+
+def decode_image_anterior(image_path):
+    """Ruta previa: decodifica a resolución completa y luego redimensiona"""
+    img = Image.open(image_path).convert("RGB")
+    img = img.resize(INPUT_SIZE)
+    img_array = np.array(img).astype(np.float32)
+    return img_array / 127.5 - 1.0
+
+
+def generar_corpus(directorio, cantidad, tamano=(4000, 3000)):
+    """Fotos sintéticas grandes (12MP por defecto), mitad JPEG y mitad PNG"""
+    rng = np.random.default_rng(0)
+    for i in range(cantidad):
+        base = (rng.random((tamano[1] // 50, tamano[0] // 50, 3)) * 255).astype(np.uint8)
+        img = Image.fromarray(base).resize(tamano, Image.Resampling.BILINEAR)
+        if i % 2:
+            img.save(Path(directorio) / f"foto_{i}.png", optimize=False, compress_level=1)
+        else:
+            img.save(Path(directorio) / f"foto_{i}.jpg", quality=90)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el preprocesado actual (draft/reduce) con el anterior sobre un "
+        "corpus de imágenes grandes: tiempo por imagen y deriva de píxeles/embeddings"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--imagenes", default=None, help="Directorio con el corpus")
+        parser.add_argument("--generar", type=int, default=0,
+                            help="Genera N imágenes sintéticas de 12MP en un directorio temporal")
+        parser.add_argument("--limite", type=int, default=50)
+        parser.add_argument("--embeddings", action="store_true",
+                            help="Mide también la deriva coseno de los embeddings (carga el modelo)")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as temporal:
+            directorio = options["imagenes"]
+            if options["generar"]:
+                directorio = temporal
+                self.stdout.write(f"Generando {options['generar']} imágenes en {temporal}...")
+                generar_corpus(temporal, options["generar"])
+            if not directorio:
+                raise CommandError("Indica --imagenes <directorio> o --generar N")
+
+            rutas = imagenes_calibracion(directorio, options["limite"])
+            if not rutas:
+                raise CommandError(f"No hay imágenes en {directorio}")
+            self._comparar(rutas, options["embeddings"])
+
+    def _tiempo(self, funcion, rutas):
+        salidas, tiempos = [], []
+        for ruta in rutas:
+            inicio = time.perf_counter()
+            salidas.append(funcion(ruta))
+            tiempos.append(time.perf_counter() - inicio)
+        return np.stack(salidas), 1000 * np.array(tiempos)
+
+    def _comparar(self, rutas, con_embeddings):
+        anterior, t_anterior = self._tiempo(decode_image_anterior, rutas)
+        actual, t_actual = self._tiempo(decode_image, rutas)
+
+        self.stdout.write(f"Imágenes: {len(rutas)}")
+        self.stdout.write(
+            f"Anterior  p50 {np.median(t_anterior):.1f} ms  p95 {np.percentile(t_anterior, 95):.1f} ms"
+        )
+        self.stdout.write(
+            f"Actual    p50 {np.median(t_actual):.1f} ms  p95 {np.percentile(t_actual, 95):.1f} ms"
+        )
+        self.stdout.write(f"Aceleración: {np.median(t_anterior) / np.median(t_actual):.1f}x")
+
+        diferencia = np.abs(anterior - actual) * 127.5  # de vuelta a niveles 0-255
+        self.stdout.write(
+            f"Deriva de píxel (0-255): media {diferencia.mean():.2f}  máx {diferencia.max():.0f}"
+        )
+
+        if con_embeddings:
+            modelo = get_model()
+            e_anterior = normalize(modelo.predict(anterior))
+            e_actual = normalize(modelo.predict(actual))
+            cosenos = np.sum(e_anterior * e_actual, axis=1)
+            self.stdout.write(
+                f"Coseno de embeddings: min {cosenos.min():.4f}  media {cosenos.mean():.4f}"
+            )
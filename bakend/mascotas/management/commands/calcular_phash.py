@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand
+from PIL import Image, UnidentifiedImageError
+
+from mascotas.models import Mascota
+from mascotas.phash import a_columna, de_columna, dhash, dhash_bytes, get_indice_phash
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula el hash perceptual (dHash) de las mascotas con imagen que aún "
+        "no lo tienen y mide la búsqueda de casi duplicados en memoria"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Recalcula también los ya calculados")
+        parser.add_argument("--lote", type=int, default=500)
+
+    def handle(self, *args, **options):
+        pendientes = Mascota.objects.exclude(imagen="").exclude(imagen__isnull=True)
+        if not options["force"]:
+            pendientes = pendientes.filter(phash__isnull=True)
+        total = pendientes.count()
+        self.stdout.write(f"{total} mascotas por procesar")
+
+        hechas = errores = 0
+        for mascota in pendientes.order_by("pk").iterator(chunk_size=options["lote"]):
+            try:
+                # Mismo origen que en la ingesta: la miniatura si existe
+                if mascota.imagen_miniatura:
+                    with mascota.imagen_miniatura.open("rb") as archivo:
+                        valor = dhash_bytes(archivo.read())
+                else:
+                    with mascota.imagen.open("rb") as archivo, Image.open(archivo) as imagen:
+                        imagen.draft("L", (320, 320))
+                        valor = dhash(imagen)
+            except (UnidentifiedImageError, OSError) as e:
+                errores += 1
+                self.stderr.write(f"  mascota {mascota.pk}: {e}")
+                continue
+            mascota.phash = a_columna(valor)
+            mascota.save(update_fields=["phash"])
+            hechas += 1
+            if hechas % options["lote"] == 0:
+                self.stdout.write(f"  {hechas}/{total}")
+
+        self.stdout.write(self.style.SUCCESS(f"{hechas} calculados, {errores} errores"))
+        self._medir()
+
+    def _medir(self):
+        indice = get_indice_phash()
+        indice.ensure_loaded()
+        muestra = list(
+            Mascota.objects.filter(phash__isnull=False)
+            .order_by("?").values_list("id", "tipo_reporte", "phash")[:200]
+        )
+        if not muestra:
+            return
+        tiempos = []
+        for mascota_id, tipo, phash in muestra:
+            opuesto = "Encontrada" if tipo == "Pérdida" else "Pérdida"
+            inicio = time.perf_counter()
+            indice.search(opuesto, de_columna(phash), exclude_id=mascota_id)
+            tiempos.append(time.perf_counter() - inicio)
+        tiempos.sort()
+        self.stdout.write(
+            f"Búsqueda en {len(indice)} hashes: p50 {1e6 * tiempos[len(tiempos) // 2]:.0f} µs, "
+            f"p99 {1e6 * tiempos[int(len(tiempos) * 0.99)]:.0f} µs"
+        )
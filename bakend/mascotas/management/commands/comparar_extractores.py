@@ -0,0 +1,90 @@
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from mascotas.embeddings import decode_image
+from mascotas.extractores import EXTRACTORES, create_extractor
+from mascotas.index import normalize
+from mascotas.management.commands.exportar_modelo import imagenes_calibracion
+
+
+def rss_actual_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara un backend de embeddings contra Keras sobre un conjunto fijo de "
+        "imágenes: concordancia coseno (falla bajo --minimo), latencia y memoria"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", choices=[b for b in EXTRACTORES if b != "keras"], required=True)
+        parser.add_argument("--modelo", default=None, help="Ruta del modelo exportado")
+        parser.add_argument("--cuantizacion", choices=["none", "float16", "int8"], default=None)
+        parser.add_argument("--imagenes", default=str(settings.MEDIA_ROOT),
+                            help="Directorio con el conjunto fijo de imágenes")
+        parser.add_argument("--limite", type=int, default=64)
+        parser.add_argument("--batch-size", type=int, default=16)
+        parser.add_argument("--minimo", type=float, default=0.99,
+                            help="Coseno mínimo aceptado por imagen")
+
+    def _medir(self, nombre, crear, lotes):
+        rss_antes = rss_actual_mb()
+        inicio = time.perf_counter()
+        extractor = crear()
+        carga = time.perf_counter() - inicio
+        extractor.predict(lotes[0][:1])  # calentamiento
+
+        tiempos, salidas = [], []
+        for lote in lotes:
+            inicio = time.perf_counter()
+            salidas.append(extractor.predict(lote))
+            tiempos.append(time.perf_counter() - inicio)
+        rss = rss_actual_mb() - rss_antes
+        imagenes = sum(len(lote) for lote in lotes)
+        self.stdout.write(
+            f"{nombre:<18} carga {carga:.2f}s  "
+            f"lote p50 {1000 * np.median(tiempos):.1f} ms  "
+            f"{imagenes / sum(tiempos):.1f} img/s  RSS +{rss:.0f} MB"
+        )
+        return np.concatenate(salidas)
+
+    def handle(self, *args, **options):
+        rutas = imagenes_calibracion(options["imagenes"], options["limite"])
+        if not rutas:
+            raise CommandError(f"No hay imágenes en {options['imagenes']}")
+        imagenes = np.stack([decode_image(r) for r in rutas])
+        tamano = options["batch_size"]
+        lotes = [imagenes[i:i + tamano] for i in range(0, len(imagenes), tamano)]
+        self.stdout.write(f"Imágenes: {len(rutas)} de {options['imagenes']}")
+
+        backend = options["backend"]
+        candidato = self._medir(
+            backend,
+            lambda: create_extractor(backend, options["modelo"], options["cuantizacion"]),
+            lotes,
+        )
+        referencia = self._medir("keras", lambda: create_extractor("keras"), lotes)
+
+        cosenos = np.sum(normalize(referencia) * normalize(candidato), axis=1)
+        self.stdout.write(
+            f"Coseno vs keras: min {cosenos.min():.4f}  media {cosenos.mean():.4f}"
+        )
+        if cosenos.min() < options["minimo"]:
+            peor = rutas[int(np.argmin(cosenos))]
+            raise CommandError(
+                f"Paridad insuficiente: coseno mínimo {cosenos.min():.4f} < {options['minimo']} ({peor})"
+            )
+        self.stdout.write(self.style.SUCCESS("Paridad OK"))
@@ -0,0 +1,101 @@
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from mascotas.embeddings import MODEL_VERSION, store_embeddings_batch
+from mascotas.models import Mascota
+from mascotas.signals import embedding_procesado
+
+
+class Command(BaseCommand):
+    help = (
+        "(Re)genera los embeddings de la tabla Mascota por bloques, con inferencia "
+        "por lotes. Guarda un checkpoint para reanudar tras una caída."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Recalcula todos los embeddings aunque el checksum no haya cambiado",
+        )
+        parser.add_argument("--chunk", type=int, default=256, help="Mascotas por bloque")
+        parser.add_argument("--batch-size", type=int, default=32, help="Imágenes por inferencia")
+        parser.add_argument("--workers", type=int, default=None, help="Hilos de decodificación")
+        parser.add_argument(
+            "--checkpoint",
+            default=str(Path(settings.BASE_DIR) / ".embed_mascotas.checkpoint"),
+            help="Archivo con el último id procesado",
+        )
+        parser.add_argument(
+            "--reiniciar",
+            action="store_true",
+            help="Ignora el checkpoint y empieza desde el principio",
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = Path(options["checkpoint"])
+        desde_id = 0
+        if checkpoint.exists() and not options["reiniciar"]:
+            desde_id = int(checkpoint.read_text().strip() or 0)
+            self.stdout.write(f"Reanudando desde el id {desde_id} ({checkpoint})")
+
+        # Sin --force store_embeddings_batch omite las que tienen embedding del
+        # modelo actual para el mismo checksum: una imagen reemplazada se recalcula
+        mascotas = (
+            Mascota.objects
+            .exclude(imagen="").exclude(imagen__isnull=True)
+            .filter(id__gt=desde_id)
+            .order_by("id")
+        )
+
+        total = mascotas.count()
+        self.stdout.write(f"Mascotas a procesar: {total} (modelo {MODEL_VERSION})")
+
+        guardados = reutilizados = omitidos = errores = procesadas = 0
+        inicio = time.perf_counter()
+        ultimo_id = desde_id
+        while True:
+            bloque = list(mascotas.filter(id__gt=ultimo_id)[:options["chunk"]])
+            if not bloque:
+                break
+
+            resultados = store_embeddings_batch(
+                bloque,
+                batch_size=options["batch_size"],
+                force=options["force"],
+                workers=options["workers"],
+            )
+            for mascota, resultado in resultados:
+                if resultado == "guardado":
+                    guardados += 1
+                elif resultado == "reutilizado":
+                    reutilizados += 1
+                elif resultado == "omitido":
+                    omitidos += 1
+                else:
+                    errores += 1
+                    self.stderr.write(f"Error con mascota {mascota.id}: {resultado}")
+            embedding_procesado.send(
+                sender=Mascota,
+                mascotas=[m for m, resultado in resultados if resultado in ("guardado", "reutilizado")],
+            )
+            procesadas += len(bloque)
+            ultimo_id = bloque[-1].id
+            checkpoint.write_text(str(ultimo_id))
+
+            transcurrido = time.perf_counter() - inicio
+            self.stdout.write(
+                f"[{procesadas}/{total}] id<={ultimo_id} "
+                f"guardados={guardados} reutilizados={reutilizados} omitidos={omitidos} errores={errores} "
+                f"{guardados / transcurrido if transcurrido else 0:.1f} img/s"
+            )
+
+        checkpoint.unlink(missing_ok=True)
+        transcurrido = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"Embeddings guardados: {guardados}, reutilizados: {reutilizados}, omitidos: {omitidos}, errores: {errores} "
+            f"en {transcurrido:.1f}s ({guardados / transcurrido if transcurrido else 0:.1f} img/s)"
+        ))
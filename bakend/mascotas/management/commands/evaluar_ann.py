@@ -0,0 +1,100 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from mascotas.ann import BACKENDS, crear_particion
+from mascotas.embeddings import MODEL_VERSION
+from mascotas.index import normalize
+from mascotas.models import MascotaEmbedding
+
+
+class Command(BaseCommand):
+    help = "Mide recall@k y latencia de un backend ANN contra la búsqueda exacta"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", choices=list(BACKENDS), default=None,
+                            help="Backend a evaluar (por defecto MASCOTAS_ANN['BACKEND'])")
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--consultas", type=int, default=200)
+        parser.add_argument("--sinteticos", type=int, default=0,
+                            help="Usa N vectores aleatorios agrupados en vez de la base de datos")
+        parser.add_argument("--dim", type=int, default=1280)
+        parser.add_argument("--nprobe", type=int, default=None, help="IVF_NPROBE")
+        parser.add_argument("--nlist", type=int, default=None, help="IVF_NLIST")
+        parser.add_argument("--ef-search", type=int, default=None, help="HNSW_EF_SEARCH")
+        parser.add_argument("--semilla", type=int, default=0)
+
+    def _datos(self, options, rng):
+        if options["sinteticos"]:
+            n, dim = options["sinteticos"], options["dim"]
+            centros = rng.standard_normal((max(1, n // 50), dim)).astype(np.float32)
+            datos = centros[rng.integers(0, len(centros), n)]
+            datos += 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+            return np.arange(n), normalize(datos)
+        filas = list(
+            MascotaEmbedding.objects
+            .filter(modelo_version=MODEL_VERSION)
+            .values_list("mascota_id", "vector")
+        )
+        if not filas:
+            return np.empty(0, dtype=np.int64), None
+        ids = np.array([mascota_id for mascota_id, _ in filas], dtype=np.int64)
+        datos = np.stack([np.frombuffer(bytes(v), dtype=np.float32) for _, v in filas])
+        return ids, normalize(datos)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["semilla"])
+        ids, datos = self._datos(options, rng)
+        if datos is None:
+            self.stderr.write("No hay embeddings para evaluar; usa --sinteticos N")
+            return
+
+        k = options["k"]
+        exacta = crear_particion("exact")
+        candidata = crear_particion(
+            options["backend"],
+            IVF_NPROBE=options["nprobe"],
+            IVF_NLIST=options["nlist"],
+            HNSW_EF_SEARCH=options["ef_search"],
+        )
+
+        inicio = time.perf_counter()
+        for mascota_id, vector in zip(ids, datos):
+            exacta.upsert(int(mascota_id), vector)
+        t_exacta = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        for mascota_id, vector in zip(ids, datos):
+            candidata.upsert(int(mascota_id), vector)
+        if hasattr(candidata, "entrenar") and candidata.centroides is None and len(candidata) > 1:
+            candidata.entrenar()
+        t_candidata = time.perf_counter() - inicio
+
+        consultas = datos[rng.choice(len(datos), min(options["consultas"], len(datos)), replace=False)]
+        consultas = normalize(consultas + 0.1 * rng.standard_normal(consultas.shape).astype(np.float32))
+
+        recalls, lat_exacta, lat_candidata = [], [], []
+        for query in consultas:
+            inicio = time.perf_counter()
+            verdad = exacta.search(query, k, -1.0)
+            lat_exacta.append(time.perf_counter() - inicio)
+            inicio = time.perf_counter()
+            aproximado = candidata.search(query, k, -1.0)
+            lat_candidata.append(time.perf_counter() - inicio)
+            esperados = {mascota_id for mascota_id, _ in verdad}
+            obtenidos = {mascota_id for mascota_id, _ in aproximado}
+            recalls.append(len(esperados & obtenidos) / max(len(esperados), 1))
+
+        def ms(valores, p):
+            return 1000 * float(np.percentile(valores, p))
+
+        nombre = type(candidata).__name__
+        self.stdout.write(f"Vectores: {len(datos)} x {datos.shape[1]}, consultas: {len(consultas)}, k={k}")
+        self.stdout.write(f"Construcción: exacta {t_exacta:.2f}s, {nombre} {t_candidata:.2f}s")
+        self.stdout.write(
+            f"{'ParticionExacta':<16} p50 {ms(lat_exacta, 50):.2f} ms  p95 {ms(lat_exacta, 95):.2f} ms"
+        )
+        self.stdout.write(
+            f"{nombre:<16} p50 {ms(lat_candidata, 50):.2f} ms  p95 {ms(lat_candidata, 95):.2f} ms"
+        )
+        self.stdout.write(self.style.SUCCESS(f"recall@{k}: {np.mean(recalls):.4f}"))
@@ -0,0 +1,92 @@
+import os
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from mascotas.embeddings import decode_image
+from mascotas.extractores import build_keras_model, default_model_path
+
+
+def imagenes_calibracion(directorio, limite):
+    extensiones = {".jpg", ".jpeg", ".png", ".webp"}
+    rutas = sorted(
+        p for p in Path(directorio).rglob("*") if p.suffix.lower() in extensiones
+    )
+    return [str(p) for p in rutas[:limite]]
+
+
+class Command(BaseCommand):
+    help = "Exporta el extractor MobileNetV2 a TFLite u ONNX, con cuantización opcional"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--formato", choices=["tflite", "onnx"], required=True)
+        parser.add_argument("--cuantizacion", choices=["none", "float16", "int8"], default="none")
+        parser.add_argument("--salida", default=None,
+                            help="Ruta del modelo (por defecto modelos/mobilenet_v2[-cuant].ext)")
+        parser.add_argument("--calibracion", default=None,
+                            help="Directorio de imágenes para calibrar int8 en TFLite")
+        parser.add_argument("--muestras", type=int, default=200)
+
+    def handle(self, *args, **options):
+        formato, cuantizacion = options["formato"], options["cuantizacion"]
+        salida = options["salida"] or default_model_path(formato, cuantizacion)
+        os.makedirs(os.path.dirname(salida), exist_ok=True)
+
+        modelo = build_keras_model()
+        if formato == "tflite":
+            self._tflite(modelo, salida, cuantizacion, options)
+        else:
+            self._onnx(modelo, salida, cuantizacion)
+
+        tamano = os.path.getsize(salida) / (1024 * 1024)
+        self.stdout.write(self.style.SUCCESS(f"Modelo exportado en {salida} ({tamano:.1f} MB)"))
+
+    def _tflite(self, modelo, salida, cuantizacion, options):
+        import tensorflow as tf
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(modelo)
+        if cuantizacion == "float16":
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        elif cuantizacion == "int8":
+            if not options["calibracion"]:
+                raise CommandError("La cuantización int8 de TFLite requiere --calibracion <directorio>")
+            rutas = imagenes_calibracion(options["calibracion"], options["muestras"])
+            if not rutas:
+                raise CommandError(f"No hay imágenes en {options['calibracion']}")
+
+            def dataset_representativo():
+                for ruta in rutas:
+                    yield [np.expand_dims(decode_image(ruta), 0)]
+
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = dataset_representativo
+            # Pesos y activaciones en int8; entrada y salida siguen en float32
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        with open(salida, "wb") as f:
+            f.write(converter.convert())
+
+    def _onnx(self, modelo, salida, cuantizacion):
+        import tensorflow as tf
+        try:
+            import tf2onnx
+        except ImportError:
+            raise CommandError("Exportar a ONNX requiere el paquete tf2onnx")
+
+        firma = (tf.TensorSpec((None, 224, 224, 3), tf.float32, name="input"),)
+        destino = salida if cuantizacion == "none" else salida + ".fp32"
+        tf2onnx.convert.from_keras(modelo, input_signature=firma, opset=13, output_path=destino)
+
+        if cuantizacion == "int8":
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantize_dynamic(destino, salida, weight_type=QuantType.QInt8)
+            os.remove(destino)
+        elif cuantizacion == "float16":
+            import onnx
+            from onnxconverter_common import float16
+
+            modelo_onnx = float16.convert_float_to_float16(onnx.load(destino), keep_io_types=True)
+            onnx.save(modelo_onnx, salida)
+            os.remove(destino)
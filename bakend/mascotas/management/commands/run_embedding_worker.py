@@ -0,0 +1,57 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from mascotas.jobs import procesar_trabajos, reprogramar_trabajos, tomar_trabajos
+
+
+class Command(BaseCommand):
+    help = "Consume la cola de embeddings (EmbeddingJob) y genera los embeddings por lotes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=32, help="Trabajos por lote")
+        parser.add_argument("--espera", type=float, default=2.0,
+                            help="Segundos entre consultas cuando la cola está vacía")
+        parser.add_argument("--una-vez", action="store_true",
+                            help="Procesa lo disponible y termina")
+
+    def handle(self, *args, **options):
+        self._detener = False
+        signal.signal(signal.SIGTERM, self._senal)
+        signal.signal(signal.SIGINT, self._senal)
+
+        self.stdout.write("Worker de embeddings iniciado")
+        while not self._detener:
+            close_old_connections()
+            trabajos = tomar_trabajos(options["batch_size"])
+            if not trabajos:
+                if options["una_vez"]:
+                    break
+                time.sleep(options["espera"])
+                continue
+
+            inicio = time.perf_counter()
+            try:
+                completados, reintentos, fallidos = procesar_trabajos(
+                    trabajos, batch_size=options["batch_size"]
+                )
+            except Exception as e:
+                # Un error inesperado (p. ej. la base) no detiene el worker
+                self.stderr.write(f"Error procesando el lote: {str(e)}")
+                try:
+                    reprogramar_trabajos(trabajos, str(e))
+                except Exception as e:
+                    self.stderr.write(f"No se pudieron reprogramar los trabajos: {str(e)}")
+                time.sleep(options["espera"])
+                continue
+            self.stdout.write(
+                f"Lote de {len(trabajos)}: completados={completados} "
+                f"reintentos={reintentos} fallidos={fallidos} "
+                f"({time.perf_counter() - inicio:.2f}s)"
+            )
+        self.stdout.write("Worker de embeddings detenido")
+
+    def _senal(self, signum, frame):
+        self._detener = True
@@ -1,9 +1,39 @@
 from django.db import models
+from django.db.models.functions import Upper
 from usuarios.models import User
+from api.models import Buscable, ImagenVariantes
 from django.utils import timezone
+import numpy as np
+
+from .especies import ESPECIES, especie_de
+from .geo import encode
+from .phash import a_columna, dhash_bytes
 
 tipo_reporte = (("Pérdida", "Pérdida"), ("Encontrada", "Encontrada"))
-class Mascota(models.Model):
+
+
+class MascotaQuerySet(models.QuerySet):
+
+    def marcar_embedding(self, estado):
+        # update() no toca auto_now: `modificado` se sube aquí para que los
+        # ETag de lista/detalle (api/condicional.py) vean el nuevo estado
+        return self.update(embedding_status=estado, modificado=timezone.now())
+
+
+class Mascota(ImagenVariantes, Buscable):
+    EMBEDDING_PENDIENTE = "pendiente"
+    EMBEDDING_LISTO = "listo"
+    EMBEDDING_ERROR = "error"
+    EMBEDDING_SIN_IMAGEN = "sin_imagen"
+    ESTADOS_EMBEDDING = (
+        (EMBEDDING_PENDIENTE, "Pendiente"),
+        (EMBEDDING_LISTO, "Listo"),
+        (EMBEDDING_ERROR, "Error"),
+        (EMBEDDING_SIN_IMAGEN, "Sin imagen"),
+    )
+    CAMPOS_BUSQUEDA = {"nombre": "A", "raza": "B", "descripcion": "C"}
+    CAMPOS_EXTRA_BUSQUEDA = ("raza", "tipo_reporte")
+
     nombre = models.CharField(max_length=100)
     raza = models.CharField(max_length=50)
     dia = models.DateField(blank=True, null=True)
@@ -11,7 +41,112 @@ class Mascota(models.Model):
     tipo_reporte = models.CharField(max_length=20, choices=tipo_reporte)
     descripcion = models.TextField(null=True, blank=True)
     imagen = models.ImageField(upload_to='mascotas/', null=True, blank=True)
+    embedding_status = models.CharField(max_length=20, choices=ESTADOS_EMBEDDING, default=EMBEDDING_PENDIENTE)
+    creado = models.DateTimeField(auto_now_add=True)
+    latitud = models.FloatField(null=True, blank=True)
+    longitud = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, default="", db_index=True)
+    especie = models.CharField(max_length=10, choices=ESPECIES, blank=True, default="")
+    # dHash de la miniatura (mascotas/phash.py), en complemento a dos
+    phash = models.BigIntegerField(null=True, blank=True, db_index=True)
+    modificado = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = MascotaQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-creado', '-id'], name='mascota_creado_id_idx'),
+            # Filtros de /mascotas/lista
+            models.Index(fields=['tipo_reporte', '-creado', '-id'], name='mascota_tipo_creado_idx'),
+            models.Index(fields=['tipo_reporte', 'dia'], name='mascota_tipo_dia_idx'),
+            models.Index(fields=['propietario', 'tipo_reporte'], name='mascota_prop_tipo_idx'),
+            models.Index(Upper('raza'), name='mascota_raza_upper_idx'),
+            # Poda geográfica del match: partición opuesta + rango de geohash
+            models.Index(fields=['tipo_reporte', 'geohash'], name='mascota_tipo_geohash_idx'),
+            # Prefiltros del match (mash/prefiltros.py)
+            models.Index(fields=['tipo_reporte', 'especie', 'dia'], name='mascota_tipo_especie_dia_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.latitud is not None and self.longitud is not None:
+            self.geohash = encode(self.latitud, self.longitud)
+        else:
+            self.geohash = ""
+        self.especie = especie_de(self.raza)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            derivados = set()
+            if {"latitud", "longitud"} & set(update_fields):
+                derivados.add("geohash")
+            if "raza" in update_fields:
+                derivados.add("especie")
+            if "imagen_miniatura" in update_fields:
+                derivados.add("phash")
+            if update_fields:
+                derivados.add("modificado")
+            kwargs["update_fields"] = {*update_fields, *derivados}
+        super().save(*args, **kwargs)
+
+    def imagen_procesada(self, procesadas):
+        self.phash = a_columna(dhash_bytes(procesadas["miniatura"].datos))
+
+    def eliminar_imagenes(self):
+        super().eliminar_imagenes()
+        self.phash = None
+
+    def __str__(self):
+        return f"{self.nombre} ({self.raza})"
+
+
+class MascotaEmbedding(models.Model):
+    """Embedding persistido de la imagen de una mascota (float32)"""
+    mascota = models.OneToOneField(Mascota, on_delete=models.CASCADE, related_name='embedding')
+    vector = models.BinaryField()
+    dimension = models.PositiveIntegerField()
+    modelo_version = models.CharField(max_length=100, db_index=True)
+    checksum = models.CharField('SHA-256 de la imagen', max_length=64, db_index=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    modificado = models.DateTimeField(auto_now=True, db_index=True)
+
+    def as_array(self):
+        return np.frombuffer(bytes(self.vector), dtype=np.float32)
+
+    def set_array(self, embedding):
+        embedding = np.ascontiguousarray(embedding, dtype=np.float32)
+        self.vector = embedding.tobytes()
+        self.dimension = embedding.shape[0]
+
+    def __str__(self):
+        return f"Embedding {self.modelo_version} de {self.mascota_id}"
+
+
+class EmbeddingJob(models.Model):
+    """
+    Trabajo pendiente de embedding para una mascota (cola en la base de datos).
+    Lo consume `manage.py run_embedding_worker`; al terminar bien se elimina.
+    """
+    PENDIENTE = "pendiente"
+    EN_PROCESO = "en_proceso"
+    FALLIDO = "fallido"
+    ESTADOS = (
+        (PENDIENTE, "Pendiente"),
+        (EN_PROCESO, "En proceso"),
+        (FALLIDO, "Fallido"),
+    )
+
+    mascota = models.OneToOneField(Mascota, on_delete=models.CASCADE, related_name='embedding_job')
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    # Se incrementa al reencolar: el worker solo cierra el trabajo que tomó
+    version = models.PositiveIntegerField(default=1)
+    intentos = models.PositiveIntegerField(default=0)
+    disponible_en = models.DateTimeField(default=timezone.now)
+    tomado_en = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    creado = models.DateTimeField(auto_now_add=True)
+    modificado = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['estado', 'disponible_en'])]
 
     def __str__(self):
-        return f"{self.nombre} ({self.raza})"
\ No newline at end of file
+        return f"Embedding de {self.mascota_id} ({self.estado})"
@@ -0,0 +1,257 @@
+"""
+Hash perceptual de las fotos de mascotas y búsqueda de casi duplicados.
+
+- dHash de 64 bits: la miniatura en gris reducida a 9x8 y un bit por par
+  de píxeles vecinos (izquierdo > derecho). Recompresiones, cambios de
+  tamaño o de brillo cambian pocos bits; otra foto cambia ~32.
+- Se calcula al ingresar la imagen (Mascota.phash, con índice) a partir de
+  la miniatura ya decodificada, así cuesta menos de un milisegundo.
+- IndicePHash: índice en memoria por proceso con multi-index hashing. El
+  hash se parte en BLOQUES de 16 bits; si dos hashes están a distancia
+  <= d, por el principio del palomar al menos un bloque difiere en
+  <= d // BLOQUES bits, así que basta consultar esas variantes de cada
+  bloque en un dict y verificar la distancia completa. Es exacto y para
+  d <= 7 son 4 x 17 consultas, sin importar cuántas mascotas haya.
+
+Lo usa /mascotas/match para devolver duplicados aunque el embedding de una
+subida nueva todavía esté pendiente. Mascotas anteriores:
+python manage.py calcular_phash
+"""
+import io
+import threading
+import time
+from functools import lru_cache
+from itertools import combinations
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from . import cache
+
+PHASH_DEFAULTS = {
+    "DISTANCIA_MAX": 6,
+}
+
+BITS = 64
+BLOQUES = 4
+BITS_BLOQUE = BITS // BLOQUES
+MASCARA_BLOQUE = (1 << BITS_BLOQUE) - 1
+# Con más de 3 bits por bloque las variantes a consultar crecen demasiado
+DISTANCIA_LIMITE = 4 * BLOQUES - 1
+
+
+def phash_config():
+    config = dict(PHASH_DEFAULTS)
+    config.update(getattr(settings, "MASCOTAS_PHASH", {}))
+    config["DISTANCIA_MAX"] = min(config["DISTANCIA_MAX"], DISTANCIA_LIMITE)
+    return config
+
+
+def dhash(imagen):
+    """dHash de 64 bits (entero sin signo) de una imagen PIL"""
+    gris = imagen.convert("L").resize((9, 8), Image.LANCZOS)
+    pixeles = np.asarray(gris, dtype=np.int16)
+    bits = (pixeles[:, :-1] > pixeles[:, 1:]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def dhash_bytes(datos):
+    with Image.open(io.BytesIO(datos)) as imagen:
+        imagen.draft("L", (64, 64))
+        return dhash(imagen)
+
+
+# La columna es BigIntegerField (con signo): se guarda en complemento a dos
+def a_columna(valor):
+    return valor - (1 << BITS) if valor >= 1 << (BITS - 1) else valor
+
+
+def de_columna(valor):
+    return valor + (1 << BITS) if valor < 0 else valor
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+@lru_cache(maxsize=None)
+def _mascaras(bits_distintos):
+    """XOR de todas las variantes de un bloque con hasta `bits_distintos` bits cambiados"""
+    mascaras = [0]
+    for k in range(1, bits_distintos + 1):
+        for posiciones in combinations(range(BITS_BLOQUE), k):
+            mascaras.append(sum(1 << p for p in posiciones))
+    return tuple(mascaras)
+
+
+def _bloques(valor):
+    return [(valor >> (i * BITS_BLOQUE)) & MASCARA_BLOQUE for i in range(BLOQUES)]
+
+
+class IndicePHash:
+    """
+    Hashes por mascota en memoria, con la misma carga perezosa,
+    sincronización por delta (Mascota.modificado) y reparación por conteo
+    de los borrados que EmbeddingIndex.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._hashes = {}  # mascota_id -> (tipo_reporte, hash)
+        self._tablas = [{} for _ in range(BLOQUES)]  # bloque -> {valor: {ids}}
+        self._cargado = False
+        self._ultima_modificacion = None
+        self._ultima_sync = 0.0
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def _filas(self, queryset):
+        return (
+            queryset
+            .values_list("id", "tipo_reporte", "phash", "modificado")
+            .iterator(chunk_size=5000)
+        )
+
+    def _aplicar(self, filas):
+        """Aplica las filas y devuelve los tipo_reporte cuyos hashes cambiaron"""
+        cambiados = set()
+        for mascota_id, tipo, phash, modificado in filas:
+            anterior = self._hashes.get(mascota_id)
+            if phash is None:
+                self._remove(mascota_id)
+            else:
+                self._upsert(mascota_id, tipo, de_columna(phash))
+            actual = self._hashes.get(mascota_id)
+            if actual != anterior:
+                cambiados.update(par[0] for par in (anterior, actual) if par is not None)
+            if self._ultima_modificacion is None or modificado > self._ultima_modificacion:
+                self._ultima_modificacion = modificado
+        return cambiados
+
+    def ensure_loaded(self):
+        if self._cargado:
+            return
+        from .models import Mascota
+
+        with self._lock:
+            if self._cargado:
+                return
+            inicio = time.perf_counter()
+            self._aplicar(self._filas(Mascota.objects.all()))
+            self._cargado = True
+            self._ultima_sync = time.monotonic()
+            print(f"Índice de phash cargado: {len(self._hashes)} en {time.perf_counter() - inicio:.2f}s")
+
+    def sync(self):
+        """
+        Aplica los hashes modificados en otros procesos y quita los de
+        mascotas borradas. Los /match en caché de una partición que cambió
+        aquí se calcularon sin esos hashes (los duplicados no esperan al
+        embedding): se invalida la partición al verlos.
+        """
+        intervalo = getattr(settings, "MASCOTAS_INDEX_SYNC_SEGUNDOS", 5)
+        if time.monotonic() - self._ultima_sync < intervalo:
+            return
+        from .models import Mascota
+
+        with self._lock:
+            queryset = Mascota.objects.all()
+            if self._ultima_modificacion is not None:
+                queryset = queryset.filter(modificado__gte=self._ultima_modificacion)
+            cambiados = self._aplicar(self._filas(queryset))
+            cambiados |= self._reparar()
+            self._ultima_sync = time.monotonic()
+        for tipo in cambiados:
+            cache.invalidar_particion(tipo)
+
+    def _reparar(self):
+        """Quita los ids borrados en otros procesos (el delta por fecha no los ve)"""
+        from django.db.models import Count
+
+        from .models import Mascota
+
+        con_hash = Mascota.objects.filter(phash__isnull=False)
+        conteos = dict(con_hash.values_list("tipo_reporte").annotate(total=Count("id")).order_by())
+        locales = {}
+        for tipo, _ in self._hashes.values():
+            locales[tipo] = locales.get(tipo, 0) + 1
+        cambiados = set()
+        for tipo, total in locales.items():
+            if total == conteos.get(tipo, 0):
+                continue
+            ids = set(con_hash.filter(tipo_reporte=tipo).values_list("id", flat=True))
+            for mascota_id in [i for i, (t, _) in self._hashes.items() if t == tipo and i not in ids]:
+                self._remove(mascota_id)
+                cambiados.add(tipo)
+        return cambiados
+
+    def refresh(self):
+        self.ensure_loaded()
+        self.sync()
+
+    def _remove(self, mascota_id):
+        anterior = self._hashes.pop(mascota_id, None)
+        if anterior is None:
+            return
+        for tabla, valor in zip(self._tablas, _bloques(anterior[1])):
+            ids = tabla.get(valor)
+            if ids is not None:
+                ids.discard(mascota_id)
+                if not ids:
+                    del tabla[valor]
+
+    def _upsert(self, mascota_id, tipo, valor):
+        anterior = self._hashes.get(mascota_id)
+        if anterior is not None and anterior[1] == valor:
+            self._hashes[mascota_id] = (tipo, valor)
+            return
+        self._remove(mascota_id)
+        self._hashes[mascota_id] = (tipo, valor)
+        for tabla, bloque in zip(self._tablas, _bloques(valor)):
+            tabla.setdefault(bloque, set()).add(mascota_id)
+
+    def upsert(self, mascota_id, tipo, valor):
+        if not self._cargado:
+            return
+        with self._lock:
+            if valor is None:
+                self._remove(mascota_id)
+            else:
+                self._upsert(mascota_id, tipo, valor)
+
+    def remove(self, mascota_id):
+        if not self._cargado:
+            return
+        with self._lock:
+            self._remove(mascota_id)
+
+    def search(self, tipo, valor, distancia_max=None, exclude_id=None):
+        """[(mascota_id, distancia)] de `tipo` a distancia <= distancia_max, más cercanos primero"""
+        if distancia_max is None:
+            distancia_max = phash_config()["DISTANCIA_MAX"]
+        distancia_max = min(distancia_max, DISTANCIA_LIMITE)
+        self.refresh()
+        mascaras = _mascaras(distancia_max // BLOQUES)
+        encontrados = {}
+        vistos = set()
+        with self._lock:
+            for tabla, bloque in zip(self._tablas, _bloques(valor)):
+                for mascara in mascaras:
+                    for mascota_id in tabla.get(bloque ^ mascara, ()):
+                        if mascota_id in vistos or mascota_id == exclude_id:
+                            continue
+                        vistos.add(mascota_id)
+                        otro_tipo, otro = self._hashes[mascota_id]
+                        distancia = hamming(valor, otro)
+                        if otro_tipo == tipo and distancia <= distancia_max:
+                            encontrados[mascota_id] = distancia
+        return sorted(encontrados.items(), key=lambda par: (par[1], par[0]))
+
+
+_indice = IndicePHash()
+
+
+def get_indice_phash():
+    return _indice
@@ -1,6 +1,6 @@
 from ninja import Schema
 from typing import Optional
-from datetime import date
+from datetime import date, datetime
 
 class MascotaCreateSchema(Schema):
     """Schema para crear mascota (solo para documentación)"""
@@ -9,6 +9,8 @@ class MascotaCreateSchema(Schema):
     dia: date  # Formato: YYYY-MM-DD
     tipo_reporte: str
     descripcion: Optional[str] = None
+    latitud: Optional[float] = None
+    longitud: Optional[float] = None
 
 class MascotaOutSchema(Schema):
     """Schema de respuesta de mascota"""
@@ -20,10 +22,19 @@ class MascotaOutSchema(Schema):
     tipo_reporte: str
     descripcion: Optional[str] = None
     imagen: Optional[str] = None
+    imagen_miniatura: Optional[str] = None
+    imagen_media: Optional[str] = None
+    imagen_ancho: Optional[int] = None
+    imagen_alto: Optional[int] = None
+    embedding_status: Optional[str] = None
+    creado: Optional[datetime] = None
+    latitud: Optional[float] = None
+    longitud: Optional[float] = None
 
 class MascotaListSchema(Schema):
     """Schema para listar mascotas"""
     mascotas: list[MascotaOutSchema]
+    siguiente: Optional[str] = None
 
 class MascotaUpdateSchema(Schema):
     """Schema para actualizar mascota (solo para documentación)"""
@@ -31,4 +42,6 @@ class MascotaUpdateSchema(Schema):
     raza: Optional[str] = None
     dia: Optional[date] = None
     descripcion: Optional[str] = None
-    tipo_reporte: Optional[str] = None
\ No newline at end of file
+    tipo_reporte: Optional[str] = None
+    latitud: Optional[float] = None
+    longitud: Optional[float] = None
\ No newline at end of file
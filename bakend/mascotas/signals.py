@@ -0,0 +1,61 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from . import cache
+from .index import get_index
+from .models import Mascota, MascotaEmbedding
+from .phash import de_columna, get_indice_phash
+
+# Embeddings al día tras procesar un lote fuera de las peticiones web (worker
+# de la cola, embed_mascotas). Argumento: mascotas. Lo usa mash para los
+# pares precalculados, que necesitan el índice vectorial.
+embedding_procesado = Signal()
+
+
+@receiver(post_save, sender=MascotaEmbedding)
+def indexar_embedding(sender, instance, **kwargs):
+    from .embeddings import MODEL_VERSION
+
+    tipo = instance.mascota.tipo_reporte
+    cache.invalidar_particion(tipo)
+    cache.invalidar_mascota(instance.mascota_id)
+    if instance.modelo_version != MODEL_VERSION:
+        get_index().remove(instance.mascota_id)
+        return
+    get_index().upsert(instance.mascota_id, tipo, instance.as_array())
+
+
+@receiver(post_delete, sender=MascotaEmbedding)
+def desindexar_embedding(sender, instance, **kwargs):
+    get_index().remove(instance.mascota_id)
+
+
+@receiver(pre_save, sender=Mascota)
+def recordar_tipo_anterior(sender, instance, **kwargs):
+    if instance.pk:
+        instance._tipo_anterior = (
+            Mascota.objects.filter(pk=instance.pk).values_list("tipo_reporte", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Mascota)
+def mover_mascota(sender, instance, created, **kwargs):
+    # Primero los índices: un /match que corra entre medio no debe quedar en
+    # caché con la versión nueva y sin el hash nuevo
+    if not created:
+        get_index().move(instance.id, instance.tipo_reporte)
+    phash = de_columna(instance.phash) if instance.phash is not None else None
+    get_indice_phash().upsert(instance.id, instance.tipo_reporte, phash)
+    cache.invalidar_particion(instance.tipo_reporte)
+    cache.invalidar_mascota(instance.id)
+    tipo_anterior = getattr(instance, "_tipo_anterior", None)
+    if tipo_anterior and tipo_anterior != instance.tipo_reporte:
+        cache.invalidar_particion(tipo_anterior)
+
+
+@receiver(post_delete, sender=Mascota)
+def desindexar_mascota(sender, instance, **kwargs):
+    cache.invalidar_particion(instance.tipo_reporte)
+    cache.invalidar_mascota(instance.id)
+    get_index().remove(instance.id)
+    get_indice_phash().remove(instance.id)
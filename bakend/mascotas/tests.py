@@ -1,3 +1,484 @@
-from django.test import TestCase
+import importlib.util
+import io
+import math
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from mash.models import MatchCandidate
+from usuarios.models import User
+
+from .ann import ParticionIVF, ann_config, crear_particion
+from .embeddings import MODEL_VERSION
+from .extractores import KerasExtractor, create_extractor, model_version
+from .geo import (
+    RADIO_TIERRA_KM, celdas_radio, encode, filtrar_radio, haversine_km, precision_para, tamano_celda,
+)
+from .index import EmbeddingIndex, normalize
+from .jobs import procesar_trabajos, tomar_trabajos
+from .models import EmbeddingJob, Mascota, MascotaEmbedding
+from .phash import BITS_BLOQUE, IndicePHash, a_columna, phash_config
+from .views import calcular_match
+
+
+def _tensorflow():
+    """TensorFlow con TFLite, o None si no está instalado"""
+    try:
+        import tensorflow as tf
+    except ImportError:
+        return None
+    return tf if hasattr(tf, "lite") else None
+
+
+def _exportar_tflite(tf, modelo, ruta, cuantizacion="none"):
+    converter = tf.lite.TFLiteConverter.from_keras_model(modelo)
+    if cuantizacion == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    with open(ruta, "wb") as f:
+        f.write(converter.convert())
+
+
+@unittest.skipUnless(_tensorflow(), "requiere tensorflow")
+class ParidadExtractoresTests(SimpleTestCase):
+    """
+    Misma verificación que `manage.py comparar_extractores`, sobre lotes
+    sintéticos: el modelo exportado debe dar los mismos vectores que Keras
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tf = _tensorflow()
+        cls.keras = KerasExtractor()
+        cls.directorio = tempfile.TemporaryDirectory()
+        cls.lote = np.random.default_rng(0).uniform(-1, 1, (8, 224, 224, 3)).astype(np.float32)
+        cls.referencia = normalize(cls.keras.predict(cls.lote))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directorio.cleanup()
+        super().tearDownClass()
+
+    def _ruta(self, nombre):
+        return os.path.join(self.directorio.name, nombre)
+
+    def test_tflite_sin_cuantizar_coincide_con_keras(self):
+        ruta = self._ruta("mobilenet_v2.tflite")
+        _exportar_tflite(self.tf, self.keras.model, ruta)
+        extractor = create_extractor("tflite", model_path=ruta, quantization="none")
+        cosenos = np.sum(self.referencia * normalize(extractor.predict(self.lote)), axis=1)
+        self.assertGreaterEqual(cosenos.min(), 0.999)
+        self.assertEqual(extractor.cuantizacion, "none")
+
+    def test_tflite_float16_coincide_con_keras(self):
+        ruta = self._ruta("mobilenet_v2-float16.tflite")
+        _exportar_tflite(self.tf, self.keras.model, ruta, "float16")
+        extractor = create_extractor("tflite", model_path=ruta, quantization="float16")
+        cosenos = np.sum(self.referencia * normalize(extractor.predict(self.lote)), axis=1)
+        self.assertGreaterEqual(cosenos.min(), 0.99)
+
+    def test_cuantizacion_distinta_a_la_configurada(self):
+        ruta = self._ruta("otro.tflite")
+        _exportar_tflite(self.tf, self.keras.model, ruta, "float16")
+        with self.assertRaises(ImproperlyConfigured):
+            create_extractor("tflite", model_path=ruta, quantization="none")
+
+    def test_lotes_de_tamano_variable(self):
+        ruta = self._ruta("variable.tflite")
+        _exportar_tflite(self.tf, self.keras.model, ruta)
+        extractor = create_extractor("tflite", model_path=ruta, quantization="none")
+        completo = extractor.predict(self.lote)
+        partes = np.concatenate([extractor.predict(self.lote[:3]), extractor.predict(self.lote[3:])])
+        np.testing.assert_allclose(completo, partes, atol=1e-4)
+
+
+def _vectores_agrupados(n=2000, dim=64, grupos=20, semilla=0):
+    """Datos y consultas normalizados con estructura de grupos, como los embeddings reales"""
+    rng = np.random.default_rng(semilla)
+    centros = normalize(rng.normal(size=(grupos, dim)))
+    datos = normalize(centros[rng.integers(0, grupos, n)] + 0.15 * rng.normal(size=(n, dim)))
+    consultas = normalize(datos[rng.choice(n, 50, replace=False)] + 0.05 * rng.normal(size=(50, dim)))
+    return datos, consultas
+
+
+class ParticionesAnnTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.datos, cls.consultas = _vectores_agrupados()
+        cls.exacta = cls._llenar(crear_particion("exact"))
+
+    @classmethod
+    def _llenar(cls, particion):
+        for mascota_id, vector in enumerate(cls.datos):
+            particion.upsert(mascota_id, vector)
+        return particion
+
+    def _recall(self, particion, top_k=10):
+        aciertos = 0
+        for consulta in self.consultas:
+            exactos = {i for i, _ in self.exacta.search(consulta, top_k, -1)}
+            aciertos += len(exactos & {i for i, _ in particion.search(consulta, top_k, -1)})
+        return aciertos / (top_k * len(self.consultas))
+
+    def test_exacta_remove_mueve_la_ultima_fila(self):
+        particion = crear_particion("exact")
+        for mascota_id in range(3):
+            particion.upsert(mascota_id, self.datos[mascota_id])
+        particion.remove(0)
+        self.assertEqual(len(particion), 2)
+        np.testing.assert_array_equal(particion.vector(2), self.datos[2])
+        self.assertEqual(particion.search(self.datos[2], 1, 0.5)[0][0], 2)
+        self.assertEqual(particion.search(self.datos[2], 3, -1, exclude_id=2)[0][0], 1)
+
+    def test_recall_ivf(self):
+        ivf = self._llenar(crear_particion("ivf", IVF_MIN_ENTRENAMIENTO=500))
+        self.assertIsNotNone(ivf.centroides)
+        self.assertGreaterEqual(self._recall(ivf), 0.9)
+
+    @unittest.skipUnless(importlib.util.find_spec("faiss"), "requiere faiss-cpu")
+    def test_recall_hnsw(self):
+        hnsw = self._llenar(crear_particion("hnsw"))
+        self.assertGreaterEqual(self._recall(hnsw), 0.95)
+        # Los borrados marcados no vuelven en los resultados
+        for mascota_id in range(0, 2000, 2):
+            hnsw.remove(mascota_id)
+        resultados = hnsw.search(self.datos[0], 10, -1)
+        self.assertEqual(len(resultados), 10)
+        self.assertTrue(all(mascota_id % 2 for mascota_id, _ in resultados))
+
+    def test_reentrenamiento_ivf_en_fondo(self):
+        lock = threading.RLock()
+        ivf = ParticionIVF(lock=lock, **ann_config(IVF_MIN_ENTRENAMIENTO=500))
+        # Altas y bajas mientras el hilo entrena sobre la matriz viva
+        for mascota_id, vector in enumerate(self.datos[:800]):
+            with lock:
+                ivf.upsert(mascota_id, vector)
+        for mascota_id in range(0, 100, 3):
+            with lock:
+                ivf.remove(mascota_id)
+        limite = time.monotonic() + 30
+        while (ivf._entrenando or ivf.centroides is None) and time.monotonic() < limite:
+            time.sleep(0.01)
+        self.assertFalse(ivf._entrenando)
+        self.assertIsNotNone(ivf.centroides)
+        # Cada fila quedó en la lista de su centroide más cercano
+        np.testing.assert_array_equal(ivf.asignacion[:ivf.n], ivf._asignar(ivf.matriz[:ivf.n]))
+        self.assertEqual(ivf.search(self.datos[500], 1, 0.5)[0][0], 500)
+
+
+class ModelVersionTests(SimpleTestCase):
+
+    def test_keras(self):
+        with override_settings(MASCOTAS_EMBEDDING={"BACKEND": "keras"}):
+            self.assertEqual(model_version(), "mobilenet_v2-imagenet-avg-224-prep2")
+
+    def test_exportado_incluye_backend_y_cuantizacion(self):
+        with override_settings(MASCOTAS_EMBEDDING={"BACKEND": "tflite", "QUANTIZATION": "int8"}):
+            self.assertEqual(model_version(), "mobilenet_v2-imagenet-avg-224-prep2+tflite-int8")
+
+    def test_modelo_inexistente(self):
+        with override_settings(MASCOTAS_EMBEDDING={"BACKEND": "tflite", "MODEL_PATH": "/no/existe.tflite"}):
+            with self.assertRaises(ImproperlyConfigured):
+                create_extractor()
+
+
+@override_settings(MASCOTAS_INDEX_SYNC_SEGUNDOS=3600)
+class EmbeddingIndexTests(TestCase):
+    """
+    Un EmbeddingIndex propio hace de "otro proceso": las señales de los
+    cambios hechos aquí actualizan el índice global, no este
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create(username="u1", email="u1@x.com", password="x")
+        cls.vectores = np.eye(4, 8, dtype=np.float32)
+        cls.ids = []
+        for i, tipo in enumerate(["Pérdida", "Pérdida", "Encontrada", "Encontrada"]):
+            mascota = Mascota.objects.create(nombre=f"m{i}", raza="Criollo", tipo_reporte=tipo, propietario=cls.usuario)
+            registro = MascotaEmbedding(mascota=mascota, modelo_version=MODEL_VERSION, checksum=f"{i:064d}")
+            registro.set_array(cls.vectores[i])
+            registro.save()
+            cls.ids.append(mascota.id)
+
+    def setUp(self):
+        self.indice = EmbeddingIndex()
+        self.indice.refresh()
+
+    def _ids(self, tipo, i):
+        return [mascota_id for mascota_id, _ in self.indice.search(tipo, self.vectores[i], threshold=0.5)]
+
+    def test_carga_por_particion(self):
+        self.assertEqual({t: len(p) for t, p in self.indice.particiones.items()}, {"Pérdida": 2, "Encontrada": 2})
+        resultado = self.indice.search("Pérdida", self.vectores[1] * 3)
+        self.assertEqual(resultado[0][0], self.ids[1])
+        self.assertAlmostEqual(resultado[0][1], 1.0, places=5)
+
+    def test_upsert_y_remove(self):
+        self.indice.remove(self.ids[0])
+        self.assertEqual(self._ids("Pérdida", 0), [])
+        self.indice.upsert(self.ids[0], "Pérdida", self.vectores[0])
+        self.assertEqual(self._ids("Pérdida", 0), [self.ids[0]])
+        # Un upsert con otro tipo saca el id de la partición anterior
+        self.indice.upsert(self.ids[0], "Encontrada", self.vectores[0])
+        self.assertEqual(self._ids("Pérdida", 0), [])
+        self.assertEqual(self._ids("Encontrada", 0), [self.ids[0]])
+
+    def test_mover_de_particion(self):
+        self.indice.move(self.ids[1], "Encontrada")
+        self.assertNotIn(self.ids[1], self.indice.particiones["Pérdida"])
+        self.assertEqual(self._ids("Encontrada", 1), [self.ids[1]])
+
+    @override_settings(MASCOTAS_INDEX_SYNC_SEGUNDOS=0)
+    def test_reparar_borrado_de_otro_proceso(self):
+        Mascota.objects.filter(pk=self.ids[0]).delete()
+        self.indice.sync()
+        self.assertNotIn(self.ids[0], self.indice.particiones["Pérdida"])
+        self.assertEqual(len(self.indice.particiones["Pérdida"]), 1)
+
+    @override_settings(MASCOTAS_INDEX_SYNC_SEGUNDOS=0)
+    def test_reparar_cambio_de_tipo_de_otro_proceso(self):
+        # update() no toca MascotaEmbedding.modificado: solo el conteo lo delata
+        Mascota.objects.filter(pk=self.ids[1]).update(tipo_reporte="Encontrada")
+        self.indice.sync()
+        self.assertEqual(self._ids("Pérdida", 1), [])
+        self.assertEqual(self._ids("Encontrada", 1), [self.ids[1]])
+
+
+def _mascara(*bits_por_bloque):
+    """XOR que cambia los primeros bits de cada bloque de 16"""
+    return sum(((1 << bits) - 1) << (i * BITS_BLOQUE) for i, bits in enumerate(bits_por_bloque))
+
+
+@override_settings(MASCOTAS_INDEX_SYNC_SEGUNDOS=3600)
+class IndicePHashTests(TestCase):
+    """Como EmbeddingIndexTests: un IndicePHash propio hace de otro proceso"""
+
+    # Bit alto encendido: en la columna queda negativo
+    BASE = 0xF0E1_D2C3_B4A5_9687
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = User.objects.create(username="u1", email="u1@x.com", password="x")
+        distancia = phash_config()["DISTANCIA_MAX"]
+        # Distancia máxima repartida de varias formas entre los bloques, y una más
+        cls.mascaras = {
+            "mismo": 0,
+            "repartida": _mascara(2, 2, 1, 1),
+            "un_bloque": _mascara(distancia),
+            "tres_bloques": _mascara(2, 2, 2),
+            "lejana": _mascara(2, 2, 2, 1),
+        }
+        cls.ids = {}
+        for nombre, mascara in cls.mascaras.items():
+            mascota = Mascota.objects.create(
+                nombre=nombre, raza="Criollo", tipo_reporte="Encontrada", propietario=usuario,
+                phash=a_columna(cls.BASE ^ mascara),
+            )
+            cls.ids[nombre] = mascota.id
+        cls.otra_particion = Mascota.objects.create(
+            nombre="otra", raza="Criollo", tipo_reporte="Pérdida", propietario=usuario, phash=a_columna(cls.BASE),
+        ).id
+
+    def setUp(self):
+        self.indice = IndicePHash()
+        self.indice.refresh()
+
+    def test_busqueda_hasta_distancia_max(self):
+        distancia = phash_config()["DISTANCIA_MAX"]
+        self.assertEqual(self.mascaras["lejana"].bit_count(), distancia + 1)
+        resultado = dict(self.indice.search("Encontrada", self.BASE))
+        self.assertEqual(resultado, {
+            self.ids["mismo"]: 0,
+            self.ids["repartida"]: distancia,
+            self.ids["un_bloque"]: distancia,
+            self.ids["tres_bloques"]: distancia,
+        })
+        self.assertNotIn(self.otra_particion, resultado)
+        self.assertIn(self.ids["lejana"], dict(self.indice.search("Encontrada", self.BASE, distancia + 1)))
+
+    def test_excluir_la_propia(self):
+        resultado = self.indice.search("Encontrada", self.BASE, exclude_id=self.ids["mismo"])
+        self.assertNotIn(self.ids["mismo"], dict(resultado))
+
+    @override_settings(MASCOTAS_INDEX_SYNC_SEGUNDOS=0)
+    def test_reparar_borrado_de_otro_proceso(self):
+        Mascota.objects.filter(pk=self.ids["repartida"]).delete()
+        self.assertNotIn(self.ids["repartida"], dict(self.indice.search("Encontrada", self.BASE)))
+        self.assertEqual(len(self.indice), len(self.mascaras))
+
+
+class ModeloQueFalla:
+    nombre = "falla"
+
+    def predict(self, lote):
+        raise RuntimeError("servidor de embeddings caído")
+
+
+class ColaEmbeddingsTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media.name))
+        os.makedirs(os.path.join(self.media.name, "mascotas"))
+        Image.new("RGB", (64, 64), "orange").save(os.path.join(self.media.name, "mascotas", "a.jpg"))
+        usuario = User.objects.create(username="u1", email="u1@x.com", password="x")
+        self.mascota = Mascota.objects.create(
+            nombre="Lúa", raza="Criollo", tipo_reporte="Pérdida", propietario=usuario, imagen="mascotas/a.jpg"
+        )
+        EmbeddingJob.objects.create(mascota=self.mascota)
+        self.enterContext(mock.patch("mascotas.embeddings.get_model", return_value=ModeloQueFalla()))
+
+    def _assert_reprogramado(self):
+        trabajo = EmbeddingJob.objects.get(mascota=self.mascota)
+        self.assertEqual(trabajo.estado, EmbeddingJob.PENDIENTE)
+        self.assertEqual(trabajo.intentos, 1)
+        self.assertIn("servidor de embeddings caído", trabajo.error)
+        self.assertGreater(trabajo.disponible_en, timezone.now())
+
+    def test_falla_de_predict_reprograma_el_lote(self):
+        self.assertEqual(procesar_trabajos(tomar_trabajos(10)), (0, 1, 0))
+        self._assert_reprogramado()
+
+    def test_el_worker_sigue_tras_una_falla(self):
+        call_command("run_embedding_worker", "--una-vez", "--espera", "0", stdout=io.StringIO())
+        self._assert_reprogramado()
+
+
+@override_settings(MASCOTAS_INDEX_SYNC_SEGUNDOS=3600)
+class CacheMatchTests(TestCase):
+    """Los /match en caché caen solo cuando cambia la partición opuesta (o la propia mascota)"""
+
+    def setUp(self):
+        caches["matches"].clear()
+        self.usuario = User.objects.create(username="u1", email="u1@x.com", password="x")
+        self.perdida = self._mascota("Lúa", "Pérdida", [1, 0, 0, 0])
+        self.encontrada = self._mascota("Toby", "Encontrada", [0.9, 0.1, 0, 0])
+        self._par(self.encontrada, 0.9)
+
+    def _mascota(self, nombre, tipo, vector):
+        mascota = Mascota.objects.create(
+            nombre=nombre, raza="Criollo", tipo_reporte=tipo, propietario=self.usuario, imagen=f"mascotas/{nombre}.jpg"
+        )
+        self._embedding(mascota, vector)
+        return mascota
+
+    def _embedding(self, mascota, vector):
+        registro = MascotaEmbedding.objects.filter(mascota=mascota).first() or MascotaEmbedding(mascota=mascota)
+        registro.set_array(normalize(vector))
+        registro.modelo_version = MODEL_VERSION
+        registro.checksum = f"{mascota.id:064d}"
+        registro.save()
+
+    def _par(self, encontrada, score):
+        MatchCandidate.objects.create(perdida=self.perdida, encontrada=encontrada, score=score, modelo_version=MODEL_VERSION)
+
+    def _par_score(self, encontrada, score):
+        MatchCandidate.objects.filter(perdida=self.perdida, encontrada=encontrada).update(score=score)
+
+    def _match(self):
+        return [m["id"] for m in calcular_match(self.perdida.id, 20, 0.5, None, False)["matches"]]
+
+    def test_cambios_en_la_propia_particion_no_invalidan(self):
+        self.assertEqual(self._match(), [self.encontrada.id])
+        self._mascota("Nala", "Pérdida", [0, 1, 0, 0])
+        MatchCandidate.objects.all().delete()
+        # Sigue en caché: los pares borrados a mano no mueven ninguna versión
+        self.assertEqual(self._match(), [self.encontrada.id])
+
+    def test_embedding_nuevo_en_la_particion_opuesta(self):
+        self.assertEqual(self._match(), [self.encontrada.id])
+        otra = Mascota.objects.create(
+            nombre="Kira", raza="Criollo", tipo_reporte="Encontrada", propietario=self.usuario, imagen="mascotas/k.jpg"
+        )
+        self._par(otra, 0.95)
+        # Alta en la partición opuesta: su versión cambió
+        self.assertEqual(self._match(), [otra.id, self.encontrada.id])
+        # Los pares cambian sin tocar versiones; el embedding guardado sí
+        self._par_score(otra, 0.6)
+        self._embedding(otra, [0.6, 0.8, 0, 0])
+        self.assertEqual(self._match(), [self.encontrada.id, otra.id])
+
+    def test_borrado_en_la_particion_opuesta(self):
+        self.assertEqual(self._match(), [self.encontrada.id])
+        self.encontrada.delete()
+        self.assertEqual(self._match(), [])
+
+
+def _destino(latitud, longitud, km, rumbo):
+    """Punto a `km` del origen con rumbo en grados (fórmula de gran círculo)"""
+    lat1, lon1, rumbo = map(math.radians, (latitud, longitud, rumbo))
+    angulo = km / RADIO_TIERRA_KM
+    lat2 = math.asin(math.sin(lat1) * math.cos(angulo) + math.cos(lat1) * math.sin(angulo) * math.cos(rumbo))
+    lon2 = lon1 + math.atan2(
+        math.sin(rumbo) * math.sin(angulo) * math.cos(lat1), math.cos(angulo) - math.sin(lat1) * math.sin(lat2)
+    )
+    return math.degrees(lat2), (math.degrees(lon2) + 540) % 360 - 180
+
+
+class GeohashTests(SimpleTestCase):
+
+    def test_encode(self):
+        self.assertEqual(encode(42.605, -5.603, 5), "ezs42")
+
+    def test_circulo_cubierto_por_las_celdas(self):
+        # Todo punto dentro del radio cae en alguna de las celdas, también
+        # con el centro pegado a un borde, cerca de un polo o del antimeridiano
+        rng = np.random.default_rng(0)
+        centros = [(-34.6, -58.40332), (0.0, 0.0), (64.1, -21.9), (-45.0, 179.999)]
+        centros += [(rng.uniform(-70, 70), rng.uniform(-180, 180)) for _ in range(40)]
+        for latitud, longitud in centros:
+            for radio in (0.5, 2, 25, 300):
+                celdas = celdas_radio(latitud, longitud, radio)
+                for _ in range(50):
+                    punto = _destino(latitud, longitud, radio * rng.uniform(0, 1), rng.uniform(0, 360))
+                    self.assertTrue(
+                        encode(*punto).startswith(tuple(celdas)),
+                        f"{punto} a menos de {radio} km de {(latitud, longitud)} fuera de {celdas}",
+                    )
+
+
+class RadioTests(TestCase):
+    """filtrar_radio con el centro justo al oeste de un borde de celda"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.radio = 2
+        latitud = -34.6
+        _, ancho = tamano_celda(precision_para(cls.radio, latitud))
+        borde = math.floor((-58.4 + 180) / ancho) * ancho - 180
+        cls.centro = (latitud, borde - 0.0001)
+        usuario = User.objects.create(username="u1", email="u1@x.com", password="x")
+        cls.ids = {}
+        for nombre, km, rumbo in (("cerca_cruzando", 1.9, 90), ("cerca_oeste", 1.0, 270), ("lejos_cruzando", 2.2, 90),
+                                  ("esquina", 1.9, 45), ("lejos", 50, 0)):
+            lat, lon = _destino(*cls.centro, km, rumbo)
+            cls.ids[nombre] = Mascota.objects.create(
+                nombre=nombre, raza="Criollo", tipo_reporte="Encontrada", propietario=usuario, latitud=lat, longitud=lon
+            ).id
+
+    def test_borde_de_celda(self):
+        self.assertNotEqual(
+            Mascota.objects.get(pk=self.ids["cerca_cruzando"]).geohash[:5], encode(*self.centro)[:5]
+        )
+        filas = filtrar_radio(Mascota.objects.all(), *self.centro, self.radio)
+        distancias = dict(filas.values_list("id", "distancia_km"))
+        self.assertEqual(set(distancias), {self.ids["cerca_cruzando"], self.ids["cerca_oeste"], self.ids["esquina"]})
+        for mascota_id, distancia in distancias.items():
+            mascota = Mascota.objects.get(pk=mascota_id)
+            self.assertAlmostEqual(distancia, haversine_km(*self.centro, mascota.latitud, mascota.longitud), places=3)
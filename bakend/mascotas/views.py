@@ -1,20 +1,156 @@
 from ninja import Router, File, Form
 from ninja.files import UploadedFile
-from django.shortcuts import get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, get_object_or_404
 from .schemas import *
-from .models import Mascota
+from .models import EmbeddingJob, Mascota, MascotaEmbedding
 from ninja.errors import HttpError
 from django.db import IntegrityError, transaction
-from datetime import datetime
+from datetime import date, datetime
 from .embeddings import *
+from . import cache as match_cache
+from mash.models import MatchCandidate
+from mash import prefiltros
+from mash.candidatos import candidatas, en_radio, puntuar_candidatas
+from .geo import RADIO_MAXIMO_KM, filtrar_radio, haversine_km, validar_coordenadas
+from .jobs import encolar_embedding
+from .phash import de_columna, get_indice_phash
+from .signals import embedding_procesado
+from django.conf import settings
+from django.http import HttpResponse
+from api.condicional import avalidadores_coleccion, validadores_objeto
+from api.ejecutor import ejecutar, ejecutar_ingesta, get_ejecutor
+from api.paginacion import apaginar
+from api.imagenes import procesar_subida
+from usuarios.auth import AsyncJWTAuth
+from django.utils import timezone
+import time
 import traceback
 
 mascotas = Router()
 
-@mascotas.get("/lista", response=MascotaListSchema, tags=["Mascotas"])
-def listar_mascotas(request):
-    mascotas_list = Mascota.objects.all()
-    return {"mascotas": mascotas_list}
+
+def programar_embedding(mascota, inferir=generate_embedding):
+    """
+    Encola el embedding para el worker, o lo genera en línea si la cola
+    está desactivada (MASCOTAS_EMBEDDING_ASINCRONO = False)
+    """
+    # Imagen ya vista (mismo SHA-256): el embedding se copia sin inferencia;
+    # los pares de mash (que necesitan el índice) los calcula el worker
+    if reutilizar_embedding(mascota) is not None:
+        if settings.MASCOTAS_EMBEDDING_ASINCRONO:
+            encolar_embedding(mascota, marcar_pendiente=False)
+        else:
+            embedding_procesado.send(sender=Mascota, mascotas=[mascota])
+        return
+    if settings.MASCOTAS_EMBEDDING_ASINCRONO:
+        encolar_embedding(mascota)
+        return
+    try:
+        store_embedding(mascota, inferir=inferir)
+    except Exception as e:
+        print(f"No se pudo generar el embedding de {mascota.id}: {str(e)}")
+        encolar_embedding(mascota)
+        return
+    embedding_procesado.send(sender=Mascota, mascotas=[mascota])
+
+
+def _inferir_en_ejecutor(image_path):
+    # Se llama desde el hilo de sync_to_async, que espera el resultado; si
+    # el ejecutor está saturado, programar_embedding encola el trabajo
+    return get_ejecutor().enviar(generate_embedding, image_path).result()
+
+
+async def aprogramar_embedding(mascota):
+    # Consultas y escrituras en el hilo de sync_to_async; solo la inferencia
+    # en línea (CPU) ocupa el ejecutor acotado
+    await sync_to_async(programar_embedding)(mascota, inferir=_inferir_en_ejecutor)
+
+@mascotas.get("/lista", response=MascotaListSchema, auth=AsyncJWTAuth(), tags=["Mascotas"])
+async def listar_mascotas(
+    request,
+    response: HttpResponse,
+    tipo_reporte: str = None,
+    raza: str = None,
+    dia_desde: date = None,
+    dia_hasta: date = None,
+    propietario: int = None,
+    latitud: float = None,
+    longitud: float = None,
+    radio_km: float = None,
+    cursor: str = None,
+    limite: int = None,
+):
+    mascotas_list = filtrar_mascotas(
+        Mascota.objects.all(),
+        tipo_reporte=tipo_reporte,
+        raza=raza,
+        dia_desde=dia_desde,
+        dia_hasta=dia_hasta,
+        propietario=propietario,
+    )
+    if radio_km is not None:
+        validar_radio(radio_km)
+        if latitud is None or longitud is None:
+            raise HttpError(400, "radio_km requiere latitud y longitud")
+        error = validar_coordenadas(latitud, longitud)
+        if error:
+            raise HttpError(400, error)
+        mascotas_list = filtrar_radio(mascotas_list, latitud, longitud, radio_km)
+    # Validador de toda la colección filtrada: si no cambió, 304 sin paginar
+    validadores = await avalidadores_coleccion(request, mascotas_list, "modificado")
+    no_modificado = validadores.no_modificado(request)
+    if no_modificado is not None:
+        return no_modificado
+    mascotas_list, siguiente = await apaginar(mascotas_list, "creado", cursor, limite)
+    validadores.aplicar(response)
+    return {"mascotas": mascotas_list, "siguiente": siguiente}
+
+
+@mascotas.get("/detalle/{mascota_id}", response=MascotaOutSchema, auth=AsyncJWTAuth(), tags=["Mascotas"])
+async def detalle_mascota(request, response: HttpResponse, mascota_id: int):
+    mascota = await aget_object_or_404(Mascota, id=mascota_id)
+    validadores = validadores_objeto(request, mascota.pk, mascota.modificado)
+    no_modificado = validadores.no_modificado(request)
+    if no_modificado is not None:
+        return no_modificado
+    validadores.aplicar(response)
+    return mascota
+
+
+def filtrar_mascotas(queryset, tipo_reporte=None, raza=None, dia_desde=None, dia_hasta=None, propietario=None):
+    """
+    Filtros de servidor para el listado; cada uno tiene índice en Mascota.Meta
+    """
+    if tipo_reporte:
+        queryset = queryset.filter(tipo_reporte=tipo_reporte)
+    if raza:
+        queryset = queryset.filter(raza__iexact=raza.strip())
+    if dia_desde:
+        queryset = queryset.filter(dia__gte=dia_desde)
+    if dia_hasta:
+        queryset = queryset.filter(dia__lte=dia_hasta)
+    if propietario:
+        queryset = queryset.filter(propietario_id=propietario)
+    return queryset
+
+
+def validar_radio(radio_km):
+    if not 0 < radio_km <= RADIO_MAXIMO_KM:
+        raise HttpError(400, f"radio_km debe estar entre 0 y {RADIO_MAXIMO_KM}")
+
+
+def leer_coordenadas(latitud, longitud):
+    """Coordenadas opcionales de un formulario; vacías cuentan como ausentes"""
+    try:
+        latitud = float(latitud) if latitud not in (None, "") else None
+        longitud = float(longitud) if longitud not in (None, "") else None
+    except ValueError:
+        raise HttpError(400, "Coordenadas inválidas")
+    error = validar_coordenadas(latitud, longitud)
+    if error:
+        raise HttpError(400, error)
+    return latitud, longitud
 
 
 from ninja import File
@@ -23,74 +159,116 @@ from ninja.files import UploadedFile
 @mascotas.post(
     "/crear",
     response=MascotaOutSchema,
+    auth=AsyncJWTAuth(),
     tags=["Mascotas"],
 )
-def crear_mascota(
+async def crear_mascota(
     request,
     nombre: str = Form(...),
     raza: str = Form(...),
     dia: str = Form(...),
     tipo_reporte: str = Form(...),
     descripcion: str = Form(""),
+    latitud: str = Form(None),
+    longitud: str = Form(None),
     imagen: UploadedFile = File(None),
 ):
     if not request.user.is_authenticated:
         raise HttpError(401, "Debes estar autenticado para crear una mascota")
 
+    latitud, longitud = leer_coordenadas(latitud, longitud)
+
     try:
         dia_limpia = dia.strip()
         dia_convertido = datetime.strptime(dia_limpia, "%Y-%m-%d").date()
     except ValueError:
         raise HttpError(400, f"Fecha inválida: {dia}")
 
-    mascota = Mascota.objects.create(
+    mascota = Mascota(
         nombre=nombre,
         raza=raza,
         dia=dia_convertido,
         tipo_reporte=tipo_reporte,
         descripcion=descripcion,
         propietario=request.user,
-        imagen=imagen,
+        latitud=latitud,
+        longitud=longitud,
     )
+    procesadas = None
+    if imagen is not None:
+        # Decodificar y reducir la imagen es CPU
+        procesadas = await ejecutar_ingesta(procesar_subida, imagen)
+    await sync_to_async(mascota.guardar_con_imagen)(procesadas)
+
+    await aprogramar_embedding(mascota)
 
     return mascota
 
 
 
 
-@mascotas.post("/actualizar/{mascota_id}", response=MascotaUpdateSchema, tags=["Mascotas"])
-def actualizar_mascota(request, mascota_id: int, data: MascotaUpdateSchema, imagen: UploadedFile = File(None)):
-    mascota = get_object_or_404(Mascota, id=mascota_id)
-    if mascota.propietario != request.user:
+@mascotas.post("/actualizar/{mascota_id}", response=MascotaUpdateSchema, auth=AsyncJWTAuth(), tags=["Mascotas"])
+async def actualizar_mascota(request, mascota_id: int, data: MascotaUpdateSchema, imagen: UploadedFile = File(None)):
+    mascota = await aget_object_or_404(Mascota, id=mascota_id)
+    if mascota.propietario_id != request.user.id:
         return {"detail": "No tienes permiso para actualizar esta mascota."}
+    tipo_anterior = mascota.tipo_reporte
+    geohash_anterior = mascota.geohash
     mascota.nombre = data.nombre
     mascota.raza = data.raza
     mascota.dia = data.dia
     mascota.descripcion = data.descripcion
     mascota.tipo_reporte = data.tipo_reporte
-    if data.imagen is not None:
-        if mascota.imagen:
-            mascota.imagen.delete(save=False)
-        mascota.imagen = imagen
-    mascota.save()
+    if {"latitud", "longitud"} & data.model_fields_set:
+        error = validar_coordenadas(data.latitud, data.longitud)
+        if error:
+            raise HttpError(400, error)
+        mascota.latitud = data.latitud
+        mascota.longitud = data.longitud
+    procesadas = await ejecutar_ingesta(procesar_subida, imagen) if imagen is not None else None
+    await sync_to_async(mascota.guardar_con_imagen)(procesadas)
+    if imagen is not None:
+        await aprogramar_embedding(mascota)
+    elif mascota.tipo_reporte != tipo_anterior or mascota.geohash != geohash_anterior:
+        # Para que los índices y cachés de otros procesos vean el cambio
+        await MascotaEmbedding.objects.filter(mascota=mascota).aupdate(modificado=timezone.now())
     return mascota
 
-@mascotas.delete("/eliminar/{mascota_id}", tags=["Mascotas"])
-def eliminar_mascota(request, mascota_id: int):
-    mascota = get_object_or_404(Mascota, id=mascota_id)
-    if mascota.propietario != request.user:
+@mascotas.delete("/eliminar/{mascota_id}", auth=AsyncJWTAuth(), tags=["Mascotas"])
+async def eliminar_mascota(request, mascota_id: int):
+    mascota = await aget_object_or_404(Mascota, id=mascota_id)
+    if mascota.propietario_id != request.user.id:
         return {"detail": "No tienes permiso para eliminar esta mascota."}
-    if mascota.imagen:
-        mascota.imagen.delete(save=False)
-    mascota.delete()
+    await sync_to_async(mascota.eliminar_con_imagenes)()
     return {"detail": f"Mascota con ID {mascota_id} eliminada exitosamente"}
 
 
-@mascotas.get("/match/{mascota_id}", tags=["Mascotas"])
-def match_mascota(request, mascota_id: int):
+@mascotas.get("/cache/estadisticas", tags=["Mascotas"])
+def estadisticas_cache(request):
+    return match_cache.estadisticas()
+
+
+@mascotas.get("/match/{mascota_id}", auth=AsyncJWTAuth(), tags=["Mascotas"])
+async def match_mascota(
+    request,
+    mascota_id: int,
+    top_k: int = 20,
+    threshold: float = 0.50,
+    radio_km: float = None,
+    debug: bool = False,
+):
+    if not 1 <= top_k <= 100:
+        raise HttpError(400, "top_k debe estar entre 1 y 100")
+    if radio_km is not None:
+        validar_radio(radio_km)
+    # Puntuar es CPU: en el ejecutor acotado (503 si está saturado)
+    return await ejecutar(calcular_match, mascota_id, top_k, threshold, radio_km, debug)
+
+
+def calcular_match(mascota_id, top_k, threshold, radio_km, debug):
     print("=" * 50)
     print(f"Buscando matches para mascota ID: {mascota_id}")
-    
+
     try:
         mascota = get_object_or_404(Mascota, id=mascota_id)
         print(f" Mascota encontrada: {mascota.nombre}")
@@ -101,19 +279,8 @@ def match_mascota(request, mascota_id: int):
         if not mascota.imagen:
             print("Error: La mascota no tiene imagen")
             raise HttpError(400, "La mascota no tiene imagen registrada")
-
-        # Verificar que el archivo existe
-        import os
-        imagen_path = mascota.imagen.path
-        print(f"Ruta de imagen: {imagen_path}")
-        
-        if not os.path.exists(imagen_path):
-            print(f"Error: Archivo no existe en {imagen_path}")
-            raise HttpError(400, "El archivo de imagen no existe en el servidor")
-        
-        print("Generando embedding de mascota base...")
-        mascota_emb = generate_embedding(imagen_path)
-        print(f"Embedding generado. Shape: {mascota_emb.shape}")
+        if radio_km is not None and not mascota.geohash:
+            raise HttpError(400, "La mascota no tiene ubicación registrada para filtrar por radio")
 
         # Determinar qué tipo de mascotas buscar (el opuesto)
         if mascota.tipo_reporte == "Pérdida":
@@ -125,49 +292,119 @@ def match_mascota(request, mascota_id: int):
         
         print(mensaje)
 
+        # Resultados en caché para la versión actual de la partición opuesta
+        match_cache.sincronizar()
+        clave = match_cache.clave_match(mascota.id, tipo_buscar, top_k, threshold, radio_km)
+        # Con debug se recalcula siempre para medir cada etapa
+        cacheado = None if debug else match_cache.obtener(clave)
+        if cacheado is not None:
+            print("Resultado servido desde caché")
+            return cacheado
+
+        mascota_base = {
+            "id": mascota.id,
+            "nombre": mascota.nombre,
+            "tipo_reporte": mascota.tipo_reporte
+        }
+
+        def resultado(otra, score, distancia=None):
+            if distancia is None and mascota.geohash and otra.geohash:
+                distancia = haversine_km(mascota.latitud, mascota.longitud, otra.latitud, otra.longitud)
+            return {
+                "id": otra.id,
+                "nombre": otra.nombre,
+                "raza": otra.raza,
+                "descripcion": otra.descripcion,
+                "imagen": otra.imagen.url if otra.imagen else None,
+                "imagen_miniatura": otra.imagen_miniatura.url if otra.imagen_miniatura else None,
+                "tipo_reporte": otra.tipo_reporte,
+                "similitud": round(score, 3),
+                "distancia_km": round(distancia, 2) if distancia is not None else None,
+            }
+
+        etapas = [] if debug else None
+        # Casi duplicados por hash perceptual: no dependen del embedding
+        duplicados = []
+        etapa_phash = None
+        if mascota.phash is not None:
+            inicio = time.perf_counter()
+            indice = get_indice_phash()
+            cercanos = indice.search(tipo_buscar, de_columna(mascota.phash), exclude_id=mascota.id)
+            otras = Mascota.objects.in_bulk([otra_id for otra_id, _ in cercanos])
+            for otra_id, distancia_hash in cercanos:
+                otra = otras.get(otra_id)
+                if otra is None or otra.tipo_reporte != tipo_buscar:
+                    continue
+                duplicado = resultado(otra, 1 - distancia_hash / 64)
+                if radio_km is not None and (duplicado["distancia_km"] is None or duplicado["distancia_km"] > radio_km):
+                    continue
+                duplicado["distancia_hash"] = distancia_hash
+                duplicados.append(duplicado)
+            etapa_phash = {
+                "etapa": "phash",
+                "entrada": len(indice),
+                "salida": len(duplicados),
+                "ms": round(1000 * (time.perf_counter() - inicio), 2),
+            }
+
+        # Embedding guardado de la mascota base; nunca se infiere aquí
+        registro = MascotaEmbedding.objects.filter(mascota=mascota, modelo_version=MODEL_VERSION).first()
+        if registro is None:
+            if (
+                mascota.embedding_status != Mascota.EMBEDDING_ERROR
+                and not EmbeddingJob.objects.filter(mascota=mascota).exists()
+            ):
+                encolar_embedding(mascota)
+            print(f"Embedding no disponible ({mascota.embedding_status})")
+            respuesta = {
+                "mascota_base": mascota_base,
+                "embedding_status": mascota.embedding_status,
+                "total_matches": 0,
+                "matches": [],
+                "duplicados": duplicados,
+            }
+            if etapas is not None:
+                respuesta["etapas"] = [e for e in (etapa_phash,) if e]
+            return respuesta
+
         resultados = []
-        otras_mascotas = Mascota.objects.filter(tipo_reporte=tipo_buscar).exclude(id=mascota_id)
-        print(f"Total de mascotas '{tipo_buscar}' a comparar: {otras_mascotas.count()}")
-
-        for otra in otras_mascotas:
-            if not otra.imagen:
-                print(f"Mascota {otra.nombre} (ID: {otra.id}) no tiene imagen, omitiendo...")
-                continue
-
-            otra_path = otra.imagen.path
-            print(f"Procesando: {otra.nombre} (ID: {otra.id}) - {otra_path}")
-            
-            if not os.path.exists(otra_path):
-                print(f"Archivo no existe: {otra_path}")
-                continue
-
-            try:
-                otra_emb = generate_embedding(otra_path)
-                similarity = float(cosine_similarity(mascota_emb, otra_emb))
-                print(f"  └─ Similitud: {similarity:.3f}")
-
-                if similarity >= 0.50:  # Umbral de similitud
-                    print(f"MATCH! Agregando a resultados")
-                    resultados.append({
-                        "id": otra.id,
-                        "nombre": otra.nombre,
-                        "raza": otra.raza,
-                        "descripcion": otra.descripcion,
-                        "imagen": otra.imagen.url,
-                        "tipo_reporte": otra.tipo_reporte,
-                        "similitud": round(similarity, 3)
-                    })
-                else:
-                    print(f"Similitud muy baja ({similarity:.3f} < 0.65)")
-                    
-            except Exception as e:
-                print(f"Error procesando {otra.nombre}: {str(e)}")
-                import traceback
-                print(traceback.format_exc())
-                continue
-
-        # Ordenar por similitud (mayor a menor)
-        resultados = sorted(resultados, key=lambda x: -x["similitud"])
+        if radio_km is not None:
+            # Poda por radio y prefiltros en SQL; solo lo que queda se puntúa
+            otras = candidatas(mascota)
+            cercanas = en_radio(mascota, otras, radio_km)
+            prefiltros.registrar_etapa(etapas, "radio", otras, cercanas)
+            otras = prefiltros.aplicar(mascota, cercanas, estadisticas=etapas)
+            inicio = time.perf_counter()
+            puntuadas = puntuar_candidatas(otras, registro.as_array(), top_k, threshold)
+            otras = Mascota.objects.in_bulk([otra_id for otra_id, _, _ in puntuadas])
+            for otra_id, score, distancia in puntuadas:
+                resultados.append(resultado(otras[otra_id], score, distancia))
+        else:
+            # Pares precalculados al ingresar los embeddings (app mash)
+            if mascota.tipo_reporte == "Pérdida":
+                candidatos = MatchCandidate.objects.filter(perdida=mascota).select_related("encontrada")
+                campo_otra = "encontrada"
+            else:
+                candidatos = MatchCandidate.objects.filter(encontrada=mascota).select_related("perdida")
+                campo_otra = "perdida"
+            candidatos = candidatos.filter(modelo_version=MODEL_VERSION)
+            candidatos = prefiltros.aplicar(mascota, candidatos, prefijo=f"{campo_otra}__", estadisticas=etapas)
+            inicio = time.perf_counter()
+            candidatos = candidatos.filter(score__gte=threshold).order_by("-score")[:top_k]
+            for candidato in candidatos:
+                resultados.append(resultado(getattr(candidato, campo_otra), candidato.score))
+        if etapas is not None:
+            # Aquí sí se mide la consulta evaluada: incluye las condiciones
+            # de todas las etapas anteriores más la puntuación
+            etapas.append({
+                "etapa": "puntuacion",
+                "entrada": etapas[-1]["salida"] if etapas else None,
+                "salida": len(resultados),
+                "ms": round(1000 * (time.perf_counter() - inicio), 2),
+            })
+            if etapa_phash:
+                etapas.append(etapa_phash)
+
         print(f"\n{'='*50}")
         print(f"Total de matches encontrados: {len(resultados)}")
         if resultados:
@@ -176,15 +413,18 @@ def match_mascota(request, mascota_id: int):
                 print(f"  {i}. {r['nombre']} - Similitud: {r['similitud']}")
         print("=" * 50)
 
-        return {
-            "mascota_base": {
-                "id": mascota.id,
-                "nombre": mascota.nombre,
-                "tipo_reporte": mascota.tipo_reporte
-            },
+        respuesta = {
+            "mascota_base": mascota_base,
+            "embedding_status": Mascota.EMBEDDING_LISTO,
             "total_matches": len(resultados),
-            "matches": resultados
+            "matches": resultados,
+            "duplicados": duplicados,
         }
+        if etapas is not None:
+            respuesta["etapas"] = etapas
+        else:
+            match_cache.guardar(clave, respuesta)
+        return respuesta
     
     except HttpError:
         raise
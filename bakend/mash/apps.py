@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MashConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mash'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,186 @@
+"""
+Mantenimiento incremental de la tabla MatchCandidate.
+
+La tabla guarda cada par pérdida/encontrada con similitud sobre
+MASCOTAS_CANDIDATOS_UMBRAL. La relación es simétrica: puntuar una mascota
+contra la partición opuesta encuentra los mismos pares que se ven desde el
+otro lado, así que la actualización incremental y `reconstruir` llegan a la
+misma tabla. MASCOTAS_CANDIDATOS_MAX solo acota cada búsqueda; si una
+mascota lo alcanza el umbral es demasiado bajo (reconstruir lo reporta).
+
+Las actualizaciones corren en el worker de la cola (señal
+embedding_procesado), nunca en una petición web: puntuar requiere el índice
+vectorial. Para cambios de modelo o de umbral: `manage.py reconstruir_candidatos`.
+
+Los pares se escriben después de guardar el embedding: un /match que corrió
+entre medio quedó en caché sin ellos, así que al escribirlos se invalidan
+las particiones de ambos lados del par.
+"""
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from mascotas import cache as match_cache
+from mascotas.geo import filtrar_radio
+from mascotas.index import get_index, normalize
+from mascotas.models import Mascota, MascotaEmbedding
+
+from .models import MatchCandidate
+
+
+def tipo_opuesto(tipo):
+    return "Encontrada" if tipo == "Pérdida" else "Pérdida"
+
+
+def _invalidar_matches(*tipos):
+    """Sube las versiones de las particiones al confirmar la transacción"""
+    def invalidar():
+        for tipo in tipos:
+            match_cache.invalidar_particion(tipo)
+    transaction.on_commit(invalidar)
+
+
+def _par(mascota, otra_id, score, modelo_version):
+    if mascota.tipo_reporte == "Pérdida":
+        return MatchCandidate(perdida_id=mascota.id, encontrada_id=otra_id, score=score, modelo_version=modelo_version)
+    return MatchCandidate(perdida_id=otra_id, encontrada_id=mascota.id, score=score, modelo_version=modelo_version)
+
+
+def puntuar(mascota, vector):
+    """Pares (otra_id, score) de la partición opuesta sobre el umbral"""
+    return get_index().search(
+        tipo_opuesto(mascota.tipo_reporte),
+        vector,
+        top_k=settings.MASCOTAS_CANDIDATOS_MAX,
+        threshold=settings.MASCOTAS_CANDIDATOS_UMBRAL,
+        exclude_id=mascota.id,
+    )
+
+
+def candidatas(mascota):
+    """Mascotas de la partición opuesta, sin filtrar"""
+    return Mascota.objects.filter(tipo_reporte=tipo_opuesto(mascota.tipo_reporte)).exclude(id=mascota.id)
+
+
+def en_radio(mascota, queryset, radio_km):
+    return filtrar_radio(queryset, mascota.latitud, mascota.longitud, radio_km)
+
+
+def puntuar_candidatas(queryset, vector, top_k, threshold):
+    """
+    Puntúa solo las mascotas del queryset (ya podado por radio y
+    prefiltros): el producto punto llega después de la poda, así el costo
+    depende del tamaño del subconjunto y no de la partición completa.
+    Retorna [(otra_id, score, distancia_km o None)] ordenado por score.
+    """
+    from mascotas.embeddings import MODEL_VERSION
+
+    if "distancia_km" in queryset.query.annotations:
+        distancias = dict(queryset.values_list("id", "distancia_km"))
+    else:
+        distancias = dict.fromkeys(queryset.values_list("id", flat=True))
+    if not distancias:
+        return []
+    registros = list(
+        MascotaEmbedding.objects
+        .filter(mascota_id__in=distancias, modelo_version=MODEL_VERSION)
+        .values_list("mascota_id", "vector")
+    )
+    if not registros:
+        return []
+    ids = np.fromiter((mascota_id for mascota_id, _ in registros), dtype=np.int64, count=len(registros))
+    matriz = normalize(np.stack([np.frombuffer(bytes(v), dtype=np.float32) for _, v in registros]))
+    scores = matriz @ normalize(vector)
+    orden = np.argsort(-scores)[:top_k]
+    return [
+        (int(ids[i]), float(scores[i]), distancias[int(ids[i])])
+        for i in orden
+        if scores[i] >= threshold
+    ]
+
+
+def _vigentes(otras_ids):
+    """Ids que siguen en la base: el índice puede tener borrados aún no sincronizados"""
+    return set(Mascota.objects.filter(id__in=otras_ids).values_list("id", flat=True))
+
+
+def eliminar_candidatos(mascota_id):
+    return MatchCandidate.objects.filter(Q(perdida_id=mascota_id) | Q(encontrada_id=mascota_id)).delete()[0]
+
+
+def actualizar_candidatos(mascota, registro=None):
+    """
+    Recalcula los pares de una mascota a partir de su embedding guardado.
+    Sin embedding vigente solo elimina los pares existentes.
+    """
+    from mascotas.embeddings import MODEL_VERSION
+
+    if registro is None:
+        registro = MascotaEmbedding.objects.filter(mascota=mascota, modelo_version=MODEL_VERSION).first()
+
+    pares = []
+    if registro is not None and registro.modelo_version == MODEL_VERSION:
+        puntuadas = puntuar(mascota, registro.as_array())
+        vigentes = _vigentes([otra_id for otra_id, _ in puntuadas])
+        pares = [
+            _par(mascota, otra_id, score, MODEL_VERSION)
+            for otra_id, score in puntuadas
+            if otra_id in vigentes
+        ]
+    with transaction.atomic():
+        eliminar_candidatos(mascota.id)
+        MatchCandidate.objects.bulk_create(pares, ignore_conflicts=True)
+        # Su propio /match (partición opuesta) y el de sus pares (la suya)
+        _invalidar_matches(mascota.tipo_reporte, tipo_opuesto(mascota.tipo_reporte))
+    return len(pares)
+
+
+def reconstruir(tamano_lote=1000, progreso=None):
+    """
+    Recalcula toda la tabla recorriendo ambas particiones. Los pares se
+    calculan primero y se reemplazan en una sola transacción: mientras tanto
+    match_mascota sigue leyendo la tabla anterior.
+    Retorna (pares, mascotas que alcanzaron MASCOTAS_CANDIDATOS_MAX).
+    """
+    from mascotas.embeddings import MODEL_VERSION
+
+    registros = (
+        MascotaEmbedding.objects
+        .filter(modelo_version=MODEL_VERSION)
+        .select_related("mascota")
+        .order_by("mascota_id")
+    )
+    # (perdida_id, encontrada_id) -> score; cada par aparece desde ambos lados
+    scores = {}
+    saturadas = 0
+    for i, registro in enumerate(registros.iterator(chunk_size=tamano_lote), 1):
+        mascota = registro.mascota
+        puntuadas = puntuar(mascota, registro.as_array())
+        if len(puntuadas) >= settings.MASCOTAS_CANDIDATOS_MAX:
+            saturadas += 1
+        for otra_id, score in puntuadas:
+            if mascota.tipo_reporte == "Pérdida":
+                scores[(mascota.id, otra_id)] = score
+            else:
+                scores[(otra_id, mascota.id)] = score
+        if progreso and i % tamano_lote == 0:
+            progreso(i)
+
+    vigentes = set(Mascota.objects.values_list("id", flat=True))
+    pares = (
+        MatchCandidate(perdida_id=perdida_id, encontrada_id=encontrada_id, score=score, modelo_version=MODEL_VERSION)
+        for (perdida_id, encontrada_id), score in scores.items()
+        if perdida_id in vigentes and encontrada_id in vigentes
+    )
+    with transaction.atomic():
+        MatchCandidate.objects.all().delete()
+        while True:
+            lote = list(islice(pares, tamano_lote))
+            if not lote:
+                break
+            MatchCandidate.objects.bulk_create(lote)
+        _invalidar_matches("Pérdida", "Encontrada")
+    return MatchCandidate.objects.count(), saturadas
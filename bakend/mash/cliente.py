@@ -0,0 +1,112 @@
+"""
+Backend de embeddings 'remoto' (MASCOTAS_EMBEDDING['BACKEND'] = 'remoto').
+
+Mismo contrato que los extractores de mascotas/extractores.py: recibe el
+lote preprocesado y retorna (n, 1280) float32, pero la inferencia la hace
+el servidor de mash/servicio.py. Este proceso no importa TensorFlow.
+
+Una conexión keep-alive por hilo; si el servidor la cerró se reintenta
+una vez con una conexión nueva.
+"""
+import http.client
+import json
+import socket
+import threading
+
+import numpy as np
+
+from .servicio import a_npy, de_npy, destino, get_agrupador_local, servicio_config
+
+
+class ServidorEmbeddingsError(RuntimeError):
+    pass
+
+
+class ConexionUnix(http.client.HTTPConnection):
+
+    def __init__(self, ruta, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.ruta = ruta
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.ruta)
+
+
+class ExtractorRemoto:
+    nombre = "remoto"
+
+    def __init__(self, url=None, timeout=None, **config):
+        from mascotas.extractores import model_version
+
+        servicio = servicio_config()
+        self.url = url or servicio["URL"]
+        self.timeout = timeout or servicio["TIMEOUT_SEGUNDOS"]
+        self.tipo, self.direccion = destino(self.url)
+        # Vectores de otro modelo no se pueden comparar con los guardados
+        self.modelo_version = model_version()
+        self._hilos = threading.local()
+
+    def _conexion(self):
+        conexion = getattr(self._hilos, "conexion", None)
+        if conexion is None:
+            if self.tipo == "unix":
+                conexion = ConexionUnix(self.direccion, timeout=self.timeout)
+            else:
+                conexion = http.client.HTTPConnection(*self.direccion, timeout=self.timeout)
+            self._hilos.conexion = conexion
+        return conexion
+
+    def _cerrar(self):
+        conexion = getattr(self._hilos, "conexion", None)
+        if conexion is not None:
+            conexion.close()
+            self._hilos.conexion = None
+
+    def _peticion(self, metodo, ruta, cuerpo=None):
+        cabeceras = {"Content-Type": "application/octet-stream"} if cuerpo is not None else {}
+        for intento in range(2):
+            try:
+                conexion = self._conexion()
+                conexion.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+                respuesta = conexion.getresponse()
+                return respuesta, respuesta.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Conexión keep-alive cerrada por el servidor: una nueva
+                self._cerrar()
+                if intento:
+                    raise ServidorEmbeddingsError(f"El servidor de embeddings cerró la conexión ({self.url})")
+            except OSError as e:
+                self._cerrar()
+                raise ServidorEmbeddingsError(f"Servidor de embeddings no disponible en {self.url}: {e}")
+
+    def _verificar_modelo(self, version):
+        if version != self.modelo_version:
+            raise ServidorEmbeddingsError(
+                f"El servidor usa el modelo {version!r} y este proceso espera {self.modelo_version!r}; "
+                "revisa MASH_EMBEDDINGS['BACKEND'] y MASCOTAS_EMBEDDING['QUANTIZATION']"
+            )
+
+    def predict(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        if self.tipo == "local":
+            agrupador = get_agrupador_local()
+            self._verificar_modelo(agrupador.modelo_version)
+            return np.asarray(agrupador.predecir(batch, timeout=self.timeout), dtype=np.float32)
+
+        respuesta, datos = self._peticion("POST", "/embeddings", a_npy(batch))
+        if respuesta.status != 200:
+            raise ServidorEmbeddingsError(
+                f"Servidor de embeddings respondió {respuesta.status}: {datos[:200].decode(errors='replace')}"
+            )
+        self._verificar_modelo(respuesta.getheader("X-Modelo-Version"))
+        return de_npy(datos)
+
+    def salud(self):
+        """Estado del servidor (modelo y estadísticas de los micro-lotes)"""
+        if self.tipo == "local":
+            agrupador = get_agrupador_local()
+            return {"modelo_version": agrupador.modelo_version, "lotes": agrupador.estadisticas()}
+        respuesta, datos = self._peticion("GET", "/salud")
+        return json.loads(datos)
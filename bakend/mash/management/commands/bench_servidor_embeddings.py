@@ -0,0 +1,70 @@
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from mash.cliente import ExtractorRemoto
+from mash.servicio import FORMA_ENTRADA, crear_agrupador, crear_extractor, crear_servidor, servicio_config
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el servidor de embeddings con clientes concurrentes de una "
+        "imagen por petición: sin agrupar (lotes de 1) contra micro-lotes"
+    )
+
+    def add_arguments(self, parser):
+        config = servicio_config()
+        parser.add_argument("--clientes", type=int, default=16, help="Peticiones concurrentes")
+        parser.add_argument("--peticiones", type=int, default=256, help="Peticiones totales por escenario")
+        parser.add_argument("--ventana-ms", type=float, default=config["VENTANA_MS"])
+        parser.add_argument("--max-lote", type=int, default=config["MAX_LOTE"])
+
+    def handle(self, *args, **options):
+        imagen = np.random.default_rng(0).uniform(-1, 1, (1,) + FORMA_ENTRADA).astype(np.float32)
+        escenarios = (
+            ("sin agrupar", 0, 1),
+            ("micro-lotes", options["ventana_ms"], options["max_lote"]),
+        )
+        # Un solo modelo para ambos escenarios
+        extractor = crear_extractor()
+        with tempfile.TemporaryDirectory() as directorio:
+            for nombre, ventana_ms, max_lote in escenarios:
+                agrupador = crear_agrupador(ventana_ms=ventana_ms, max_lote=max_lote, extractor=extractor)
+                agrupador.predecir(imagen)
+                url = f"unix://{os.path.join(directorio, 'bench.sock')}"
+                servidor = crear_servidor(agrupador, url)
+                threading.Thread(target=servidor.serve_forever, daemon=True).start()
+                try:
+                    self._medir(nombre, ExtractorRemoto(url=url), agrupador, imagen, options)
+                finally:
+                    servidor.shutdown()
+                    servidor.server_close()
+
+    def _medir(self, nombre, cliente, agrupador, imagen, options):
+        antes = agrupador.estadisticas()
+
+        def peticion(_):
+            inicio = time.perf_counter()
+            cliente.predict(imagen)
+            return time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["clientes"]) as pool:
+            latencias = sorted(pool.map(peticion, range(options["peticiones"])))
+        total = time.perf_counter() - inicio
+
+        despues = agrupador.estadisticas()
+        lotes = despues["lotes"] - antes["lotes"]
+        imagenes = despues["imagenes"] - antes["imagenes"]
+        self.stdout.write(
+            f"{nombre}: {options['peticiones'] / total:.1f} img/s, "
+            f"p50 {1000 * statistics.median(latencias):.1f} ms, "
+            f"p95 {1000 * latencias[int(0.95 * (len(latencias) - 1))]:.1f} ms, "
+            f"{imagenes / lotes if lotes else 0:.1f} imágenes por lote"
+        )
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from mash.candidatos import reconstruir
+
+
+class Command(BaseCommand):
+    help = "Recalcula toda la tabla MatchCandidate (tras cambiar de modelo o de umbral)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"Umbral {settings.MASCOTAS_CANDIDATOS_UMBRAL}, "
+            f"máximo {settings.MASCOTAS_CANDIDATOS_MAX} pares por mascota"
+        )
+        inicio = time.perf_counter()
+        total, saturadas = reconstruir(
+            tamano_lote=options["lote"],
+            progreso=lambda n: self.stdout.write(f"  {n} embeddings procesados"),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Candidatos: {total} en {time.perf_counter() - inicio:.1f}s"
+        ))
+        if saturadas:
+            self.stdout.write(self.style.WARNING(
+                f"{saturadas} mascotas alcanzaron el máximo de pares: "
+                f"algunos pares sobre el umbral quedaron fuera; subir MASCOTAS_CANDIDATOS_UMBRAL"
+            ))
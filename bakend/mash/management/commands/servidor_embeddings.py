@@ -0,0 +1,49 @@
+import signal
+import threading
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from mash.servicio import FORMA_ENTRADA, crear_agrupador, crear_servidor, servicio_config
+
+
+class Command(BaseCommand):
+    help = (
+        "Servidor local de embeddings: carga el modelo una vez y agrupa las "
+        "peticiones concurrentes en micro-lotes (clientes con backend 'remoto')"
+    )
+
+    def add_arguments(self, parser):
+        config = servicio_config()
+        parser.add_argument("--url", default=config["URL"],
+                            help="unix:///ruta.sock o http://127.0.0.1:puerto")
+        parser.add_argument("--backend", default=config["BACKEND"],
+                            help="Backend de inferencia del servidor: keras, tflite u onnx")
+        parser.add_argument("--ventana-ms", type=float, default=config["VENTANA_MS"],
+                            help="Espera máxima para juntar peticiones en un lote")
+        parser.add_argument("--max-lote", type=int, default=config["MAX_LOTE"])
+
+    def handle(self, *args, **options):
+        agrupador = crear_agrupador(
+            backend=options["backend"], ventana_ms=options["ventana_ms"], max_lote=options["max_lote"]
+        )
+        # La primera inferencia inicializa el grafo; mejor antes de aceptar peticiones
+        agrupador.predecir(np.zeros((1,) + FORMA_ENTRADA, dtype=np.float32))
+        servidor = crear_servidor(agrupador, options["url"])
+
+        def detener(signum, frame):
+            # shutdown() espera a serve_forever: desde otro hilo
+            threading.Thread(target=servidor.shutdown).start()
+
+        signal.signal(signal.SIGTERM, detener)
+        signal.signal(signal.SIGINT, detener)
+
+        self.stdout.write(
+            f"Servidor de embeddings en {options['url']} ({agrupador.modelo_version}, "
+            f"ventana {options['ventana_ms']} ms, lotes de hasta {options['max_lote']})"
+        )
+        try:
+            servidor.serve_forever()
+        finally:
+            servidor.server_close()
+        self.stdout.write(f"Servidor de embeddings detenido: {agrupador.estadisticas()}")
@@ -1,3 +1,26 @@
 from django.db import models
+from mascotas.models import Mascota
 
-# Create your models here.
+
+class MatchCandidate(models.Model):
+    """
+    Par pérdida/encontrada con similitud sobre el umbral, calculado al
+    ingresar el embedding de cualquiera de las dos (ver mash/candidatos.py)
+    """
+    perdida = models.ForeignKey(Mascota, on_delete=models.CASCADE, related_name='candidatos_encontradas')
+    encontrada = models.ForeignKey(Mascota, on_delete=models.CASCADE, related_name='candidatos_perdidas')
+    score = models.FloatField()
+    modelo_version = models.CharField(max_length=100)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['perdida', 'encontrada'], name='match_candidato_par_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['perdida', 'modelo_version', '-score'], name='match_perdida_score_idx'),
+            models.Index(fields=['encontrada', 'modelo_version', '-score'], name='match_encontrada_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.perdida_id} ~ {self.encontrada_id} ({self.score:.3f})"
@@ -0,0 +1,115 @@
+"""
+Prefiltro por metadatos antes de la puntuación por embeddings.
+
+Cada etapa es una condición SQL sobre la mascota candidata construida a
+partir de la mascota base; el pipeline las aplica en el orden de
+MASCOTAS_PREFILTROS["ETAPAS"] sobre cualquier queryset que llegue a
+Mascota (directo o por una relación, p. ej. "encontrada__").
+
+- ventana_dias: una encontrada no puede ser anterior a la pérdida (con
+  DIAS_ANTES de tolerancia por fechas mal recordadas) ni posterior en más
+  de DIAS_DESPUES. Sin fecha en alguno de los dos lados no se descarta.
+- especie: perro con perro y gato con gato; especie desconocida pasa.
+- raza: misma raza (sin mayúsculas); razas vacías o mestizas pasan.
+  Desactivada por defecto: la raza es texto libre y descarta de más.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+
+from mascotas.especies import normalizar_raza
+
+PREFILTROS_DEFAULTS = {
+    "ETAPAS": ("ventana_dias", "especie"),
+    "DIAS_ANTES": 7,
+    "DIAS_DESPUES": 180,
+    "RAZAS_COMODIN": ("", "criollo", "criolla", "mestizo", "mestiza", "desconocida", "no se"),
+}
+
+
+def prefiltros_config(**overrides):
+    config = dict(PREFILTROS_DEFAULTS)
+    config.update(getattr(settings, "MASCOTAS_PREFILTROS", {}))
+    config.update({k: v for k, v in overrides.items() if v is not None})
+    return config
+
+
+def ventana_dias(mascota, prefijo, config):
+    if mascota.dia is None:
+        return None
+    antes = timedelta(days=config["DIAS_ANTES"])
+    despues = timedelta(days=config["DIAS_DESPUES"])
+    if mascota.tipo_reporte == "Pérdida":
+        # La candidata es una encontrada: del día de la pérdida en adelante
+        desde, hasta = mascota.dia - antes, mascota.dia + despues
+    else:
+        # La candidata es una pérdida: antes del día en que se encontró
+        desde, hasta = mascota.dia - despues, mascota.dia + antes
+    return (
+        Q(**{f"{prefijo}dia__gte": desde, f"{prefijo}dia__lte": hasta})
+        | Q(**{f"{prefijo}dia__isnull": True})
+    )
+
+
+def especie(mascota, prefijo, config):
+    if not mascota.especie:
+        return None
+    return Q(**{f"{prefijo}especie": mascota.especie}) | Q(**{f"{prefijo}especie": ""})
+
+
+def raza(mascota, prefijo, config):
+    comodines = set(config["RAZAS_COMODIN"])
+    if normalizar_raza(mascota.raza) in comodines:
+        return None
+    q = Q(**{f"{prefijo}raza__iexact": mascota.raza.strip()})
+    for comodin in comodines:
+        q |= Q(**{f"{prefijo}raza__iexact": comodin})
+    return q
+
+
+ETAPAS = {
+    "ventana_dias": ventana_dias,
+    "especie": especie,
+    "raza": raza,
+}
+
+
+def registrar_etapa(estadisticas, nombre, antes, despues):
+    """
+    Agrega {etapa, entrada, salida, ms_conteo}. Las etapas son condiciones
+    de un queryset perezoso y se ejecutan juntas en la consulta final; no
+    hay un tiempo propio por etapa. ms_conteo es lo que tarda el COUNT de la
+    salida, es decir el costo acumulado de las etapas hasta esta.
+    """
+    if estadisticas is None:
+        return
+    entrada = antes.count()
+    inicio = time.perf_counter()
+    salida = despues.count()
+    estadisticas.append({
+        "etapa": nombre,
+        "entrada": entrada,
+        "salida": salida,
+        "ms_conteo": round(1000 * (time.perf_counter() - inicio), 2),
+    })
+
+
+def aplicar(mascota, queryset, prefijo="", estadisticas=None, **overrides):
+    """
+    Aplica las etapas configuradas. Con `estadisticas` (lista) cada etapa
+    agrega sus conteos; sin ella no se ejecuta ninguna consulta extra.
+    """
+    config = prefiltros_config(**overrides)
+    for nombre in config["ETAPAS"]:
+        if nombre not in ETAPAS:
+            raise ImproperlyConfigured(
+                f"Prefiltro desconocido '{nombre}'. Opciones: {', '.join(ETAPAS)}"
+            )
+        condicion = ETAPAS[nombre](mascota, prefijo, config)
+        filtrado = queryset.filter(condicion) if condicion is not None else queryset
+        registrar_etapa(estadisticas, nombre, queryset, filtrado)
+        queryset = filtrado
+    return queryset
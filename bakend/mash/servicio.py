@@ -0,0 +1,298 @@
+"""
+Servicio de embeddings fuera de los workers web.
+
+Un proceso (`python manage.py servidor_embeddings`) es el único que carga
+MobileNetV2. Los workers web y run_embedding_worker usan el backend
+'remoto' (mash/cliente.py): decodifican la imagen como siempre y envían el
+lote ya preprocesado, así que nunca importan TensorFlow.
+
+Micro-lotes: las peticiones que llegan dentro de VENTANA_MS se juntan en
+una sola inferencia de hasta MAX_LOTE imágenes (Agrupador). Con varias
+peticiones concurrentes de una imagen cada una, el modelo procesa un lote
+en lugar de N llamadas de tamaño 1.
+
+Protocolo (HTTP/1.1 con keep-alive, por socket Unix o TCP local):
+- POST /embeddings  cuerpo .npy (n, 224, 224, 3) float32 -> .npy (n, 1280)
+- GET  /salud       JSON con el modelo y las estadísticas de los lotes
+Cada respuesta lleva X-Modelo-Version para que el cliente no mezcle
+vectores de otro modelo.
+
+URL en MASH_EMBEDDINGS['URL']: 'unix:///ruta.sock', 'http://127.0.0.1:8765'
+o 'local' (mismo Agrupador dentro del proceso, para pruebas y desarrollo).
+MASH_EMBEDDINGS['EXTRACTOR'] (ruta con puntos a una clase sin argumentos)
+reemplaza al extractor de BACKEND, por ejemplo uno falso en las pruebas;
+su atributo `modelo_version`, si lo tiene, es el que se anuncia.
+"""
+import io
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+SERVICIO_DEFAULTS = {
+    "URL": "unix:///tmp/mash-embeddings.sock",
+    "BACKEND": "keras",
+    "VENTANA_MS": 5,
+    "MAX_LOTE": 32,
+    "TIMEOUT_SEGUNDOS": 30,
+    "EXTRACTOR": None,
+}
+
+# Límite de imágenes por petición (un lote de 224x224x3 float32 ocupa ~600 KB por imagen)
+MAX_IMAGENES_PETICION = 256
+FORMA_ENTRADA = (224, 224, 3)
+
+
+def servicio_config():
+    config = dict(SERVICIO_DEFAULTS)
+    config.update(getattr(settings, "MASH_EMBEDDINGS", {}))
+    if config["BACKEND"] == "remoto":
+        raise ImproperlyConfigured("MASH_EMBEDDINGS['BACKEND'] es el backend del servidor; no puede ser 'remoto'")
+    return config
+
+
+def destino(url):
+    """('unix', ruta), ('tcp', (host, puerto)) o ('local', None)"""
+    if url == "local":
+        return "local", None
+    partes = urlsplit(url)
+    if partes.scheme == "unix":
+        return "unix", partes.path
+    if partes.scheme == "http" and partes.hostname:
+        return "tcp", (partes.hostname, partes.port or 80)
+    raise ImproperlyConfigured(f"URL del servidor de embeddings no soportada: {url!r}")
+
+
+def a_npy(arreglo):
+    buffer = io.BytesIO()
+    np.save(buffer, arreglo, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def de_npy(datos):
+    """Arreglo de un cuerpo .npy; ValueError si está vacío, truncado o no es .npy"""
+    try:
+        return np.load(io.BytesIO(datos), allow_pickle=False)
+    except EOFError:
+        raise ValueError("Cuerpo .npy vacío o truncado")
+
+
+class Agrupador:
+    """
+    Junta las peticiones concurrentes en micro-lotes para un extractor.
+    Un solo hilo infiere; predecir() bloquea a quien llama hasta tener su
+    parte del resultado.
+    """
+
+    def __init__(self, extractor, ventana_ms=5, max_lote=32):
+        self.extractor = extractor
+        self.ventana = ventana_ms / 1000
+        self.max_lote = max_lote
+        self._cola = queue.Queue()
+        self._lock = threading.Lock()
+        self.peticiones = 0
+        self.lotes = 0
+        self.imagenes = 0
+        self.segundos_inferencia = 0.0
+        threading.Thread(target=self._bucle, name="mash-agrupador", daemon=True).start()
+
+    def predecir(self, lote, timeout=None):
+        futuro = Future()
+        self._cola.put((lote, futuro))
+        return futuro.result(timeout)
+
+    def _juntar(self, primero):
+        """Peticiones del siguiente micro-lote y la que ya no cupo (o None)"""
+        pendientes = [primero]
+        total = len(primero[0])
+        limite = time.monotonic() + self.ventana
+        while total < self.max_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                siguiente = self._cola.get(timeout=restante)
+            except queue.Empty:
+                break
+            if total + len(siguiente[0]) > self.max_lote:
+                return pendientes, siguiente
+            pendientes.append(siguiente)
+            total += len(siguiente[0])
+        return pendientes, None
+
+    def _bucle(self):
+        sobrante = None
+        while True:
+            primero = sobrante or self._cola.get()
+            pendientes, sobrante = self._juntar(primero)
+            lotes = [lote for lote, _ in pendientes]
+            entrada = lotes[0] if len(lotes) == 1 else np.concatenate(lotes)
+            inicio = time.perf_counter()
+            try:
+                salida = self.extractor.predict(entrada)
+            except Exception as e:
+                print(f"Error en la inferencia del micro-lote: {str(e)}")
+                for _, futuro in pendientes:
+                    futuro.set_exception(e)
+                continue
+            with self._lock:
+                self.peticiones += len(pendientes)
+                self.lotes += 1
+                self.imagenes += len(entrada)
+                self.segundos_inferencia += time.perf_counter() - inicio
+            desde = 0
+            for lote, futuro in pendientes:
+                futuro.set_result(salida[desde:desde + len(lote)])
+                desde += len(lote)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "peticiones": self.peticiones,
+                "lotes": self.lotes,
+                "imagenes": self.imagenes,
+                "imagenes_por_lote": round(self.imagenes / self.lotes, 2) if self.lotes else 0,
+                "segundos_inferencia": round(self.segundos_inferencia, 3),
+                "en_cola": self._cola.qsize(),
+            }
+
+
+def crear_extractor(backend=None):
+    """El extractor de MASH_EMBEDDINGS['EXTRACTOR'] o, si no hay, el de `backend`"""
+    from mascotas.extractores import create_extractor
+
+    config = servicio_config()
+    if config["EXTRACTOR"]:
+        return import_string(config["EXTRACTOR"])()
+    return create_extractor(backend=backend or config["BACKEND"])
+
+
+def crear_agrupador(backend=None, ventana_ms=None, max_lote=None, extractor=None):
+    from mascotas.extractores import model_version
+
+    config = servicio_config()
+    backend = backend or config["BACKEND"]
+    extractor = extractor or crear_extractor(backend)
+    agrupador = Agrupador(
+        extractor,
+        ventana_ms=config["VENTANA_MS"] if ventana_ms is None else ventana_ms,
+        max_lote=max_lote or config["MAX_LOTE"],
+    )
+    agrupador.modelo_version = getattr(extractor, "modelo_version", None) or model_version(backend=backend)
+    return agrupador
+
+
+class ManejadorEmbeddings(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _responder(self, estado, cuerpo, tipo):
+        self.send_response(estado)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.send_header("X-Modelo-Version", self.server.agrupador.modelo_version)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _error(self, estado, detalle):
+        self._responder(estado, json.dumps({"detail": detalle}).encode(), "application/json")
+
+    def do_GET(self):
+        if self.path != "/salud":
+            return self._error(404, "No encontrado")
+        datos = {
+            "modelo_version": self.server.agrupador.modelo_version,
+            "backend": self.server.agrupador.extractor.nombre,
+            "lotes": self.server.agrupador.estadisticas(),
+        }
+        self._responder(200, json.dumps(datos).encode(), "application/json")
+
+    def do_POST(self):
+        if self.path != "/embeddings":
+            return self._error(404, "No encontrado")
+        largo = int(self.headers.get("Content-Length") or 0)
+        if largo > MAX_IMAGENES_PETICION * np.prod(FORMA_ENTRADA) * 4 + 1024:
+            self.close_connection = True
+            return self._error(413, f"Máximo {MAX_IMAGENES_PETICION} imágenes por petición")
+        try:
+            lote = de_npy(self.rfile.read(largo))
+        except ValueError:
+            return self._error(400, "El cuerpo debe ser un arreglo .npy")
+        if lote.ndim != 4 or lote.shape[1:] != FORMA_ENTRADA or lote.dtype != np.float32:
+            return self._error(400, f"Se esperaba un lote (n, 224, 224, 3) float32, llegó {lote.shape} {lote.dtype}")
+        try:
+            salida = self.server.agrupador.predecir(lote) if len(lote) else np.empty((0, 0), dtype=np.float32)
+        except Exception as e:
+            return self._error(500, str(e))
+        self._responder(200, a_npy(np.asarray(salida, dtype=np.float32)), "application/octet-stream")
+
+    def address_string(self):
+        # En un socket Unix client_address es una cadena vacía
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, formato, *args):
+        # Solo errores: una línea por petición ahogaría el log con micro-lotes
+        pass
+
+    def log_error(self, formato, *args):
+        print(f"servidor_embeddings: {formato % args}")
+
+
+# Cola de listen(): con el valor por defecto (5) las conexiones simultáneas
+# de muchos workers fallan con EAGAIN en el socket Unix
+COLA_CONEXIONES = 128
+
+
+class ServidorTCP(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = COLA_CONEXIONES
+
+
+class ServidorUnix(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = COLA_CONEXIONES
+
+    def server_bind(self):
+        # Socket de una ejecución anterior que no cerró limpio
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def crear_servidor(agrupador, url=None):
+    """Servidor HTTP sobre el agrupador; iniciar con serve_forever()"""
+    tipo, direccion = destino(url or servicio_config()["URL"])
+    if tipo == "local":
+        raise ImproperlyConfigured("La URL 'local' no abre un servidor: el cliente usa el agrupador del proceso")
+    clase = ServidorUnix if tipo == "unix" else ServidorTCP
+    servidor = clase(direccion, ManejadorEmbeddings)
+    servidor.agrupador = agrupador
+    return servidor
+
+
+_agrupador_local = None
+_agrupador_local_lock = threading.Lock()
+
+
+def get_agrupador_local():
+    """Agrupador dentro del proceso para la URL 'local' (pruebas y desarrollo)"""
+    global _agrupador_local
+    if _agrupador_local is None:
+        with _agrupador_local_lock:
+            if _agrupador_local is None:
+                _agrupador_local = crear_agrupador()
+    return _agrupador_local
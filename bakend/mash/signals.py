@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from mascotas.jobs import encolar_embedding
+from mascotas.models import Mascota
+from mascotas.signals import embedding_procesado
+
+from .candidatos import actualizar_candidatos, eliminar_candidatos
+
+
+# Se envía después de guardar el lote, con el índice ya actualizado por los
+# receptores de mascotas; corre en el worker o en embed_mascotas
+@receiver(embedding_procesado)
+def candidatos_por_embedding(sender, mascotas, **kwargs):
+    for mascota in mascotas:
+        try:
+            actualizar_candidatos(mascota)
+        except Exception as e:
+            print(f"No se pudieron actualizar los candidatos de {mascota.id}: {str(e)}")
+
+
+@receiver(post_save, sender=Mascota)
+def candidatos_por_mascota(sender, instance, created, **kwargs):
+    if created:
+        return
+    tipo_anterior = getattr(instance, "_tipo_anterior", None)
+    if not instance.imagen:
+        eliminar_candidatos(instance.id)
+    elif tipo_anterior and tipo_anterior != instance.tipo_reporte:
+        # Puntuar requiere el índice vectorial: se deja al worker de la cola
+        if settings.MASCOTAS_EMBEDDING_ASINCRONO:
+            encolar_embedding(instance, marcar_pendiente=False)
+        else:
+            actualizar_candidatos(instance)
@@ -1,3 +1,156 @@
-from django.test import TestCase
+import http.client
+import threading
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from mascotas.embeddings import MODEL_VERSION
+from mascotas.extractores import model_version
+from mascotas.models import Mascota, MascotaEmbedding
+from mascotas.views import calcular_match
+from usuarios.models import User
+
+from .candidatos import actualizar_candidatos, reconstruir
+from .cliente import ExtractorRemoto, ServidorEmbeddingsError
+from .servicio import FORMA_ENTRADA, Agrupador, a_npy, crear_agrupador, crear_servidor
+
+
+class ExtractorFalso:
+    """Devuelve el primer píxel de cada imagen: cada fila dice de qué imagen salió"""
+    nombre = "falso"
+
+    def __init__(self):
+        self.modelo_version = model_version()
+        self.lotes = []
+
+    def predict(self, lote):
+        self.lotes.append(len(lote))
+        return lote[:, 0, 0, :].copy()
+
+
+def _lote(*valores):
+    lote = np.zeros((len(valores), *FORMA_ENTRADA), dtype=np.float32)
+    for i, valor in enumerate(valores):
+        lote[i] = valor
+    return lote
+
+
+def _concurrentes(agrupador, lotes):
+    """Resultados de predecir() con todas las peticiones a la vez, en el orden de `lotes`"""
+    resultados = [None] * len(lotes)
+    salida = threading.Barrier(len(lotes))
+
+    def peticion(i):
+        salida.wait()
+        resultados[i] = agrupador.predecir(lotes[i], timeout=5)
+
+    hilos = [threading.Thread(target=peticion, args=(i,)) for i in range(len(lotes))]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(5)
+    return resultados
+
+
+class AgrupadorTests(SimpleTestCase):
+
+    def test_peticiones_concurrentes_en_un_lote(self):
+        extractor = ExtractorFalso()
+        agrupador = Agrupador(extractor, ventana_ms=500, max_lote=32)
+        _concurrentes(agrupador, [_lote(i) for i in range(4)])
+        self.assertEqual(extractor.lotes, [4])
+        estadisticas = agrupador.estadisticas()
+        self.assertEqual((estadisticas["peticiones"], estadisticas["lotes"]), (4, 1))
+
+    def test_cada_peticion_recibe_sus_filas(self):
+        lotes = [_lote(1), _lote(2, 3, 4), _lote(5, 6)]
+        resultados = _concurrentes(Agrupador(ExtractorFalso(), ventana_ms=500, max_lote=32), lotes)
+        for lote, resultado in zip(lotes, resultados):
+            np.testing.assert_array_equal(resultado, lote[:, 0, 0, :])
+
+    def test_max_lote_pasa_el_resto_al_siguiente(self):
+        extractor = ExtractorFalso()
+        lotes = [_lote(1, 2), _lote(3, 4), _lote(5, 6)]
+        resultados = _concurrentes(Agrupador(extractor, ventana_ms=500, max_lote=4), lotes)
+        self.assertEqual(sorted(extractor.lotes), [2, 4])
+        for lote, resultado in zip(lotes, resultados):
+            np.testing.assert_array_equal(resultado, lote[:, 0, 0, :])
+
+    @override_settings(MASH_EMBEDDINGS={"EXTRACTOR": "mash.tests.ExtractorFalso"})
+    def test_extractor_desde_settings(self):
+        agrupador = crear_agrupador(ventana_ms=0)
+        self.assertIsInstance(agrupador.extractor, ExtractorFalso)
+        self.assertEqual(agrupador.modelo_version, model_version())
+
+
+class ServidorEmbeddingsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.extractor = ExtractorFalso()
+        self.servidor = crear_servidor(crear_agrupador(ventana_ms=0, extractor=self.extractor), "http://127.0.0.1:0")
+        self.url = "http://127.0.0.1:%d" % self.servidor.server_address[1]
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+    def _post(self, cuerpo):
+        conexion = http.client.HTTPConnection(*self.servidor.server_address, timeout=5)
+        try:
+            conexion.request("POST", "/embeddings", body=cuerpo)
+            return conexion.getresponse().status
+        finally:
+            conexion.close()
+
+    def test_ida_y_vuelta(self):
+        lote = _lote(1, 2, 3)
+        np.testing.assert_array_equal(ExtractorRemoto(url=self.url).predict(lote), lote[:, 0, 0, :])
+
+    def test_modelo_distinto(self):
+        self.servidor.agrupador.modelo_version = "otro-modelo"
+        with self.assertRaises(ServidorEmbeddingsError):
+            ExtractorRemoto(url=self.url).predict(_lote(1))
+
+    def test_cuerpo_vacio_o_truncado(self):
+        self.assertEqual(self._post(b""), 400)
+        self.assertEqual(self._post(a_npy(_lote(1))[:200]), 400)
+        self.assertEqual(self._post(b"no es npy"), 400)
+        self.assertEqual(self.extractor.lotes, [])
+
+
+@override_settings(MASCOTAS_INDEX_SYNC_SEGUNDOS=0, MASCOTAS_CANDIDATOS_UMBRAL=0.5)
+class CandidatosCacheTests(TestCase):
+    """Escribir pares invalida los /match en caché calculados antes de tenerlos"""
+
+    def setUp(self):
+        caches["matches"].clear()
+        usuario = User.objects.create(username="u1", email="u1@x.com", password="x")
+        self.perdida, self.encontrada = [
+            Mascota.objects.create(
+                nombre=nombre, raza="Criollo", tipo_reporte=tipo, propietario=usuario, imagen=f"mascotas/{nombre}.jpg"
+            )
+            for nombre, tipo in (("Lúa", "Pérdida"), ("Toby", "Encontrada"))
+        ]
+        for mascota in (self.perdida, self.encontrada):
+            registro = MascotaEmbedding(mascota=mascota, modelo_version=MODEL_VERSION, checksum=f"{mascota.id:064d}")
+            registro.set_array(np.ones(8, dtype=np.float32))
+            registro.save()
+
+    def _match(self, mascota):
+        return [m["id"] for m in calcular_match(mascota.id, 20, 0.5, None, False)["matches"]]
+
+    def test_actualizar_candidatos(self):
+        # Embeddings guardados, pares todavía no: el resultado vacío queda en caché
+        self.assertEqual(self._match(self.perdida), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            actualizar_candidatos(self.encontrada)
+        self.assertEqual(self._match(self.perdida), [self.encontrada.id])
+        self.assertEqual(self._match(self.encontrada), [self.perdida.id])
+
+    def test_reconstruir(self):
+        self.assertEqual(self._match(self.encontrada), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(reconstruir()[0], 1)
+        self.assertEqual(self._match(self.encontrada), [self.perdida.id])
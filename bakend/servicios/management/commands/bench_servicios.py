@@ -0,0 +1,129 @@
+import hashlib
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import RequestFactory
+
+from servicios.models import Servicio
+from servicios.schemas import ServicioOutSchema
+from servicios.views import CAMPOS_DIMENSIONES, CAMPOS_IMAGEN, CAMPOS_LISTA, serializar_servicios
+
+PREFIJO = "bench-servicios"
+
+
+class ServicioAnterior(ServicioOutSchema):
+    """Serialización anterior de /servicios/lista: objetos completos y una URL absoluta por campo"""
+
+    @staticmethod
+    def resolve_imagen(servicio):
+        if servicio.imagen:
+            return servicio._request.build_absolute_uri(servicio.imagen.url)
+        return None
+
+    @staticmethod
+    def resolve_imagen_miniatura(servicio):
+        if servicio.imagen_miniatura:
+            return servicio._request.build_absolute_uri(servicio.imagen_miniatura.url)
+        return None
+
+    @staticmethod
+    def resolve_imagen_media(servicio):
+        if servicio.imagen_media:
+            return servicio._request.build_absolute_uri(servicio.imagen_media.url)
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara la serialización de /servicios/lista (objetos + pydantic + "
+        "build_absolute_uri por fila) con la ruta rápida de .values()"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sembrar", type=int, default=10000,
+                            help="Servicios de prueba a crear (0 = usar los datos existentes)")
+        parser.add_argument("--conservar", action="store_true",
+                            help="No borra los datos sembrados al terminar")
+        parser.add_argument("--repeticiones", type=int, default=5)
+
+    def _sembrar(self, cantidad):
+        propietario, _ = get_user_model().objects.get_or_create(
+            username=PREFIJO, defaults={"email": f"{PREFIJO}@example.com"}
+        )
+        lote = []
+        for i in range(cantidad):
+            sha = hashlib.sha256(str(i).encode()).hexdigest()
+            lote.append(Servicio(
+                nombre=f"{PREFIJO}-{i}",
+                descripcion="Paseo y cuidado de mascotas " * 4,
+                telefono="3001234567",
+                propietario=propietario,
+                imagen=f"servicios/{sha}.jpg",
+                imagen_miniatura=f"servicios/miniaturas/{sha}.webp",
+                imagen_media=f"servicios/medias/{sha}.webp",
+                # Con las dimensiones llenas ImageField no abre los archivos
+                imagen_ancho=1600,
+                imagen_alto=1200,
+                miniatura_ancho=320,
+                miniatura_alto=240,
+                media_ancho=1024,
+                media_alto=768,
+            ))
+            if len(lote) == 5000:
+                Servicio.objects.bulk_create(lote)
+                lote = []
+        Servicio.objects.bulk_create(lote)
+
+    def _limpiar(self):
+        get_user_model().objects.filter(username=PREFIJO).delete()
+
+    def handle(self, *args, **options):
+        if options["sembrar"]:
+            self.stdout.write(f"Sembrando {options['sembrar']} servicios...")
+            self._sembrar(options["sembrar"])
+        try:
+            self._medir(options["repeticiones"])
+        finally:
+            if options["sembrar"] and not options["conservar"]:
+                self._limpiar()
+
+    def _medir(self, repeticiones):
+        host = next((h for h in settings.ALLOWED_HOSTS if h and h != "*"), "localhost")
+        request = RequestFactory().get("/api/servicios/lista", HTTP_HOST=host)
+        ordenados = Servicio.objects.order_by("-created_at", "-pk")
+
+        def anterior(cantidad):
+            filas = list(ordenados[:cantidad])
+            for s in filas:
+                s._request = request
+            datos = [ServicioAnterior.from_orm(s).model_dump() for s in filas]
+            return json.dumps(datos, cls=DjangoJSONEncoder).encode()
+
+        def rapida(cantidad):
+            filas = list(ordenados.values(*CAMPOS_LISTA, *CAMPOS_IMAGEN, *CAMPOS_DIMENSIONES, "created_at")[:cantidad])
+            return json.dumps(serializar_servicios(filas, request), cls=DjangoJSONEncoder).encode()
+
+        total = Servicio.objects.count()
+        for cantidad in (settings.API_PAGINA_MAXIMA, total):
+            # Mismo JSON por ambas rutas
+            if json.loads(anterior(cantidad)) != json.loads(rapida(cantidad)):
+                self.stderr.write("Las dos rutas producen respuestas distintas")
+                return
+            tiempos = {}
+            for nombre, ruta in (("anterior", anterior), ("rapida", rapida)):
+                muestras = []
+                for _ in range(repeticiones):
+                    inicio = time.perf_counter()
+                    ruta(cantidad)
+                    muestras.append(time.perf_counter() - inicio)
+                tiempos[nombre] = statistics.median(muestras)
+            self.stdout.write(
+                f"{cantidad} filas: anterior {1000 * tiempos['anterior']:.1f} ms, "
+                f"rápida {1000 * tiempos['rapida']:.1f} ms "
+                f"(x{tiempos['anterior'] / tiempos['rapida']:.1f})"
+            )
@@ -1,9 +1,13 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from api.models import Buscable, ImagenVariantes
 
 User = get_user_model()
 
-class Servicio(models.Model):
+class Servicio(ImagenVariantes, Buscable):
+    CAMPOS_BUSQUEDA = {"nombre": "A", "descripcion": "C"}
+    CAMPOS_EXTRA_BUSQUEDA = ("telefono",)
+
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField()
     imagen = models.ImageField(upload_to='servicios/', null=True, blank=True)
@@ -11,6 +15,10 @@ class Servicio(models.Model):
     propietario = models.ForeignKey(User, on_delete=models.CASCADE)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['-created_at', '-id'], name='servicio_created_id_idx')]
 
     def __str__(self):
         return self.nombre
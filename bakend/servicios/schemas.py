@@ -8,6 +8,10 @@ class ServicioSchema(Schema):
     descripcion: str
     telefono: str
     imagen: Optional[str]
+    imagen_miniatura: Optional[str] = None
+    imagen_media: Optional[str] = None
+    imagen_ancho: Optional[int] = None
+    imagen_alto: Optional[int] = None
 
     
 
@@ -22,15 +26,16 @@ class ServicioUpdateSchema(Schema):
     telefono: str
 
 class ServicioOutSchema(Schema):
+    """
+    Elemento de /servicios/lista con URLs absolutas. La vista lo arma con
+    serializar_servicios() (servicios/views.py) directamente desde .values()
+    """
     id: int
     nombre: str
     descripcion: str
     telefono: str
     imagen: str | None
-
-    @staticmethod
-    def resolve_imagen(servicio):
-        request = servicio._request
-        if servicio.imagen:
-            return request.build_absolute_uri(servicio.imagen.url)
-        return None
\ No newline at end of file
+    imagen_miniatura: str | None = None
+    imagen_media: str | None = None
+    imagen_ancho: int | None = None
+    imagen_alto: int | None = None
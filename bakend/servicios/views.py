@@ -1,24 +1,79 @@
 from typing import List
 from ninja import Router, File, Form
 from ninja.files import UploadedFile
-from django.shortcuts import get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404
 from .models import Servicio
 from .schemas import* 
 from ninja.errors import HttpError
+from django.http import JsonResponse
+from api.condicional import avalidadores_coleccion, validadores_objeto
+from api.ejecutor import ejecutar_ingesta
+from api.paginacion import apaginar
+from api.imagenes import procesar_subida
+from api.media import UrlsMedia
+from usuarios.auth import AsyncJWTAuth
 
 servicios = Router()
 
+CAMPOS_LISTA = ("id", "nombre", "descripcion", "telefono")
+CAMPOS_IMAGEN = ("imagen", "imagen_miniatura", "imagen_media")
+CAMPOS_DIMENSIONES = ("imagen_ancho", "imagen_alto")
+
+
+def serializar_servicios(filas, request):
+    """
+    Filas de .values() a la forma de ServicioOutSchema, con las URLs de
+    imagen absolutas. La base de MEDIA_URL se resuelve una sola vez.
+    """
+    url = UrlsMedia(request)
+    return [
+        {
+            **{campo: fila[campo] for campo in CAMPOS_LISTA},
+            **{campo: url(fila[campo]) for campo in CAMPOS_IMAGEN},
+            **{campo: fila[campo] for campo in CAMPOS_DIMENSIONES},
+        }
+        for fila in filas
+    ]
+
+
 # LISTAR
-@servicios.get("/lista", response=List[ServicioOutSchema])
-def listar_servicios(request):
-    servicios = Servicio.objects.all()
-    for s in servicios:
-        s._request = request
-    return servicios
+@servicios.get("/lista", response=List[ServicioOutSchema], auth=AsyncJWTAuth())
+async def listar_servicios(request, cursor: str = None, limite: int = None):
+    # Solo las columnas de la respuesta; se serializa sin validar fila por
+    # fila con pydantic (el esquema queda para la documentación)
+    validadores = await avalidadores_coleccion(request, Servicio.objects.all(), "updated_at")
+    no_modificado = validadores.no_modificado(request)
+    if no_modificado is not None:
+        return no_modificado
+    filas = Servicio.objects.values(*CAMPOS_LISTA, *CAMPOS_IMAGEN, *CAMPOS_DIMENSIONES, "created_at")
+    filas, siguiente = await apaginar(filas, "created_at", cursor, limite)
+    respuesta = JsonResponse(serializar_servicios(filas, request), safe=False)
+    # La respuesta sigue siendo una lista; el cursor siguiente va en un header
+    if siguiente:
+        respuesta["X-Siguiente-Cursor"] = siguiente
+    return validadores.aplicar(respuesta)
+
+
+# DETALLE
+@servicios.get("/detalle/{servicio_id}", response=ServicioOutSchema, auth=AsyncJWTAuth())
+async def detalle_servicio(request, servicio_id: int):
+    fila = await (
+        Servicio.objects.filter(id=servicio_id)
+        .values(*CAMPOS_LISTA, *CAMPOS_IMAGEN, *CAMPOS_DIMENSIONES, "updated_at")
+        .afirst()
+    )
+    if fila is None:
+        raise HttpError(404, "Servicio no encontrado")
+    validadores = validadores_objeto(request, fila["id"], fila["updated_at"])
+    no_modificado = validadores.no_modificado(request)
+    if no_modificado is not None:
+        return no_modificado
+    return validadores.aplicar(JsonResponse(serializar_servicios([fila], request)[0]))
 
 # CREAR
-@servicios.post("/crear", response=ServicioSchema)
-def crear_servicio(
+@servicios.post("/crear", response=ServicioSchema, auth=AsyncJWTAuth())
+async def crear_servicio(
     request,
     nombre: str = Form(...),
     descripcion: str = Form(""),
@@ -28,50 +83,47 @@ def crear_servicio(
     if not request.user.is_authenticated:
         raise HttpError(401, "Debes iniciar sesión")
 
-    servicio = Servicio.objects.create(
+    servicio = Servicio(
         nombre=nombre,
         descripcion=descripcion,
         telefono=telefono,
         propietario=request.user,
-        imagen=imagen,
     )
+    procesadas = None
+    if imagen:
+        # Decodificar y reducir la imagen es CPU
+        procesadas = await ejecutar_ingesta(procesar_subida, imagen)
+    await sync_to_async(servicio.guardar_con_imagen)(procesadas)
     return servicio
 
 # ACTUALIZAR
-@servicios.post("/actualizar/{servicio_id}", response=ServicioSchema)
-def actualizar_servicio(
+@servicios.post("/actualizar/{servicio_id}", response=ServicioSchema, auth=AsyncJWTAuth())
+async def actualizar_servicio(
     request,
     servicio_id: int,
     data: ServicioUpdateSchema,
     imagen: UploadedFile = File(None),
 ):
-    servicio = get_object_or_404(Servicio, id=servicio_id)
+    servicio = await aget_object_or_404(Servicio, id=servicio_id)
 
-    if servicio.propietario != request.user:
+    if servicio.propietario_id != request.user.id:
         raise HttpError(403, "No puedes modificar este servicio")
 
     servicio.nombre = data.nombre
     servicio.descripcion = data.descripcion
     servicio.telefono = data.telefono
 
-    if imagen:
-        if servicio.imagen:
-            servicio.imagen.delete(save=False)
-        servicio.imagen = imagen
-
-    servicio.save()
+    procesadas = await ejecutar_ingesta(procesar_subida, imagen) if imagen else None
+    await sync_to_async(servicio.guardar_con_imagen)(procesadas)
     return servicio
 
 # ELIMINAR
-@servicios.delete("/eliminar/{servicio_id}")
-def eliminar_servicio(request, servicio_id: int):
-    servicio = get_object_or_404(Servicio, id=servicio_id)
+@servicios.delete("/eliminar/{servicio_id}", auth=AsyncJWTAuth())
+async def eliminar_servicio(request, servicio_id: int):
+    servicio = await aget_object_or_404(Servicio, id=servicio_id)
 
-    if servicio.propietario != request.user:
+    if servicio.propietario_id != request.user.id:
         raise HttpError(403, "No puedes eliminar este servicio")
 
-    if servicio.imagen:
-        servicio.imagen.delete(save=False)
-
-    servicio.delete()
+    await sync_to_async(servicio.eliminar_con_imagenes)()
     return {"detail": "Servicio eliminado correctamente"}
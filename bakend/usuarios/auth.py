@@ -1,20 +1,66 @@
 from ninja.security import HttpBearer
 import jwt
+import time
 from django.conf import settings
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
 
+from .cache import auth_cache_config, get_cache_usuarios
+
 User = get_user_model()
 
 class JWTAuth(HttpBearer):
 
     def authenticate(self, request, token):
+        inicio = time.perf_counter()
+        cache_usuarios = get_cache_usuarios()
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+            user_id = payload.get("user_id")
+
+            # Usuario en caché (ver usuarios/cache.py); la base solo en un miss
+            user = cache_usuarios.obtener(user_id)
+            if user is None:
+                user = User.objects.get(id=user_id)
+                cache_usuarios.guardar(user)
+
+            request.user = user
+
+            return user
+
+        except Exception as e:
+            print("Error autenticando JWT:", e)
+            return None
+        finally:
+            cache_usuarios.registrar_latencia(time.perf_counter() - inicio)
+
+
+class AsyncJWTAuth(JWTAuth):
+    """
+    JWTAuth para handlers async: Ninja la espera en el event loop. La caché
+    local se lee directamente (memoria); la compartida y la base de datos
+    no bloquean el loop (hilo aparte y ORM async).
+    """
+
+    async def authenticate(self, request, token):
+        inicio = time.perf_counter()
+        cache_usuarios = get_cache_usuarios()
         try:
             payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
             user_id = payload.get("user_id")
 
-            user = User.objects.get(id=user_id)
+            compartida = bool(auth_cache_config()["COMPARTIDA"])
+            if compartida:
+                user = await sync_to_async(cache_usuarios.obtener)(user_id)
+            else:
+                user = cache_usuarios.obtener(user_id)
+            if user is None:
+                user = await User.objects.aget(id=user_id)
+                if compartida:
+                    await sync_to_async(cache_usuarios.guardar)(user)
+                else:
+                    cache_usuarios.guardar(user)
 
-            
             request.user = user
 
             return user
@@ -22,3 +68,5 @@ class JWTAuth(HttpBearer):
         except Exception as e:
             print("Error autenticando JWT:", e)
             return None
+        finally:
+            cache_usuarios.registrar_latencia(time.perf_counter() - inicio)
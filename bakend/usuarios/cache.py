@@ -0,0 +1,182 @@
+"""
+Caché de usuarios autenticados para JWTAuth.
+
+Evita el User.objects.get(id=...) en cada petición autenticada. Cada
+proceso guarda una copia LRU con TTL corto. Opcionalmente se apoya en una
+caché compartida de Django (AUTH_USUARIOS_CACHE["COMPARTIDA"]) que guarda
+el usuario y su versión; debe ser Redis o Memcached: en archivos o en
+memoria del proceso cada petición paga E/S o no se comparte nada, y el
+descarte por MAX_ENTRIES borra claves de versión.
+
+User.version sube en cada save() que toca campos de la copia en caché
+(perfil, contraseña, etc.; no last_login); las señales de
+usuarios/signals.py sacan al usuario de la caché local y publican la nueva
+versión en la compartida, de modo que otros procesos descartan su copia en
+la siguiente petición. Una clave de versión ausente (vencida o descartada)
+cuenta como miss. Sin caché compartida, otros procesos ven el cambio
+cuando vence el TTL.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+AUTH_CACHE_DEFAULTS = {
+    "TTL_SEGUNDOS": 60,
+    "MAX_ENTRADAS": 2048,
+    "COMPARTIDA": None,  # alias de CACHES con Redis o Memcached
+    "TIMEOUT_COMPARTIDA": 300,
+    "MUESTRAS_LATENCIA": 1000,
+}
+
+ELIMINADO = -1
+
+
+def auth_cache_config():
+    config = dict(AUTH_CACHE_DEFAULTS)
+    config.update(getattr(settings, "AUTH_USUARIOS_CACHE", {}))
+    return config
+
+
+def validar_compartida():
+    """La caché compartida debe ser un servicio externo (Redis o Memcached)"""
+    alias = auth_cache_config()["COMPARTIDA"]
+    if alias and isinstance(caches[alias], (DummyCache, FileBasedCache, LocMemCache)):
+        raise ImproperlyConfigured(
+            f"AUTH_USUARIOS_CACHE['COMPARTIDA'] = {alias!r} debe usar Redis o Memcached; "
+            "vacío para solo caché local"
+        )
+
+
+def _clave_version(user_id):
+    return f"auth:version:{user_id}"
+
+
+def _clave_usuario(user_id):
+    return f"auth:usuario:{user_id}"
+
+
+def _percentil(ordenadas, p):
+    if not ordenadas:
+        return 0.0
+    return ordenadas[min(len(ordenadas) - 1, int(p * len(ordenadas)))]
+
+
+class CacheUsuarios:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+        self._conteos = {"local": 0, "compartida": 0, "miss": 0, "invalidaciones": 0}
+        self._latencias = deque(maxlen=auth_cache_config()["MUESTRAS_LATENCIA"])
+
+    def _compartida(self, config):
+        return caches[config["COMPARTIDA"]] if config["COMPARTIDA"] else None
+
+    def obtener(self, user_id):
+        """Copia del usuario en caché o None"""
+        config = auth_cache_config()
+        compartida = self._compartida(config)
+        version_actual = compartida.get(_clave_version(user_id)) if compartida is not None else None
+
+        with self._lock:
+            entrada = self._local.get(user_id)
+            if entrada is not None:
+                user, version, expira = entrada
+                vigente = compartida is None or version_actual == version
+                if time.monotonic() < expira and vigente:
+                    self._local.move_to_end(user_id)
+                    self._conteos["local"] += 1
+                    return copy.copy(user)
+                del self._local[user_id]
+
+        # Sin clave de versión no se sabe si la copia está vigente: miss
+        if compartida is not None and version_actual not in (None, ELIMINADO):
+            guardado = compartida.get(_clave_usuario(user_id))
+            if guardado is not None and version_actual == guardado.version:
+                self._guardar_local(guardado, config)
+                with self._lock:
+                    self._conteos["compartida"] += 1
+                return copy.copy(guardado)
+
+        with self._lock:
+            self._conteos["miss"] += 1
+        return None
+
+    def _guardar_local(self, user, config):
+        with self._lock:
+            self._local[user.id] = (user, user.version, time.monotonic() + config["TTL_SEGUNDOS"])
+            self._local.move_to_end(user.id)
+            while len(self._local) > config["MAX_ENTRADAS"]:
+                self._local.popitem(last=False)
+
+    def guardar(self, user):
+        config = auth_cache_config()
+        user = copy.copy(user)
+        self._guardar_local(user, config)
+        compartida = self._compartida(config)
+        if compartida is not None:
+            timeout = config["TIMEOUT_COMPARTIDA"]
+            compartida.set_many(
+                {_clave_usuario(user.id): user, _clave_version(user.id): user.version},
+                timeout=timeout,
+            )
+
+    def invalidar(self, user_id, version=ELIMINADO):
+        """Saca al usuario de la caché local y publica su nueva versión"""
+        with self._lock:
+            self._local.pop(user_id, None)
+            self._conteos["invalidaciones"] += 1
+        config = auth_cache_config()
+        compartida = self._compartida(config)
+        if compartida is not None:
+            compartida.delete(_clave_usuario(user_id))
+            compartida.set(_clave_version(user_id), version, timeout=config["TIMEOUT_COMPARTIDA"])
+
+    def registrar_latencia(self, segundos):
+        self._latencias.append(segundos * 1000)
+
+    def limpiar(self):
+        with self._lock:
+            self._local.clear()
+
+    def estadisticas(self):
+        """Métricas de este proceso"""
+        config = auth_cache_config()
+        with self._lock:
+            conteos = dict(self._conteos)
+            entradas = len(self._local)
+            latencias = sorted(self._latencias)
+        hits = conteos["local"] + conteos["compartida"]
+        total = hits + conteos["miss"]
+        return {
+            "compartida": config["COMPARTIDA"],
+            "ttl_segundos": config["TTL_SEGUNDOS"],
+            "entradas": entradas,
+            "hits_local": conteos["local"],
+            "hits_compartida": conteos["compartida"],
+            "misses": conteos["miss"],
+            "invalidaciones": conteos["invalidaciones"],
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "latencia_ms": {
+                "muestras": len(latencias),
+                "promedio": round(sum(latencias) / len(latencias), 3) if latencias else 0.0,
+                "p50": round(_percentil(latencias, 0.50), 3),
+                "p95": round(_percentil(latencias, 0.95), 3),
+                "p99": round(_percentil(latencias, 0.99), 3),
+            },
+        }
+
+
+_cache_usuarios = CacheUsuarios()
+
+
+def get_cache_usuarios():
+    return _cache_usuarios
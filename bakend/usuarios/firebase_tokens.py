@@ -0,0 +1,235 @@
+"""
+Verificación local de ID tokens de Firebase con caché.
+
+firebase_auth.verify_id_token puede descargar los certificados de Google
+y repite la verificación RSA en cada login. Aquí:
+
+- Los certificados se guardan en memoria durante el max-age de su
+  Cache-Control y solo se vuelven a pedir al vencer o si aparece un `kid`
+  desconocido (rotación de claves).
+- Los tokens ya verificados se memorizan (por su SHA-256) hasta su `exp`.
+
+Las validaciones son las que documenta Firebase para ID tokens: RS256,
+aud = project_id, iss = https://securetoken.google.com/<project_id>,
+sub no vacío y auth_time no futuro. El conjunto de claves es inyectable
+(ClavesLocales) para verificar sin red; ver `manage.py bench_google_auth`.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+import requests
+from cryptography import x509
+from django.conf import settings
+
+CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+EMISOR = "https://securetoken.google.com/"
+MAX_AGE_DEFECTO = 3600
+MARGEN_SEGUNDOS = 60
+# Un kid desconocido fuerza una descarga como mucho cada tanto
+REFRESCO_MINIMO_SEGUNDOS = 60
+
+
+class TokenFirebaseInvalido(Exception):
+    pass
+
+
+class TokenFirebaseExpirado(TokenFirebaseInvalido):
+    pass
+
+
+def max_age(cache_control):
+    coincidencia = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(coincidencia.group(1)) if coincidencia else MAX_AGE_DEFECTO
+
+
+def clave_publica(pem):
+    return x509.load_pem_x509_certificate(pem.encode()).public_key()
+
+
+class ClavesGoogle:
+    """
+    Certificados públicos de Firebase, cacheados según Cache-Control.
+    La descarga (red y parseo de los certificados) corre fuera del lock:
+    hay una sola a la vez, y mientras dura los demás hilos siguen con las
+    claves que ya tienen; solo esperan los que piden un kid que no está.
+    """
+
+    def __init__(self, url=CERTS_URL, timeout=10, reloj=time.time):
+        self.url = url
+        self.timeout = timeout
+        self.reloj = reloj
+        self._lock = threading.Lock()
+        self._claves = {}
+        self._expira = 0.0
+        self._descargado = None
+        self._descarga = None
+        self.descargas = 0
+
+    def _descargar(self):
+        """Retorna ({kid: clave pública}, segundos de vigencia); no toca el estado"""
+        respuesta = requests.get(self.url, timeout=self.timeout)
+        respuesta.raise_for_status()
+        claves = {kid: clave_publica(pem) for kid, pem in respuesta.json().items()}
+        return claves, max_age(respuesta.headers.get("Cache-Control"))
+
+    def _vencidas(self, kid, ahora):
+        rotadas = (
+            kid not in self._claves
+            and (self._descargado is None or ahora - self._descargado >= REFRESCO_MINIMO_SEGUNDOS)
+        )
+        return ahora >= self._expira or rotadas
+
+    @property
+    def vigencia(self):
+        return max(0.0, self._expira - self.reloj())
+
+    def obtener(self, kid):
+        while True:
+            with self._lock:
+                if not self._vencidas(kid, self.reloj()):
+                    clave = self._claves.get(kid)
+                    break
+                descarga = self._descarga
+                if descarga is None:
+                    descarga = self._descarga = threading.Event()
+                    propia = True
+                elif kid in self._claves:
+                    # Otro hilo ya descarga: la clave actual sigue sirviendo
+                    clave = self._claves[kid]
+                    break
+                else:
+                    propia = False
+            if not propia:
+                descarga.wait(self.timeout)
+                continue
+            try:
+                claves, vigencia = self._descargar()
+                with self._lock:
+                    self._claves = claves
+                    self._descargado = self.reloj()
+                    self._expira = self._descargado + vigencia
+                    self.descargas += 1
+            finally:
+                with self._lock:
+                    self._descarga = None
+                descarga.set()
+            clave = claves.get(kid)
+            break
+        if clave is None:
+            raise TokenFirebaseInvalido(f"kid desconocido: {kid}")
+        return clave
+
+
+class ClavesLocales:
+    """Conjunto fijo {kid: clave pública o PEM de certificado}, sin red"""
+
+    def __init__(self, claves):
+        self._claves = {
+            kid: clave_publica(clave) if isinstance(clave, str) else clave
+            for kid, clave in claves.items()
+        }
+        self.descargas = 0
+
+    def obtener(self, kid):
+        if kid not in self._claves:
+            raise TokenFirebaseInvalido(f"kid desconocido: {kid}")
+        return self._claves[kid]
+
+
+class VerificadorFirebase:
+
+    def __init__(self, project_id, claves=None, max_tokens=1024, reloj=time.time):
+        self.project_id = project_id
+        self.claves = claves or ClavesGoogle(reloj=reloj)
+        self.max_tokens = max_tokens
+        self.reloj = reloj
+        self._lock = threading.Lock()
+        self._tokens = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _memorizado(self, huella):
+        with self._lock:
+            entrada = self._tokens.get(huella)
+            if entrada is None:
+                return None
+            decodificado, exp = entrada
+            if self.reloj() >= exp:
+                del self._tokens[huella]
+                return None
+            self._tokens.move_to_end(huella)
+            return decodificado
+
+    def _memorizar(self, huella, decodificado):
+        with self._lock:
+            self._tokens[huella] = (decodificado, decodificado["exp"])
+            while len(self._tokens) > self.max_tokens:
+                self._tokens.popitem(last=False)
+
+    def verificar(self, id_token):
+        """Claims del token (con 'uid'); TokenFirebaseInvalido si no es válido"""
+        if not id_token or not isinstance(id_token, str):
+            raise TokenFirebaseInvalido("Token vacío")
+        huella = hashlib.sha256(id_token.encode()).hexdigest()
+        decodificado = self._memorizado(huella)
+        if decodificado is not None:
+            self.hits += 1
+            return dict(decodificado)
+        self.misses += 1
+
+        try:
+            cabecera = jwt.get_unverified_header(id_token)
+        except jwt.PyJWTError as e:
+            raise TokenFirebaseInvalido(str(e))
+        if cabecera.get("alg") != "RS256":
+            raise TokenFirebaseInvalido("Algoritmo no permitido")
+        clave = self.claves.obtener(cabecera.get("kid"))
+        try:
+            decodificado = jwt.decode(
+                id_token,
+                clave,
+                algorithms=["RS256"],
+                audience=self.project_id,
+                issuer=EMISOR + self.project_id,
+                leeway=MARGEN_SEGUNDOS,
+                options={"require": ["exp", "iat", "sub"]},
+            )
+        except jwt.ExpiredSignatureError as e:
+            raise TokenFirebaseExpirado(str(e))
+        except jwt.PyJWTError as e:
+            raise TokenFirebaseInvalido(str(e))
+
+        if not decodificado.get("sub"):
+            raise TokenFirebaseInvalido("sub vacío")
+        if decodificado.get("auth_time", 0) > self.reloj() + MARGEN_SEGUNDOS:
+            raise TokenFirebaseInvalido("auth_time en el futuro")
+        decodificado["uid"] = decodificado["sub"]
+        self._memorizar(huella, decodificado)
+        return dict(decodificado)
+
+
+_verificador = None
+_verificador_lock = threading.Lock()
+
+
+def get_verificador():
+    global _verificador
+    if _verificador is None:
+        with _verificador_lock:
+            if _verificador is None:
+                _verificador = VerificadorFirebase(settings.FIREBASE_CONFIG["project_id"])
+    return _verificador
+
+
+def set_verificador(verificador):
+    """Reemplaza el verificador del proceso (claves locales en pruebas)"""
+    global _verificador
+    _verificador = verificador
+
+
+def verificar_id_token(id_token):
+    return get_verificador().verificar(id_token)
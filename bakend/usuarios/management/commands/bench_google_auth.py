@@ -0,0 +1,99 @@
+import statistics
+import time
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from usuarios.firebase_tokens import (
+    EMISOR,
+    ClavesGoogle,
+    ClavesLocales,
+    TokenFirebaseInvalido,
+    VerificadorFirebase,
+)
+from usuarios.models import User
+
+
+def firmar(clave_privada, project_id, uid, kid="local", vida=3600, **claims):
+    ahora = int(time.time())
+    payload = {
+        "iss": EMISOR + project_id,
+        "aud": project_id,
+        "sub": uid,
+        "iat": ahora,
+        "auth_time": ahora,
+        "exp": ahora + vida,
+        "email": f"{uid}@example.com",
+        **claims,
+    }
+    return jwt.encode(payload, clave_privada, algorithm="RS256", headers={"kid": kid})
+
+
+def _ms(muestras):
+    return f"media {statistics.mean(muestras):.3f} ms, p95 {sorted(muestras)[int(0.95 * (len(muestras) - 1))]:.3f} ms"
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la verificación de ID tokens de Firebase sin red, con un par de "
+        "claves RSA local: primera verificación vs token memorizado vs la "
+        "consulta del usuario en la base de datos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tokens", type=int, default=200)
+        parser.add_argument("--red", action="store_true",
+                            help="Además mide la descarga de los certificados reales de Google")
+
+    def handle(self, *args, **options):
+        project_id = settings.FIREBASE_CONFIG["project_id"]
+        privada = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        verificador = VerificadorFirebase(project_id, claves=ClavesLocales({"local": privada.public_key()}))
+        tokens = [firmar(privada, project_id, f"bench-{i}") for i in range(options["tokens"])]
+
+        frias, memorizadas, consultas = [], [], []
+        for token in tokens:
+            inicio = time.perf_counter()
+            verificador.verificar(token)
+            frias.append(1000 * (time.perf_counter() - inicio))
+        for token in tokens:
+            inicio = time.perf_counter()
+            decodificado = verificador.verificar(token)
+            memorizadas.append(1000 * (time.perf_counter() - inicio))
+            inicio = time.perf_counter()
+            User.objects.filter(firebase_uid=decodificado["uid"]).first()
+            consultas.append(1000 * (time.perf_counter() - inicio))
+
+        self.stdout.write(f"Verificación RSA:      {_ms(frias)}")
+        self.stdout.write(f"Token memorizado:      {_ms(memorizadas)}")
+        self.stdout.write(f"Consulta del usuario:  {_ms(consultas)}")
+
+        # Rechazos esperados
+        otra = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        casos = {
+            "firma ajena": firmar(otra, project_id, "x"),
+            "otra audiencia": firmar(privada, "otro-proyecto", "x"),
+            "expirado": firmar(privada, project_id, "x", vida=-3600),
+            "kid desconocido": firmar(privada, project_id, "x", kid="otro"),
+        }
+        for nombre, token in casos.items():
+            try:
+                verificador.verificar(token)
+                self.stdout.write(self.style.ERROR(f"{nombre}: aceptado"))
+            except TokenFirebaseInvalido as e:
+                self.stdout.write(self.style.SUCCESS(f"{nombre}: rechazado ({e.__class__.__name__})"))
+
+        if options["red"]:
+            claves = ClavesGoogle()
+            for intento in ("primera", "cacheada"):
+                inicio = time.perf_counter()
+                try:
+                    claves.obtener("bench")
+                except TokenFirebaseInvalido:
+                    pass
+                self.stdout.write(
+                    f"Certificados de Google ({intento}): {1000 * (time.perf_counter() - inicio):.1f} ms, "
+                    f"descargas={claves.descargas}, vigentes {claves.vigencia:.0f} s"
+                )
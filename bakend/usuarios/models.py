@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.expressions import Combinable
 from django.contrib.auth.models import  AbstractUser
 
 
@@ -13,10 +15,16 @@ class User (AbstractUser):
     telefono = models.BigIntegerField("Teléfono", null=True, blank=True)
     firebase_uid = models.CharField('Firebase UID',max_length=128, unique=True,blank=True,null=True, help_text='UID único de Firebase para usuarios de Google')
     auth_proveedor = models.CharField("Proveedor de autentificaión", max_length=20, choices=[('email', 'Email/Password'), ('google', 'Google'),], default='email')
+    version = models.PositiveIntegerField("Versión", default=1, help_text='Sube en cada cambio; invalida la caché de JWTAuth')
+
+    # Campos que pueden quedar desactualizados en la caché de JWTAuth:
+    # guardarlos solos (p. ej. update_last_login) no sube la versión
+    CAMPOS_SIN_VERSION = ("last_login", "modificado")
 
 
     class Meta:
         ordering = ['-creado']
+        indexes = [models.Index(fields=['-creado', '-id'], name='usuario_creado_id_idx')]
     def __str__(self):
         return self.email
 
@@ -36,7 +44,23 @@ class User (AbstractUser):
     def save(self, *args, **kwargs):
         if self.auth_proveedor == 'google' and self.firebase_uid:
             self.correo_verificado = True
+        if not self._state.adding and self.cambia_version(kwargs.get("update_fields")):
+            # En la base: dos guardados concurrentes no quedan con la misma versión
+            self.version = F("version") + 1
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "version"}
         super().save(*args, **kwargs)
+        self.refrescar_version()
+
+    def cambia_version(self, update_fields):
+        return update_fields is None or bool(set(update_fields) - set(self.CAMPOS_SIN_VERSION))
+
+    def refrescar_version(self):
+        """Carga la versión que dejó F("version") + 1 en el último save()"""
+        if isinstance(self.version, Combinable):
+            self.refresh_from_db(fields=["version"])
+        return self.version
 
 
 
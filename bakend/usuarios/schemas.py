@@ -57,6 +57,7 @@ class TokenSchema(Schema):
 
 class listaUsuariosSchema(Schema):
     usuarios: list[UserOutSchema]
+    siguiente: Optional[str] = None
 
 class DetailErrorSchema(Schema):
     detail: str
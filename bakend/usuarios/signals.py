@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import get_cache_usuarios
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def invalidar_usuario(sender, instance, created, update_fields=None, **kwargs):
+    if not created and instance.cambia_version(update_fields):
+        get_cache_usuarios().invalidar(instance.id, instance.refrescar_version())
+
+
+@receiver(post_delete, sender=User)
+def eliminar_usuario(sender, instance, **kwargs):
+    get_cache_usuarios().invalidar(instance.id)
@@ -1,3 +1,223 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest import mock
 
-# Create your tests here.
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from django.contrib.auth.models import update_last_login
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .cache import _clave_version, get_cache_usuarios, validar_compartida
+from .firebase_tokens import (
+    EMISOR,
+    REFRESCO_MINIMO_SEGUNDOS,
+    ClavesGoogle,
+    ClavesLocales,
+    TokenFirebaseExpirado,
+    TokenFirebaseInvalido,
+    VerificadorFirebase,
+)
+from .models import User
+
+PROYECTO = "mismascotas-pruebas"
+
+
+def _clave_privada():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def _certificado(clave_privada):
+    """PEM de un certificado autofirmado, como los que publica Google"""
+    nombre = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.system.gserviceaccount.com")])
+    ahora = datetime.now(timezone.utc)
+    certificado = (
+        x509.CertificateBuilder()
+        .subject_name(nombre)
+        .issuer_name(nombre)
+        .public_key(clave_privada.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(ahora - timedelta(days=1))
+        .not_valid_after(ahora + timedelta(days=1))
+        .sign(clave_privada, hashes.SHA256())
+    )
+    return certificado.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def _firmar(clave_privada, kid="a", vida=3600, **claims):
+    ahora = int(time.time())
+    payload = {
+        "iss": EMISOR + PROYECTO,
+        "aud": PROYECTO,
+        "sub": "uid-1",
+        "iat": ahora,
+        "auth_time": ahora,
+        "exp": ahora + vida,
+        **claims,
+    }
+    return jwt.encode(payload, clave_privada, algorithm="RS256", headers={"kid": kid})
+
+
+def _respuesta(certificados, max_age=3600):
+    respuesta = mock.Mock()
+    respuesta.json.return_value = certificados
+    respuesta.headers = {"Cache-Control": f"public, max-age={max_age}"}
+    return respuesta
+
+
+class VerificadorFirebaseTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.clave = _clave_privada()
+        cls.otra = _clave_privada()
+
+    def setUp(self):
+        self.verificador = VerificadorFirebase(PROYECTO, claves=ClavesLocales({"a": self.clave.public_key()}))
+
+    def test_token_valido(self):
+        claims = self.verificador.verificar(_firmar(self.clave))
+        self.assertEqual(claims["uid"], "uid-1")
+
+    def test_token_memorizado(self):
+        token = _firmar(self.clave)
+        self.verificador.verificar(token)
+        self.verificador.verificar(token)
+        self.assertEqual((self.verificador.hits, self.verificador.misses), (1, 1))
+
+    def test_firma_de_otra_clave(self):
+        with self.assertRaises(TokenFirebaseInvalido):
+            self.verificador.verificar(_firmar(self.otra))
+
+    def test_expirado(self):
+        with self.assertRaises(TokenFirebaseExpirado):
+            self.verificador.verificar(_firmar(self.clave, vida=-3600))
+
+    def test_audiencia_de_otro_proyecto(self):
+        with self.assertRaises(TokenFirebaseInvalido):
+            self.verificador.verificar(_firmar(self.clave, aud="otro-proyecto"))
+
+    def test_emisor_de_otro_proyecto(self):
+        with self.assertRaises(TokenFirebaseInvalido):
+            self.verificador.verificar(_firmar(self.clave, iss=EMISOR + "otro-proyecto"))
+
+    def test_kid_desconocido(self):
+        with self.assertRaises(TokenFirebaseInvalido):
+            self.verificador.verificar(_firmar(self.clave, kid="b"))
+
+
+class ClavesGoogleTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.clave_a = _clave_privada()
+        cls.clave_b = _clave_privada()
+        cls.pem_a = _certificado(cls.clave_a)
+        cls.pem_b = _certificado(cls.clave_b)
+
+    def setUp(self):
+        self.ahora = 1000.0
+        self.claves = ClavesGoogle(reloj=lambda: self.ahora)
+        self.verificador = VerificadorFirebase(PROYECTO, claves=self.claves)
+
+    def test_certificados_cacheados_hasta_max_age(self):
+        with mock.patch("usuarios.firebase_tokens.requests.get", return_value=_respuesta({"a": self.pem_a}, 600)) as get:
+            self.claves.obtener("a")
+            self.ahora += 599
+            self.claves.obtener("a")
+            self.assertEqual(get.call_count, 1)
+            self.ahora += 1
+            self.claves.obtener("a")
+            self.assertEqual(get.call_count, 2)
+
+    def test_rotacion_de_claves(self):
+        with mock.patch("usuarios.firebase_tokens.requests.get", return_value=_respuesta({"a": self.pem_a})) as get:
+            self.verificador.verificar(_firmar(self.clave_a, kid="a"))
+            token_b = _firmar(self.clave_b, kid="b")
+            # Un kid desconocido recién descargado no fuerza otra descarga
+            with self.assertRaises(TokenFirebaseInvalido):
+                self.verificador.verificar(token_b)
+            self.assertEqual(get.call_count, 1)
+
+            get.return_value = _respuesta({"a": self.pem_a, "b": self.pem_b})
+            self.ahora += REFRESCO_MINIMO_SEGUNDOS
+            self.assertEqual(self.verificador.verificar(token_b)["uid"], "uid-1")
+            self.assertEqual(get.call_count, 2)
+
+    def test_descarga_fuera_del_lock(self):
+        with mock.patch("usuarios.firebase_tokens.requests.get", return_value=_respuesta({"a": self.pem_a}, 60)):
+            self.claves.obtener("a")
+        self.ahora += 60
+
+        en_descarga = threading.Event()
+        liberar = threading.Event()
+
+        def descarga_lenta(*args, **kwargs):
+            en_descarga.set()
+            liberar.wait(5)
+            return _respuesta({"a": self.pem_a})
+
+        with mock.patch("usuarios.firebase_tokens.requests.get", side_effect=descarga_lenta):
+            hilo = threading.Thread(target=self.claves.obtener, args=("a",))
+            hilo.start()
+            self.assertTrue(en_descarga.wait(5))
+            # Con la descarga en curso, el kid conocido se resuelve sin esperarla
+            inicio = time.monotonic()
+            self.assertIsNotNone(self.claves.obtener("a"))
+            self.assertLess(time.monotonic() - inicio, 1)
+            liberar.set()
+            hilo.join(5)
+        self.assertEqual(self.claves.descargas, 2)
+
+
+CACHES_COMPARTIDA = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "default"},
+    # En memoria solo para las pruebas: validar_compartida la rechaza
+    "usuarios": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "usuarios-pruebas"},
+}
+
+
+class CacheUsuariosTests(TestCase):
+
+    def setUp(self):
+        self.cache = get_cache_usuarios()
+        self.cache.limpiar()
+        self.addCleanup(self.cache.limpiar)
+        self.user = User.objects.create(username="u1", email="u1@x.com", password="x")
+
+    def test_last_login_no_sube_la_version(self):
+        self.cache.guardar(self.user)
+        update_last_login(None, self.user)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.version, 1)
+        self.assertIsNotNone(self.cache.obtener(self.user.id))
+
+    def test_otro_campo_sube_la_version_e_invalida(self):
+        self.cache.guardar(self.user)
+        self.user.biografia = "nueva"
+        self.user.save(update_fields=["biografia"])
+        self.assertEqual(self.user.version, 2)
+        self.assertIsNone(self.cache.obtener(self.user.id))
+
+    @override_settings(CACHES=CACHES_COMPARTIDA, AUTH_USUARIOS_CACHE={"COMPARTIDA": "usuarios"})
+    def test_version_ausente_en_la_compartida_es_miss(self):
+        self.cache.guardar(self.user)
+        self.assertEqual(self.cache.obtener(self.user.id).version, 1)
+        # Vencida o descartada: la copia local ya no se puede validar
+        caches["usuarios"].delete(_clave_version(self.user.id))
+        self.assertIsNone(self.cache.obtener(self.user.id))
+
+    @override_settings(CACHES=CACHES_COMPARTIDA, AUTH_USUARIOS_CACHE={"COMPARTIDA": "usuarios"})
+    def test_compartida_debe_ser_un_servicio_externo(self):
+        with self.assertRaises(ImproperlyConfigured):
+            validar_compartida()
+
+    def test_solo_local_por_defecto(self):
+        validar_compartida()
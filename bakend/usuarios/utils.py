@@ -3,6 +3,8 @@ import firebase_admin
 from firebase_admin import credentials, firestore, auth
 from django.conf import settings
 
+from .firebase_tokens import TokenFirebaseExpirado, TokenFirebaseInvalido, verificar_id_token
+
 
 def initialize_firebase():
     if not firebase_admin._apps:
@@ -27,16 +29,16 @@ def get_firestore_client():
 
 def verify_firebase_token(id_token):
     try:
-        initialize_firebase()
-        decoded_token = auth.verify_id_token(id_token)
+        # Certificados y tokens verificados en caché (ver firebase_tokens.py)
+        decoded_token = verificar_id_token(id_token)
         print(f"Token verificado para usuario: {decoded_token.get('email')}")
         return decoded_token
-    except auth.InvalidIdTokenError:
-        print("Token inválido o expirado")
-        return None
-    except auth.ExpiredIdTokenError:
+    except TokenFirebaseExpirado:
         print("Token expirado")
         return None
+    except TokenFirebaseInvalido:
+        print("Token inválido o expirado")
+        return None
     except Exception as e:
         print(f"Error verificando token: {str(e)}")
         return None
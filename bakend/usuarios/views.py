@@ -1,9 +1,12 @@
 from ninja import Router
-from django.contrib.auth import get_user_model, login, authenticate
+from asgiref.sync import sync_to_async
+from django.contrib.auth import alogin, get_user_model, authenticate
 from django.contrib.auth.hashers import make_password
-from firebase_admin import auth as firebase_auth
-import firebase_admin
 from  .schemas import *
+from api.paginacion import apaginar
+from .auth import JWTAuth
+from .cache import get_cache_usuarios
+from .firebase_tokens import verificar_id_token
 from rest_framework_simplejwt.tokens import RefreshToken
 
 
@@ -18,31 +21,31 @@ def get_tokens_for_user(user):
     }
 
 @usuarios.get("/Consultar", response=listaUsuariosSchema, tags=["Auth"])
-def consultarUsuarios(request):
-    usuarios_list = User.objects.all()
-    return {"usuarios": usuarios_list}
+async def consultarUsuarios(request, cursor: str = None, limite: int = None):
+    usuarios_list, siguiente = await apaginar(User.objects.all(), "creado", cursor, limite)
+    return {"usuarios": usuarios_list, "siguiente": siguiente}
 
 @usuarios.post("/registrar", response={200: UserOutSchema, 400: DetailErrorSchema}, tags=["Auth"], auth=None)
-def register_user(request, data: UserRegisterSchema):
+async def register_user(request, data: UserRegisterSchema):
     print(" Datos recibidos:", data.dict())
 
     # Validar email único
-    if User.objects.filter(email=data.email).exists():
+    if await User.objects.filter(email=data.email).aexists():
         return 400, {"detail": "Este email ya está registrado."}
 
     # Validar username único
-    if User.objects.filter(username=data.username).exists():
+    if await User.objects.filter(username=data.username).aexists():
         return 400, {"detail": "Este nombre de usuario ya está registrado."}
 
     # Validar longitud mínima de contraseña
     if len(data.password) < 6:
         return 400, {"detail": "La contraseña debe tener al menos 6 caracteres."}
 
-    # Crear usuario
-    user = User.objects.create(
+    # Crear usuario (el hash de la contraseña es CPU: fuera del event loop)
+    user = await User.objects.acreate(
         email=data.email,
         username=data.username,
-        password=make_password(data.password),
+        password=await sync_to_async(make_password, thread_sensitive=False)(data.password),
         first_name=data.first_name or "",
         last_name=data.last_name or "",
         telefono=data.telefono or "",
@@ -56,9 +59,10 @@ def register_user(request, data: UserRegisterSchema):
     response={200: TokenSchema, 400: DetailErrorSchema, 401: DetailErrorSchema}, 
     tags=["Auth"]
 )
-def google_authentication(request, data: GoogleAuthSchema):
+async def google_authentication(request, data: GoogleAuthSchema):
     try:
-        decode_token = firebase_auth.verify_id_token(data.id_token)
+        # Puede descargar los certificados de Google: fuera del event loop
+        decode_token = await sync_to_async(verificar_id_token, thread_sensitive=False)(data.id_token)
         firebase_uid = decode_token['uid']
         email = decode_token.get('email')
         correo_verificado = decode_token.get('email_verified', False)
@@ -68,7 +72,7 @@ def google_authentication(request, data: GoogleAuthSchema):
         if not email:
             return 400, {"detail": "No se encontró el email de Google en el token."}
 
-        user, created = User.objects.get_or_create(
+        user, created = await User.objects.aget_or_create(
             firebase_uid=firebase_uid,
             defaults={
                 'email': email,
@@ -83,9 +87,9 @@ def google_authentication(request, data: GoogleAuthSchema):
 
         if not created and picture and user.imagen_perfil != picture:
             user.imagen_perfil = picture
-            user.save(update_fields=['imagen_perfil'])
+            await user.asave(update_fields=['imagen_perfil'])
             
-        login(request, user, backend='django.contrib.auth.backends.ModelBackend')
+        await alogin(request, user, backend='django.contrib.auth.backends.ModelBackend')
 
         return {
             "access_token": data.id_token,
@@ -100,16 +104,16 @@ def google_authentication(request, data: GoogleAuthSchema):
 
 
 @usuarios.post("/login", response={200: TokenSchema, 400: DetailErrorSchema}, tags=["Auth"], auth=None)
-def login_user(request, data: LoginSchema):
+async def login_user(request, data: LoginSchema):
     email = data.email
     password = data.password
 
     try:
-        user = User.objects.get(email=email)
+        user = await User.objects.aget(email=email)
     except User.DoesNotExist:
         return 401, {"detail": "Credenciales inválidas"}
 
-    if not user.check_password(password):
+    if not await user.acheck_password(password):
         return 401, {"detail": "Credenciales inválidas"}
 
     refresh = RefreshToken.for_user(user)
@@ -127,7 +131,7 @@ def login_user(request, data: LoginSchema):
     }
 
 @usuarios.get("/me", response=UserOutSchema, tags=["Auth"])
-def get_user(request):
+async def get_user(request):
     if not request.auth:
         return  401, {"detail": "No autentificado"}
     return request.auth
@@ -164,4 +168,9 @@ def delete_user(request):
     user = request.auth
     user.delete()
 
-    return {"detail": "Usuario eliminado exitosamente."}
\ No newline at end of file
+    return {"detail": "Usuario eliminado exitosamente."}
+
+
+@usuarios.get("/cache/estadisticas", auth=JWTAuth(), tags=["Auth"])
+def estadisticas_cache_usuarios(request):
+    return get_cache_usuarios().estadisticas()
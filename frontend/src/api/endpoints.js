@@ -2,6 +2,9 @@ import apiClient from './client';
 import AuthService from '../services/authService';
 import { API_URL } from '@env';
 
+// Tamaño de página máximo que acepta el backend (API_PAGINA_MAXIMA)
+const PAGINA_MAXIMA = 200;
+
 export const authAPI = {
   // Registro con email/password
   register: async (data) => {
@@ -95,11 +98,19 @@ export const authAPI = {
 };
 
 export const mascotasAPI = {
-  // Listar todas las mascotas
+  // Listar todas las mascotas (el backend pagina: se siguen los cursores)
   listar: async () => {
     try {
-      const response = await apiClient.get('/mascotas/lista');
-      return { success: true, data: response.data };
+      const mascotas = [];
+      let cursor = null;
+      do {
+        const response = await apiClient.get('/mascotas/lista', {
+          params: { limite: PAGINA_MAXIMA, ...(cursor ? { cursor } : {}) },
+        });
+        mascotas.push(...response.data.mascotas);
+        cursor = response.data.siguiente;
+      } while (cursor);
+      return { success: true, data: { mascotas } };
     } catch (error) {
       return { 
         success: false, 
@@ -219,11 +230,19 @@ export const mascotasAPI = {
 };
 
 export const serviciosAPI = {
-  // Listar servicios
+  // Listar servicios (el cursor de la página siguiente viene en un header)
   listar: async () => {
     try {
-      const response = await apiClient.get('/servicios/lista');
-      return { success: true, data: response.data };
+      const servicios = [];
+      let cursor = null;
+      do {
+        const response = await apiClient.get('/servicios/lista', {
+          params: { limite: PAGINA_MAXIMA, ...(cursor ? { cursor } : {}) },
+        });
+        servicios.push(...response.data);
+        cursor = response.headers['x-siguiente-cursor'];
+      } while (cursor);
+      return { success: true, data: servicios };
     } catch (error) {
       return { 
         success: false,